@@ -1,7 +1,7 @@
 from dataclasses import dataclass, field
 from os import getenv
 from dotenv import load_dotenv
-from typing import List
+from typing import Dict, List
 
 load_dotenv()
 
@@ -11,6 +11,67 @@ class Config:
     BOT_TOKEN: str = getenv("BOT_TOKEN")
     ADMIN_IDS: List[int] = field(default_factory=lambda: [int(id.strip()) for id in getenv("ADMIN_IDS", "").split(",") if id.strip()])
     DATABASE_PATH: str = "database/razvivashka.db"
+    DB_READ_POOL_SIZE: int = int(getenv("DB_READ_POOL_SIZE", "4"))  # Количество соединений-читателей в пуле
+    # Профиль производительности SQLite, применяется к каждому соединению пула
+    SQLITE_JOURNAL_MODE: str = getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_MMAP_SIZE: int = int(getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024)))
+    SQLITE_CACHE_SIZE: int = int(getenv("SQLITE_CACHE_SIZE", "-16000"))  # Отрицательное значение - размер в КиБ
+    SQLITE_TEMP_STORE: str = getenv("SQLITE_TEMP_STORE", "MEMORY")
+    # Отложенная запись счетчиков жетонов и попыток: интервал сброса и размер буфера
+    COUNTERS_FLUSH_INTERVAL_MS: int = int(getenv("COUNTERS_FLUSH_INTERVAL_MS", "500"))
+    COUNTERS_MAX_PENDING: int = int(getenv("COUNTERS_MAX_PENDING", "200"))
+    # Кэш прав доступа (подписка и бесплатные попытки) в памяти процесса
+    ENTITLEMENT_TTL_SECONDS: int = int(getenv("ENTITLEMENT_TTL_SECONDS", "300"))
+    ENTITLEMENT_CACHE_SIZE: int = int(getenv("ENTITLEMENT_CACHE_SIZE", "10000"))
+    # Выбор контента на день: assigned - назначения в базе, hashed - по хэшу без записи, global - общий набор на всех
+    DAILY_CONTENT_MODE: str = getenv("DAILY_CONTENT_MODE", "assigned")
+    # Ночная подготовка ежедневного контента: час запуска, окно активности в днях и размер пачки пользователей
+    DAILY_ASSIGNMENT_HOUR: int = int(getenv("DAILY_ASSIGNMENT_HOUR", "23"))
+    DAILY_ASSIGNMENT_ACTIVE_DAYS: int = int(getenv("DAILY_ASSIGNMENT_ACTIVE_DAYS", "7"))
+    DAILY_ASSIGNMENT_CHUNK_SIZE: int = int(getenv("DAILY_ASSIGNMENT_CHUNK_SIZE", "500"))
+    # Служебный чат, куда команда /warm_media заранее загружает видео ради file_id
+    MEDIA_STORAGE_CHAT_ID: str = getenv("MEDIA_STORAGE_CHAT_ID")
+    # Дисковый кэш видео, скачанных для повторной загрузки в Telegram: каталог и предельный размер
+    MEDIA_CACHE_DIR: str = getenv("MEDIA_CACHE_DIR", "cache/media")
+    MEDIA_CACHE_MAX_MB: int = int(getenv("MEDIA_CACHE_MAX_MB", "1024"))
+    # Сессия API Telegram: таймаут запроса в секундах и размер пула соединений
+    BOT_API_TIMEOUT: float = float(getenv("BOT_API_TIMEOUT", "60"))
+    BOT_API_POOL_SIZE: int = int(getenv("BOT_API_POOL_SIZE", "100"))
+    # Общий HTTP-клиент для скачивания медиа: пул соединений, кэш DNS, keep-alive и таймауты в секундах
+    HTTP_POOL_SIZE: int = int(getenv("HTTP_POOL_SIZE", "20"))
+    HTTP_POOL_SIZE_PER_HOST: int = int(getenv("HTTP_POOL_SIZE_PER_HOST", "10"))
+    HTTP_DNS_CACHE_TTL: int = int(getenv("HTTP_DNS_CACHE_TTL", "300"))
+    HTTP_KEEPALIVE_SECONDS: float = float(getenv("HTTP_KEEPALIVE_SECONDS", "30"))
+    HTTP_CONNECT_TIMEOUT: float = float(getenv("HTTP_CONNECT_TIMEOUT", "10"))
+    HTTP_READ_TIMEOUT: float = float(getenv("HTTP_READ_TIMEOUT", "60"))
+    HTTP_TOTAL_TIMEOUT: float = float(getenv("HTTP_TOTAL_TIMEOUT", "600"))
+    # Загрузка видео с Google Drive: бюджет времени на один запрос в секундах, число неудач подряд
+    # до размыкания предохранителя и пауза в секундах перед пробным запросом
+    DRIVE_LATENCY_BUDGET: float = float(getenv("DRIVE_LATENCY_BUDGET", "60"))
+    DRIVE_BREAKER_FAILURES: int = int(getenv("DRIVE_BREAKER_FAILURES", "5"))
+    DRIVE_BREAKER_RESET_SECONDS: float = float(getenv("DRIVE_BREAKER_RESET_SECONDS", "60"))
+    # Время жизни состояний диалогов (FSM) в базе с последнего изменения, секунды
+    FSM_TTL_SECONDS: int = int(getenv("FSM_TTL_SECONDS", "86400"))
+    FSM_SWEEP_INTERVAL_SECONDS: int = int(getenv("FSM_SWEEP_INTERVAL_SECONDS", "600"))  # Период удаления брошенных сессий
+    # Рассылки: сообщений в секунду (лимит Telegram около 30), одновременных запросов,
+    # размер пачки получателей между сохранениями курсора и период отчета администратору в секундах
+    BROADCAST_RATE: float = float(getenv("BROADCAST_RATE", "25"))
+    BROADCAST_CONCURRENCY: int = int(getenv("BROADCAST_CONCURRENCY", "10"))
+    BROADCAST_BATCH_SIZE: int = int(getenv("BROADCAST_BATCH_SIZE", "50"))
+    BROADCAST_PROGRESS_SECONDS: float = float(getenv("BROADCAST_PROGRESS_SECONDS", "10"))
     PHOTO_CHANNEL_ID: str = getenv("PHOTO_CHANNEL_ID", "@doskadlavsex")  # ID канала для фотографий
 
+    def sqlite_pragmas(self) -> Dict[str, object]:
+        """Возвращает PRAGMA-настройки SQLite в порядке применения"""
+        return {
+            "busy_timeout": self.SQLITE_BUSY_TIMEOUT_MS,
+            "journal_mode": self.SQLITE_JOURNAL_MODE,
+            "synchronous": self.SQLITE_SYNCHRONOUS,
+            "mmap_size": self.SQLITE_MMAP_SIZE,
+            "cache_size": self.SQLITE_CACHE_SIZE,
+            "temp_store": self.SQLITE_TEMP_STORE,
+        }
+
 config = Config() 
\ No newline at end of file
@@ -0,0 +1,153 @@
+import asyncio
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from database.pool import ConnectionPool
+from database.sampler import IdSampler
+from services.single_flight import SingleFlight
+
+Row = Mapping[str, object]
+
+
+def _freeze(rows) -> Tuple[Row, ...]:
+    return tuple(MappingProxyType(dict(row)) for row in rows)
+
+
+def _by_id(rows: Tuple[Row, ...]) -> Mapping[int, Row]:
+    return MappingProxyType({row['id']: row for row in rows})
+
+
+def creativity_order(video: Row) -> Tuple[bool, int, int]:
+    """Ключ порядка мастер-классов: по sequence_number (NULL первыми, как в SQLite), затем по id"""
+    return (video['sequence_number'] is not None, video['sequence_number'] or 0, video['id'])
+
+
+def _ids(rows: Tuple[Row, ...]) -> Tuple[int, ...]:
+    return tuple(row['id'] for row in rows)
+
+
+def _group_by_type(rows: Tuple[Row, ...]) -> Mapping[str, Tuple[Row, ...]]:
+    groups: Dict[str, List[Row]] = {}
+    for row in rows:
+        groups.setdefault(row['type'], []).append(row)
+    return MappingProxyType({key: tuple(value) for key, value in groups.items()})
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Неизменяемый снимок справочников, которые редактирует только администратор"""
+    version: int
+    tokens: Tuple[Row, ...]
+    tokens_by_id: Mapping[int, Row]
+    subscriptions: Tuple[Row, ...]
+    daily_tasks: Tuple[Row, ...]
+    daily_tasks_by_id: Mapping[int, Row]
+    riddles: Tuple[Row, ...]
+    riddles_by_id: Mapping[int, Row]
+    tongue_twisters: Tuple[Row, ...]
+    tongue_twisters_by_id: Mapping[int, Row]
+    exercise_videos_by_id: Mapping[int, Row]
+    exercise_videos_by_type: Mapping[str, Tuple[Row, ...]]
+    creativity_videos_by_id: Mapping[int, Row]
+    # Видео творчества по разделам, упорядоченные по sequence_number
+    creativity_videos_by_type: Mapping[str, Tuple[Row, ...]]
+    # Случайный выбор id: tokens, daily_tasks, riddles, tongue_twisters
+    samplers: Mapping[str, IdSampler]
+    # Ключи порядка строк для постраничного просмотра (keyset_slice): tokens, daily_tasks, riddles,
+    # tongue_twisters, exercise_videos:<тип> и creativity_videos:<тип>
+    page_keys: Mapping[str, Tuple]
+
+
+class Catalog:
+    """Справочники в памяти: читаются из снимка, после каждой записи администратора снимок заменяется целиком"""
+
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._reload_lock = asyncio.Lock()
+        self._reloads: SingleFlight[CatalogSnapshot] = SingleFlight()
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        if self._snapshot is None:
+            raise RuntimeError("Справочники не загружены: вызовите Catalog.reload() при запуске")
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version if self._snapshot else 0
+
+    async def reload(self) -> CatalogSnapshot:
+        """Перечитывает справочники из базы и атомарно подменяет снимок.
+
+        Одновременные вызовы, пришедшие до начала чтения, получают один общий снимок.
+        """
+        return await self._reloads.do("reload", self._reload)
+
+    async def _reload(self) -> CatalogSnapshot:
+        async with self._reload_lock:
+            # Вызовы, пришедшие после начала чтения, могли записать то, чего этот снимок не увидит
+            self._reloads.forget("reload")
+            async with self.pool.read() as db:
+                async def fetch(query: str) -> Tuple[Row, ...]:
+                    async with db.execute(query) as cursor:
+                        return _freeze(await cursor.fetchall())
+
+                # Все таблицы читаются в одной транзакции, чтобы снимок был согласованным
+                await db.execute("BEGIN")
+                try:
+                    tokens = await fetch("SELECT * FROM tokens ORDER BY id")
+                    subscriptions = await fetch("SELECT * FROM subscriptions ORDER BY duration_days")
+                    daily_tasks = await fetch("SELECT * FROM daily_tasks ORDER BY id")
+                    riddles = await fetch("SELECT * FROM riddles ORDER BY id")
+                    tongue_twisters = await fetch("SELECT * FROM tongue_twisters ORDER BY id")
+                    exercise_videos = await fetch("SELECT * FROM exercise_videos ORDER BY type, id")
+                    creativity_videos = await fetch("""
+                        SELECT * FROM creativity_videos
+                        ORDER BY type, sequence_number, id
+                    """)
+                finally:
+                    await db.rollback()
+
+            exercise_videos_by_type = _group_by_type(exercise_videos)
+            creativity_videos_by_type = _group_by_type(creativity_videos)
+            page_keys = {
+                'tokens': _ids(tokens),
+                'daily_tasks': _ids(daily_tasks),
+                'riddles': _ids(riddles),
+                'tongue_twisters': _ids(tongue_twisters),
+            }
+            for video_type, videos in exercise_videos_by_type.items():
+                page_keys[f'exercise_videos:{video_type}'] = _ids(videos)
+            for video_type, videos in creativity_videos_by_type.items():
+                page_keys[f'creativity_videos:{video_type}'] = tuple(creativity_order(video) for video in videos)
+
+            snapshot = CatalogSnapshot(
+                version=self.version + 1,
+                tokens=tokens,
+                tokens_by_id=_by_id(tokens),
+                subscriptions=subscriptions,
+                daily_tasks=daily_tasks,
+                daily_tasks_by_id=_by_id(daily_tasks),
+                riddles=riddles,
+                riddles_by_id=_by_id(riddles),
+                tongue_twisters=tongue_twisters,
+                tongue_twisters_by_id=_by_id(tongue_twisters),
+                exercise_videos_by_id=_by_id(exercise_videos),
+                exercise_videos_by_type=exercise_videos_by_type,
+                creativity_videos_by_id=_by_id(creativity_videos),
+                creativity_videos_by_type=creativity_videos_by_type,
+                samplers=MappingProxyType({
+                    name: IdSampler(row['id'] for row in rows)
+                    for name, rows in (
+                        ('tokens', tokens),
+                        ('daily_tasks', daily_tasks),
+                        ('riddles', riddles),
+                        ('tongue_twisters', tongue_twisters),
+                    )
+                }),
+                page_keys=MappingProxyType(page_keys),
+            )
+            self._snapshot = snapshot
+            return snapshot
@@ -0,0 +1,166 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from database.pool import ConnectionPool
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class CounterBuffer:
+    """Буфер приращений счетчиков жетонов и бесплатных попыток с отложенной записью.
+
+    Приращения копятся в памяти и записываются одной транзакцией раз в
+    flush_interval_ms миллисекунд или как только накопится max_pending записей.
+    """
+
+    def __init__(self, pool: ConnectionPool, flush_interval_ms: int = 500, max_pending: int = 200):
+        self.pool = pool
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max(1, max_pending)
+        # (user_id, token_id) -> приращение количества жетонов
+        self._tokens: Dict[Tuple[int, int], int] = defaultdict(int)
+        # (user_id, feature_type) -> (приращение попыток, дата последней попытки)
+        self._attempts: Dict[Tuple[int, str], Tuple[int, str]] = {}
+        # Приращения, которые сейчас записываются в базу: до коммита они все еще видны при чтении
+        self._flushing_tokens: Dict[Tuple[int, int], int] = {}
+        self._flushing_attempts: Dict[Tuple[int, str], Tuple[int, str]] = {}
+        # Номер сброса: меняется в момент, когда приращения переходят из памяти в базу
+        self._generation = 0
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._tokens) + len(self._attempts)
+
+    def start(self) -> None:
+        """Запускает фоновый сброс буфера"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Останавливает фоновый сброс и записывает все накопленное"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка при сбросе счетчиков: {e}")
+
+    def _check_size(self) -> None:
+        if self.pending_count >= self.max_pending:
+            self._wakeup.set()
+
+    def add_token(self, user_id: int, token_id: int, delta: int = 1) -> None:
+        """Добавляет приращение количества жетонов"""
+        self._tokens[(user_id, token_id)] += delta
+        self._check_size()
+
+    def add_attempt(self, user_id: int, feature_type: str) -> None:
+        """Добавляет использованную бесплатную попытку"""
+        # date('now') в SQLite считается по UTC, дата попытки должна совпадать с ней
+        today = datetime.now(timezone.utc).date().isoformat()
+        used, _ = self._attempts.get((user_id, feature_type), (0, today))
+        self._attempts[(user_id, feature_type)] = (used + 1, today)
+        self._check_size()
+
+    def pending_token(self, user_id: int, token_id: int) -> int:
+        """Возвращает еще не записанное приращение жетонов"""
+        key = (user_id, token_id)
+        return self._tokens.get(key, 0) + self._flushing_tokens.get(key, 0)
+
+    def pending_tokens(self, user_id: int) -> Dict[int, int]:
+        """Возвращает еще не записанные приращения всех жетонов пользователя"""
+        result: Dict[int, int] = defaultdict(int)
+        for source in (self._flushing_tokens, self._tokens):
+            for (uid, token_id), delta in source.items():
+                if uid == user_id:
+                    result[token_id] += delta
+        return dict(result)
+
+    def pending_attempts(self, user_id: int) -> Dict[str, Tuple[int, Optional[str]]]:
+        """Возвращает еще не записанные попытки пользователя и дату последней из них по разделам"""
+        result: Dict[str, Tuple[int, Optional[str]]] = {}
+        for source in (self._flushing_attempts, self._attempts):
+            for (uid, feature_type), (delta, last_date) in source.items():
+                if uid == user_id:
+                    used, _ = result.get(feature_type, (0, None))
+                    result[feature_type] = (used + delta, last_date)
+        return result
+
+    async def consistent_read(self, read: Callable[[], Awaitable[T]]) -> T:
+        """Читает из базы так, чтобы результат сочетался с приращениями из буфера.
+
+        Если во время чтения приращения успели записаться в базу, чтение повторяется,
+        иначе они были бы учтены дважды или не учтены вовсе.
+        """
+        while True:
+            generation = self._generation
+            result = await read()
+            if generation == self._generation:
+                return result
+
+    async def flush(self) -> None:
+        """Записывает накопленные приращения одной транзакцией"""
+        async with self._flush_lock:
+            if not self._tokens and not self._attempts:
+                return
+            self._flushing_tokens, self._tokens = self._tokens, defaultdict(int)
+            self._flushing_attempts, self._attempts = self._attempts, {}
+            try:
+                async with self.pool.write() as db:
+                    await db.executemany("""
+                        INSERT INTO achievements (user_id, token_id, count, last_updated)
+                        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                        ON CONFLICT (user_id, token_id) DO UPDATE SET
+                            count = count + excluded.count,
+                            last_updated = CURRENT_TIMESTAMP
+                    """, [
+                        (user_id, token_id, delta)
+                        for (user_id, token_id), delta in self._flushing_tokens.items()
+                        if delta
+                    ])
+                    await db.executemany("""
+                        INSERT INTO free_attempts (user_id, feature_type, attempts_used, last_attempt_date)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT (user_id, feature_type) DO UPDATE SET
+                            attempts_used = attempts_used + excluded.attempts_used,
+                            last_attempt_date = excluded.last_attempt_date
+                    """, [
+                        (user_id, feature_type, used, last_date)
+                        for (user_id, feature_type), (used, last_date) in self._flushing_attempts.items()
+                    ])
+                    await db.commit()
+            except Exception:
+                # Возвращаем приращения в буфер, чтобы записать их при следующем сбросе
+                for key, delta in self._flushing_tokens.items():
+                    self._tokens[key] += delta
+                for key, (used, last_date) in self._flushing_attempts.items():
+                    newer_used, newer_date = self._attempts.get(key, (0, last_date))
+                    self._attempts[key] = (used + newer_used, newer_date)
+                raise
+            else:
+                self._generation += 1
+            finally:
+                self._flushing_tokens = {}
+                self._flushing_attempts = {}
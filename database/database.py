@@ -1,22 +1,97 @@
-import aiosqlite
 from datetime import datetime, date, timedelta
 from typing import Optional, List, Dict, Tuple
 from config import config
+from database.pool import ConnectionPool
+from database.migrations import run_migrations
+from database.counters import CounterBuffer
+from database.entitlements import Entitlement, EntitlementCache
+from database.catalog import Catalog, creativity_order
+from database.media_store import MediaStore, media_dir_for
+from database.pagination import Page, keyset_slice, page_from_rows
+from database.search import SEARCH_SECTIONS, count_query, match_expression, page_query
+import asyncio
+import hashlib
+import json
 import re
 import random
-import asyncio
 import logging
-import os
-import tempfile
 
 class Database:
     def __init__(self, db_path: str = config.DATABASE_PATH):
         self.db_path = db_path
-        self.temp_dir = tempfile.mkdtemp()  # Создаем временную директорию
+        self._pool: Optional[ConnectionPool] = None
+        self._counters: Optional[CounterBuffer] = None
+        self._catalog: Optional[Catalog] = None
+        self._spend_lock = asyncio.Lock()  # Списания жетонов идут по одному
+        self.media = MediaStore(media_dir_for(db_path))
+        if config.DAILY_CONTENT_MODE not in self.DAILY_CONTENT_MODES:
+            raise ValueError(f"Неизвестный режим выбора контента на день: {config.DAILY_CONTENT_MODE}")
+        self.daily_content_mode = config.DAILY_CONTENT_MODE
+        self.entitlements = EntitlementCache(
+            ttl_seconds=config.ENTITLEMENT_TTL_SECONDS,
+            max_size=config.ENTITLEMENT_CACHE_SIZE,
+        )
+
+    @property
+    def pool(self) -> ConnectionPool:
+        """Возвращает открытый пул соединений"""
+        if self._pool is None:
+            raise RuntimeError("Пул соединений не открыт: вызовите Database.connect() при запуске")
+        return self._pool
+
+    @property
+    def counters(self) -> CounterBuffer:
+        """Возвращает буфер отложенной записи счетчиков"""
+        if self._counters is None:
+            raise RuntimeError("Пул соединений не открыт: вызовите Database.connect() при запуске")
+        return self._counters
+
+    @property
+    def catalog(self) -> Catalog:
+        """Возвращает справочники в памяти"""
+        if self._catalog is None:
+            raise RuntimeError("Пул соединений не открыт: вызовите Database.connect() при запуске")
+        return self._catalog
+
+    async def connect(self) -> None:
+        """Открывает пул соединений (один раз при запуске бота)"""
+        if self._pool is not None:
+            return
+        pool = ConnectionPool(
+            self.db_path,
+            readers=config.DB_READ_POOL_SIZE,
+            pragmas=config.sqlite_pragmas(),
+        )
+        await pool.open()
+        self._pool = pool
+        self._counters = CounterBuffer(
+            pool,
+            flush_interval_ms=config.COUNTERS_FLUSH_INTERVAL_MS,
+            max_pending=config.COUNTERS_MAX_PENDING,
+        )
+        self._counters.start()
+        self._catalog = Catalog(pool)
+
+    async def get_sqlite_settings(self) -> dict:
+        """Возвращает действующие PRAGMA-настройки SQLite"""
+        return await self.pool.active_settings()
+
+    async def close(self) -> None:
+        """Закрывает пул соединений (при остановке бота)"""
+        if self._counters is not None:
+            try:
+                await self._counters.close()  # Записываем накопленные счетчики до закрытия пула
+            except Exception as e:
+                logging.error(f"Error flushing counters: {e}")
+            self._counters = None
+        self._catalog = None
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
 
     async def initialize_videos(self):
         """Инициализирует видео для упражнений и творчества"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             # Проверяем наличие видео в таблице
             cursor = await db.execute('SELECT COUNT(*) FROM creativity_videos')
             count = (await cursor.fetchone())[0]
@@ -56,217 +131,14 @@ class Database:
                 
                 await db.commit()
 
-    async def create_tables(self):
-        """Создает необходимые таблицы в базе данных"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Создаем таблицу для токенов
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS tokens (
-                    id INTEGER PRIMARY KEY,
-                    emoji TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    description TEXT NOT NULL
-                )
-            ''')
-            
-            # Создаем таблицу для пользователей
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    first_name TEXT,
-                    join_date TEXT DEFAULT (date('now'))
-                )
-            ''')
-            
-            # Создаем таблицу для достижений пользователей
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS user_achievements (
-                    user_id INTEGER,
-                    token_id INTEGER,
-                    count INTEGER DEFAULT 0,
-                    PRIMARY KEY (user_id, token_id),
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    FOREIGN KEY (token_id) REFERENCES tokens (id)
-                )
-            ''')
-            
-            # Создаем таблицу для ежедневных заданий
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS daily_tasks (
-                    id INTEGER PRIMARY KEY,
-                    text TEXT NOT NULL,
-                    description TEXT NOT NULL
-                )
-            ''')
-            
-            # Создаем таблицу для выполненных ежедневных заданий
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS user_daily_tasks (
-                    user_id INTEGER,
-                    task_id INTEGER,
-                    completion_date DATE,
-                    PRIMARY KEY (user_id, task_id, completion_date),
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    FOREIGN KEY (task_id) REFERENCES daily_tasks (id)
-                )
-            ''')
-            
-            # Создаем таблицу для загадок
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS riddles (
-                    id INTEGER PRIMARY KEY,
-                    text TEXT NOT NULL,
-                    answer TEXT NOT NULL
-                )
-            ''')
-            
-            # Создаем таблицу для решенных загадок
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS user_riddles (
-                    user_id INTEGER,
-                    riddle_id INTEGER,
-                    completion_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (user_id, riddle_id),
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    FOREIGN KEY (riddle_id) REFERENCES riddles (id)
-                )
-            ''')
-            
-            # Создаем таблицу для видео упражнений
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS exercise_videos (
-                    id INTEGER PRIMARY KEY,
-                    type TEXT NOT NULL,
-                    title TEXT NOT NULL,
-                    description TEXT NOT NULL,
-                    video_url TEXT NOT NULL
-                )
-            ''')
-            
-            # Создаем таблицу для просмотренных видео
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS user_exercise_views (
-                    user_id INTEGER,
-                    video_id INTEGER,
-                    view_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (user_id, video_id),
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    FOREIGN KEY (video_id) REFERENCES exercise_videos (id)
-                )
-            ''')
-            
-            # Создаем таблицу для видео творчества
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS creativity_videos (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    type TEXT NOT NULL,
-                    title TEXT NOT NULL,
-                    description TEXT NOT NULL,
-                    video_url TEXT NOT NULL,
-                    sequence_number INTEGER
-                )
-            ''')
-            
-            # Создаем таблицу для выполненных творческих заданий
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS user_creativity_completions (
-                    user_id INTEGER,
-                    video_id INTEGER,
-                    completion_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (user_id, video_id),
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    FOREIGN KEY (video_id) REFERENCES creativity_videos (id)
-                )
-            ''')
-            
-            # Добавляем токен "Алмаз" если его нет
-            await db.execute('''
-                INSERT OR IGNORE INTO tokens (id, emoji, name, description)
-                VALUES (9, "💎", "Алмаз", "Даётся за выполнение творческих мастер-классов")
-            ''')
-            
-            # Создаем таблицу подписок
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS subscriptions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    description TEXT NOT NULL,
-                    duration_days INTEGER NOT NULL,
-                    price REAL NOT NULL
-                )
-            """)
-            
-            # Создаем таблицу активных подписок пользователей
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS user_subscriptions (
-                    user_id INTEGER NOT NULL,
-                    subscription_id INTEGER NOT NULL,
-                    start_date TEXT NOT NULL DEFAULT (date('now')),
-                    end_date TEXT NOT NULL,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    FOREIGN KEY (user_id) REFERENCES users(id),
-                    FOREIGN KEY (subscription_id) REFERENCES subscriptions(id),
-                    PRIMARY KEY (user_id, subscription_id)
-                )
-            """)
-            
-            # Создаем таблицу для отслеживания бесплатных попыток
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS free_attempts (
-                    user_id INTEGER,
-                    feature TEXT,
-                    attempts INTEGER DEFAULT 0,
-                    PRIMARY KEY (user_id, feature),
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
-            
-            # Создаем таблицу рефералов
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS referrals (
-                    referrer_id INTEGER,
-                    referred_id INTEGER,
-                    join_date TEXT NOT NULL DEFAULT (date('now')),
-                    is_active BOOLEAN DEFAULT FALSE,
-                    reward_claimed BOOLEAN DEFAULT FALSE,
-                    PRIMARY KEY (referrer_id, referred_id),
-                    FOREIGN KEY (referrer_id) REFERENCES users (id),
-                    FOREIGN KEY (referred_id) REFERENCES users (id)
-                )
-            """)
-            
-            # Создаем таблицу puzzles для хранения изображений в двоичном формате
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS puzzles (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    image_data BLOB NOT NULL,
-                    answer1 TEXT NOT NULL,
-                    answer2 TEXT NOT NULL,
-                    answer3 TEXT NOT NULL
-                )
-            """)
-            
-            # Создаем таблицу для отслеживания прогресса пользователей в ребусах
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS user_puzzles (
-                    user_id INTEGER,
-                    puzzle_id INTEGER,
-                    date DATE,
-                    solved1 BOOLEAN DEFAULT FALSE,
-                    solved2 BOOLEAN DEFAULT FALSE,
-                    solved3 BOOLEAN DEFAULT FALSE,
-                    PRIMARY KEY (user_id, puzzle_id, date),
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    FOREIGN KEY (puzzle_id) REFERENCES puzzles (id)
-                )
-            """)
-            
-            await db.commit()
+    async def migrate(self) -> int:
+        """Приводит схему базы данных к последней версии"""
+        async with self.pool.write() as db:
+            return await run_migrations(db)
 
     async def initialize_subscriptions(self):
         """Инициализирует базовые подписки"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             # Проверяем, есть ли уже тарифы
             cursor = await db.execute("SELECT COUNT(*) FROM subscriptions")
             count = (await cursor.fetchone())[0]
@@ -309,8 +181,7 @@ class Database:
 
     async def get_user_subscription(self, user_id: int) -> Optional[dict]:
         """Получает информацию об активной подписке пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.read() as db:
             cursor = await db.execute("""
                 SELECT s.*, us.start_date, us.end_date
                 FROM subscriptions s
@@ -335,7 +206,7 @@ class Database:
             bool: True если подписка успешно добавлена/продлена, False в случае ошибки
         """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 # Получаем информацию о тарифе
                 cursor = await db.execute(
                     "SELECT duration_days FROM subscriptions WHERE id = ?",
@@ -378,92 +249,73 @@ class Database:
                 """, (user_id, subscription_id, start_date, new_end_date_str))
                 
                 await db.commit()
-                return True
+            self.entitlements.invalidate(user_id)
+            return True
         except Exception as e:
             print(f"Error adding subscription: {e}")
             return False
 
     async def get_all_subscriptions(self) -> List[Dict]:
         """Получает список всех доступных подписок"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("SELECT * FROM subscriptions ORDER BY duration_days")
-            return [dict(row) for row in await cursor.fetchall()]
+        return [dict(row) for row in self.catalog.snapshot.subscriptions]
 
-    async def check_feature_access(self, user_id: int, feature_type: str) -> bool:
-        """Проверяет доступ пользователя к функции"""
-        # Сначала проверяем активную подписку
-        subscription = await self.get_user_subscription(user_id)
-        if subscription:
-            return True
+    async def get_entitlement(self, user_id: int) -> Entitlement:
+        """Возвращает права пользователя: из кэша или из базы"""
+        entitlement = self.entitlements.get(user_id)
+        if entitlement is not None:
+            return entitlement
 
-        # Если нет подписки, проверяем бесплатные попытки
-        async with aiosqlite.connect(self.db_path) as db:
-            cursor = await db.execute("""
-                SELECT attempts_used, last_attempt_date
-                FROM free_attempts
-                WHERE user_id = ? AND feature_type = ?
-            """, (user_id, feature_type))
-            result = await cursor.fetchone()
+        generation = self.entitlements.generation
+        subscription = await self.get_user_subscription(user_id)
+        async with self.pool.read() as db:
+            async def read_attempts():
+                cursor = await db.execute("""
+                    SELECT feature_type, attempts_used, last_attempt_date
+                    FROM free_attempts
+                    WHERE user_id = ?
+                """, (user_id,))
+                return await cursor.fetchall()
 
-            # Для всех разделов кроме daily_tasks и drawing требуется подписка
-            if feature_type not in ['daily_tasks', 'drawing']:
-                return False
+            rows = await self.counters.consistent_read(read_attempts)
 
-            if not result:
-                # Первая попытка - разрешаем доступ
-                return True
+        attempts = {row[0]: (row[1], row[2]) for row in rows}
+        # Учитываем попытки, которые еще не записаны в базу
+        for feature_type, (pending_used, pending_date) in self.counters.pending_attempts(user_id).items():
+            used, _ = attempts.get(feature_type, (0, None))
+            attempts[feature_type] = (used + pending_used, pending_date)
 
-            attempts_used, last_attempt_date = result
-
-            if feature_type == 'daily_tasks':
-                # Проверяем, является ли это первым днем
-                if last_attempt_date:
-                    cursor = await db.execute("SELECT date('now')")
-                    current_date = (await cursor.fetchone())[0]
-                    if current_date == last_attempt_date:
-                        return True  # Разрешаем доступ в течение первого дня
-                    return False  # Блокируем доступ после первого дня
-                return True  # Первый день - разрешаем доступ
-            elif feature_type == 'drawing':
-                # Для рисования разрешаем только один мастер-класс
-                return attempts_used < 1
+        return self.entitlements.put(Entitlement(user_id, subscription, attempts), generation)
 
-            return False
+    async def check_feature_access(self, user_id: int, feature_type: str) -> bool:
+        """Проверяет доступ пользователя к функции"""
+        entitlement = await self.get_entitlement(user_id)
+        return entitlement.allows(feature_type)
 
     async def increment_feature_attempt(self, user_id: int, feature_type: str) -> None:
         """Увеличивает счетчик использования функции"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                INSERT INTO free_attempts (user_id, feature_type, attempts_used, last_attempt_date)
-                VALUES (?, ?, 1, date('now'))
-                ON CONFLICT (user_id, feature_type) DO UPDATE SET
-                attempts_used = attempts_used + 1,
-                last_attempt_date = date('now')
-            """, (user_id, feature_type))
-            await db.commit()
+        self.counters.add_attempt(user_id, feature_type)
+        self.entitlements.record_attempt(user_id, feature_type)
 
     async def get_all_tokens(self) -> List[Dict]:
         """Получает список всех токенов"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("""
-                SELECT id, emoji, name
-                FROM tokens
-                ORDER BY id
-            """)
-            return [dict(row) for row in await cursor.fetchall()]
+        return [dict(row) for row in self.catalog.snapshot.tokens]
+
+    async def get_tokens_page(self, cursor: Optional[int] = None, limit: int = 5, backward: bool = False) -> Page:
+        """Страница жетонов по возрастанию id из справочника в памяти"""
+        snapshot = self.catalog.snapshot
+        return keyset_slice(snapshot.tokens, snapshot.page_keys['tokens'], cursor, limit, backward)
 
     async def update_token(self, token_id: int, new_emoji: str, new_name: str) -> bool:
         """Обновление токена"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 await db.execute(
                     'UPDATE tokens SET emoji = ?, name = ? WHERE id = ?',
                     (new_emoji, new_name, token_id)
                 )
                 await db.commit()
-                return True
+            await self.catalog.reload()
+            return True
         except Exception:
             return False
 
@@ -495,7 +347,7 @@ class Database:
     async def add_user(self, telegram_id: int, username: Optional[str], full_name: str) -> bool:
         """Добавление нового пользователя"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 await db.execute(
                     'INSERT OR IGNORE INTO users (telegram_id, username, full_name) VALUES (?, ?, ?)',
                     (telegram_id, username, full_name)
@@ -507,7 +359,7 @@ class Database:
 
     async def get_user(self, telegram_id: int) -> Optional[dict]:
         """Получение информации о пользователе"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.read() as db:
             async with db.execute(
                 'SELECT * FROM users WHERE telegram_id = ?',
                 (telegram_id,)
@@ -523,100 +375,334 @@ class Database:
                     }
                 return None
 
-    async def get_all_users(self) -> List[dict]:
-        """Получение списка всех пользователей"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute('SELECT * FROM users') as cursor:
-                users = await cursor.fetchall()
-                return [{
-                    'id': user[0],
-                    'telegram_id': user[1],
-                    'username': user[2],
-                    'full_name': user[3],
-                    'registration_date': user[4]
-                } for user in users]
+    async def get_users_page(self, cursor: Optional[int] = None, limit: int = 5, backward: bool = False) -> Page:
+        """Страница пользователей по возрастанию id: после курсора или, если backward, перед ним"""
+        async with self.pool.read() as db:
+            if backward:
+                rows_cursor = await db.execute(
+                    """
+                    SELECT id, telegram_id, username, full_name, registration_date FROM users
+                    WHERE id < ? ORDER BY id DESC LIMIT ?
+                    """,
+                    (cursor, limit + 1)
+                )
+            else:
+                rows_cursor = await db.execute(
+                    """
+                    SELECT id, telegram_id, username, full_name, registration_date FROM users
+                    WHERE id > ? ORDER BY id LIMIT ?
+                    """,
+                    (cursor or 0, limit + 1)
+                )
+            rows = await rows_cursor.fetchall()
+        return page_from_rows(rows, limit, await self.count_users(), cursor, backward)
+
+    async def count_users(self) -> int:
+        """Количество зарегистрированных пользователей"""
+        async with self.pool.read() as db:
+            async with db.execute('SELECT COUNT(*) FROM users') as cursor:
+                return (await cursor.fetchone())[0]
+
+    async def get_broadcast_recipients(self, after_id: int, limit: int) -> List[Tuple[int, int]]:
+        """Следующая пачка получателей рассылки: (id, telegram_id) пользователей с id больше after_id"""
+        async with self.pool.read() as db:
+            async with db.execute(
+                'SELECT id, telegram_id FROM users WHERE id > ? ORDER BY id LIMIT ?',
+                (after_id, limit)
+            ) as cursor:
+                return [(row[0], row[1]) for row in await cursor.fetchall()]
+
+    async def create_broadcast(self, admin_id: int, from_chat_id: int, message_id: int,
+                               progress_message_id: int, total: int) -> int:
+        """Создает задание рассылки и возвращает его id"""
+        async with self.pool.write() as db:
+            cursor = await db.execute(
+                """
+                INSERT INTO broadcasts (admin_id, from_chat_id, message_id, progress_message_id, total)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (admin_id, from_chat_id, message_id, progress_message_id, total)
+            )
+            await db.commit()
+            return cursor.lastrowid
+
+    async def get_broadcast(self, broadcast_id: int) -> Optional[Dict]:
+        """Возвращает задание рассылки"""
+        async with self.pool.read() as db:
+            async with db.execute('SELECT * FROM broadcasts WHERE id = ?', (broadcast_id,)) as cursor:
+                row = await cursor.fetchone()
+                return dict(row) if row else None
+
+    async def get_running_broadcasts(self) -> List[Dict]:
+        """Возвращает незавершенные рассылки (например, прерванные перезапуском)"""
+        async with self.pool.read() as db:
+            async with db.execute("SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id") as cursor:
+                return [dict(row) for row in await cursor.fetchall()]
+
+    async def save_broadcast_progress(self, broadcast_id: int, cursor: int, sent: int, failed: int,
+                                      blocked: int) -> None:
+        """Сохраняет курсор и счетчики рассылки после обработанной пачки"""
+        async with self.pool.write() as db:
+            await db.execute(
+                """
+                UPDATE broadcasts SET cursor = ?, sent = ?, failed = ?, blocked = ?
+                WHERE id = ?
+                """,
+                (cursor, sent, failed, blocked, broadcast_id)
+            )
+            await db.commit()
+
+    async def finish_broadcast(self, broadcast_id: int, status: str) -> None:
+        """Переводит рассылку в конечное состояние: done, cancelled или failed"""
+        async with self.pool.write() as db:
+            await db.execute(
+                "UPDATE broadcasts SET status = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'running'",
+                (status, broadcast_id)
+            )
+            await db.commit()
 
     async def get_user_achievements(self, user_id: int) -> Dict[int, int]:
         """Получение количества всех жетонов пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            # Создаем записи достижений для пользователя, если их нет
-            tokens = await self.get_all_tokens()
-            for token in tokens:
-                await db.execute('''
-                    INSERT OR IGNORE INTO achievements (user_id, token_id, count)
-                    VALUES (?, ?, 0)
-                ''', (user_id, token['id']))
+        tokens = await self.get_all_tokens()
+        async with self.pool.read() as db:
+            async def read_counts():
+                async with db.execute('''
+                    SELECT token_id, count FROM achievements
+                    WHERE user_id = ?
+                ''', (user_id,)) as cursor:
+                    return await cursor.fetchall()
+
+            achievements = await self.counters.consistent_read(read_counts)
+
+        # Жетоны без записи в базе считаем нулевыми, добавляем еще не записанные приращения
+        result = {token['id']: 0 for token in tokens}
+        result.update({ach[0]: ach[1] for ach in achievements})
+        for token_id, delta in self.counters.pending_tokens(user_id).items():
+            result[token_id] = result.get(token_id, 0) + delta
+        return result
+
+    # Сколько элементов ежедневного контента выдается пользователю на день
+    DAILY_CONTENT_SIZE = {'daily_tasks': 5, 'riddles': 5, 'tongue_twisters': 3}
+
+    # Режимы выбора контента на день: назначения в базе, выбор по хэшу для пользователя или общий набор на всех
+    DAILY_CONTENT_MODES = ('assigned', 'hashed', 'global')
+
+    def _select_daily_content(self, content_type: str, rng: random.Random = random) -> List[int]:
+        """Выбирает случайные id контента на день из справочника в памяти"""
+        size = self.DAILY_CONTENT_SIZE[content_type]
+        sampler = self.catalog.snapshot.samplers[content_type]
+        if content_type == 'daily_tasks' and len(sampler) < size:
+            return []  # Заданий недостаточно, ничего не назначаем
+        return sampler.sample(size, rng)
+
+    def _daily_selection(self, content_type: str, user_id: int, day: date, completed: List[int]) -> List[int]:
+        """Вычисляет контент на день без записи в базу.
+
+        Выбор зависит только от пользователя, даты и состава справочника этого типа контента
+        (в режиме global - без пользователя), поэтому не меняется при перезапуске и правке других
+        справочников. Порядок - порядок выборки по хэшу: обработчики открывают элементы по номеру.
+        Уже выполненное сегодня остается в наборе, даже если состав изменился и выборка сдвинулась.
+        """
+        size = self.DAILY_CONTENT_SIZE[content_type]
+        sampler = self.catalog.snapshot.samplers[content_type]
+        owner = '' if self.daily_content_mode == 'global' else user_id
+        key = f"{content_type}:{owner}:{day.isoformat()}:{sampler.digest}"
+        seed = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+        items = getattr(self.catalog.snapshot, f"{content_type}_by_id")
+        selection = list(self._select_daily_content(content_type, random.Random(seed)))
+        # Выполненное, но выпавшее из выборки занимает места невыполненных с конца, остальные не сдвигаются
+        missing = [item_id for item_id in completed if item_id in items and item_id not in selection]
+        replaceable = [pos for pos in reversed(range(len(selection))) if selection[pos] not in completed]
+        for item_id in missing:
+            if replaceable:
+                selection[replaceable.pop(0)] = item_id
+            elif len(selection) < size:
+                selection.append(item_id)
+        return selection
+
+    async def _read_daily_assignment(self, db, content_type: str, user_id: int, day: date) -> List[Tuple[int, bool]]:
+        """Читает назначенный на день контент пользователя: (id контента, выполнено)"""
+        # В режимах без назначений здесь хранятся только выполненные элементы
+        query = {
+            'daily_tasks': """
+                SELECT task_id, completed FROM user_daily_tasks
+                WHERE user_id = ? AND date = ?
+                ORDER BY id
+            """,
+            'riddles': """
+                SELECT riddle_id, completed FROM user_riddles
+                WHERE user_id = ? AND date = ?
+                ORDER BY id
+            """,
+            'tongue_twisters': """
+                SELECT twister_id, completed FROM user_tongue_twisters
+                WHERE user_id = ? AND date = ?
+                ORDER BY id
+            """,
+        }[content_type]
+        async with db.execute(query, (user_id, day)) as cursor:
+            return [(row[0], bool(row[1])) for row in await cursor.fetchall()]
+
+    async def _insert_daily_assignments(self, db, content_type: str, rows: List[Tuple[int, int, date]]) -> None:
+        """Записывает назначения (user_id, id контента, дата) одним executemany"""
+        query = {
+            'daily_tasks': "INSERT INTO user_daily_tasks (user_id, task_id, date) VALUES (?, ?, ?)",
+            'riddles': "INSERT INTO user_riddles (user_id, riddle_id, date) VALUES (?, ?, ?)",
+            'tongue_twisters': "INSERT INTO user_tongue_twisters (user_id, twister_id, date) VALUES (?, ?, ?)",
+        }[content_type]
+        await db.executemany(query, rows)
+
+    async def _get_daily_assignment(self, content_type: str, user_id: int) -> List[Tuple[int, bool]]:
+        """Возвращает контент пользователя на сегодня.
+
+        Обычно его заранее назначает ночная задача, и здесь выполняется только чтение.
+        Назначение на месте остается запасным путем для тех, кого задача не охватила.
+        """
+        today = date.today()
+        async with self.pool.read() as db:
+            assignment = await self._read_daily_assignment(db, content_type, user_id, today)
+        if self.daily_content_mode != 'assigned':
+            completed = [item_id for item_id, _ in assignment]
+            return [
+                (item_id, item_id in completed)
+                for item_id in self._daily_selection(content_type, user_id, today, completed)
+            ]
+        if assignment:
+            return assignment
+
+        async with self.pool.write() as db:
+            # Повторная проверка под блокировкой писателя: назначение могло появиться параллельно
+            assignment = await self._read_daily_assignment(db, content_type, user_id, today)
+            if assignment:
+                return assignment
+            selected = self._select_daily_content(content_type)
+            if not selected:
+                return []
+            await self._insert_daily_assignments(db, content_type, [(user_id, item_id, today) for item_id in selected])
             await db.commit()
+            return [(item_id, False) for item_id in selected]
 
-            # Получаем количество жетонов
-            async with db.execute('''
-                SELECT token_id, count FROM achievements
-                WHERE user_id = ?
-            ''', (user_id,)) as cursor:
-                achievements = await cursor.fetchall()
-                return {ach[0]: ach[1] for ach in achievements}
+    async def _complete_daily_item(self, db, content_type: str, user_id: int, item_id: int, day: date) -> Optional[bool]:
+        """Отмечает элемент контента на день выполненным.
+
+        Возвращает True, если элемент выполнен сейчас, False, если он уже был выполнен,
+        и None, если этот элемент не выдавался пользователю на этот день.
+        """
+        if self.daily_content_mode == 'assigned':
+            query = {
+                'daily_tasks': """
+                    UPDATE user_daily_tasks SET completed = TRUE
+                    WHERE user_id = ? AND task_id = ? AND date = ? AND NOT completed
+                """,
+                'riddles': """
+                    UPDATE user_riddles SET completed = TRUE
+                    WHERE user_id = ? AND riddle_id = ? AND date = ? AND NOT completed
+                """,
+                'tongue_twisters': """
+                    UPDATE user_tongue_twisters SET completed = TRUE
+                    WHERE user_id = ? AND twister_id = ? AND date = ? AND NOT completed
+                """,
+            }[content_type]
+            cursor = await db.execute(query, (user_id, item_id, day))
+            if cursor.rowcount:
+                return True
+            assignment = await self._read_daily_assignment(db, content_type, user_id, day)
+            return False if any(assigned_id == item_id for assigned_id, _ in assignment) else None
+
+        # Без назначений в базу попадает только сам факт выполнения
+        completed = [completed_id for completed_id, _ in await self._read_daily_assignment(db, content_type, user_id, day)]
+        if item_id in completed:
+            return False
+        if item_id not in self._daily_selection(content_type, user_id, day, completed):
+            return None
+        query = {
+            'daily_tasks': "INSERT INTO user_daily_tasks (user_id, task_id, date, completed) VALUES (?, ?, ?, TRUE)",
+            'riddles': "INSERT INTO user_riddles (user_id, riddle_id, date, completed) VALUES (?, ?, ?, TRUE)",
+            'tongue_twisters': "INSERT INTO user_tongue_twisters (user_id, twister_id, date, completed) VALUES (?, ?, ?, TRUE)",
+        }[content_type]
+        await db.execute(query, (user_id, item_id, day))
+        return True
+
+    async def get_active_user_ids(self, since: date) -> List[int]:
+        """Возвращает пользователей, которые регистрировались или получали контент начиная с since"""
+        async with self.pool.read() as db:
+            async with db.execute("""
+                SELECT u.telegram_id FROM users u
+                WHERE date(u.registration_date) >= ?
+                   OR EXISTS (SELECT 1 FROM user_daily_tasks WHERE user_id = u.telegram_id AND date >= ?)
+                   OR EXISTS (SELECT 1 FROM user_riddles WHERE user_id = u.telegram_id AND date >= ?)
+                   OR EXISTS (SELECT 1 FROM user_tongue_twisters WHERE user_id = u.telegram_id AND date >= ?)
+            """, (since, since, since, since)) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    async def assign_daily_content(self, day: date, user_ids: List[int], chunk_size: int = 500) -> int:
+        """Заранее назначает задания, загадки и скороговорки на день.
+
+        Пользователи обрабатываются пачками: каждая пачка - одна транзакция с executemany,
+        между пачками блокировка писателя освобождается для запросов пользователей.
+        Уже получившие контент на этот день пропускаются. Возвращает число вставленных строк.
+        """
+        inserted = 0
+        for start in range(0, len(user_ids), max(1, chunk_size)):
+            chunk = json.dumps(user_ids[start:start + chunk_size])
+            async with self.pool.write() as db:
+                for content_type in self.DAILY_CONTENT_SIZE:
+                    query = {
+                        'daily_tasks': """
+                            SELECT DISTINCT user_id FROM user_daily_tasks
+                            WHERE user_id IN (SELECT value FROM json_each(?)) AND date = ?
+                        """,
+                        'riddles': """
+                            SELECT DISTINCT user_id FROM user_riddles
+                            WHERE user_id IN (SELECT value FROM json_each(?)) AND date = ?
+                        """,
+                        'tongue_twisters': """
+                            SELECT DISTINCT user_id FROM user_tongue_twisters
+                            WHERE user_id IN (SELECT value FROM json_each(?)) AND date = ?
+                        """,
+                    }[content_type]
+                    async with db.execute(query, (chunk, day)) as cursor:
+                        assigned = {row[0] for row in await cursor.fetchall()}
+
+                    rows = [
+                        (user_id, item_id, day)
+                        for user_id in user_ids[start:start + chunk_size] if user_id not in assigned
+                        for item_id in self._select_daily_content(content_type)
+                    ]
+                    await self._insert_daily_assignments(db, content_type, rows)
+                    inserted += len(rows)
+                await db.commit()
+        return inserted
 
     async def get_user_daily_tasks(self, user_id: int) -> Tuple[List[Dict], int]:
         """Получает задания пользователя на сегодня и количество выполненных"""
-        today = date.today()
-        async with aiosqlite.connect(self.db_path) as db:
-            # Проверяем, есть ли у пользователя задания на сегодня
-            async with db.execute('''
-                SELECT COUNT(*) FROM user_daily_tasks 
-                WHERE user_id = ? AND date = ?
-            ''', (user_id, today)) as cursor:
-                count = await cursor.fetchone()
-                
-            if count[0] == 0:
-                # Проверяем, достаточно ли заданий в базе данных
-                async with db.execute('SELECT COUNT(*) FROM daily_tasks') as cursor:
-                    total_tasks = (await cursor.fetchone())[0]
-                    if total_tasks < 5:
-                        return [], 0  # Возвращаем пустой список, если заданий недостаточно
-                
-                # Выбираем 5 случайных заданий
-                async with db.execute('SELECT id, task_text FROM daily_tasks') as cursor:
-                    all_tasks = await cursor.fetchall()
-                    selected_tasks = random.sample(all_tasks, 5)
-                    
-                # Добавляем задания пользователю
-                for task in selected_tasks:
-                    await db.execute('''
-                        INSERT INTO user_daily_tasks (user_id, task_id, date)
-                        VALUES (?, ?, ?)
-                    ''', (user_id, task[0], today))
-                await db.commit()
-            
-            # Получаем текущие задания пользователя
-            async with db.execute('''
-                SELECT dt.id, dt.task_text, udt.completed 
-                FROM daily_tasks dt
-                JOIN user_daily_tasks udt ON dt.id = udt.task_id
-                WHERE udt.user_id = ? AND udt.date = ?
-            ''', (user_id, today)) as cursor:
-                tasks = await cursor.fetchall()
-                tasks_list = [{
-                    'id': task[0],
-                    'text': task[1],
-                    'completed': bool(task[2])
-                } for task in tasks]
-                completed_count = sum(1 for task in tasks_list if task['completed'])
-                
-                return tasks_list, completed_count
+        tasks = self.catalog.snapshot.daily_tasks_by_id
+        tasks_list = [{
+            'id': task_id,
+            'text': tasks[task_id]['task_text'],
+            'completed': completed
+        } for task_id, completed in await self._get_daily_assignment('daily_tasks', user_id) if task_id in tasks]
+        completed_count = sum(1 for task in tasks_list if task['completed'])
+
+        return tasks_list, completed_count
 
     async def get_token_count(self, user_id: int, token_id: int) -> int:
         """Получает количество определенных токенов у пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute('''
-                SELECT count FROM achievements
-                WHERE user_id = ? AND token_id = ?
-            ''', (user_id, token_id)) as cursor:
-                result = await cursor.fetchone()
-                return result[0] if result else 0
+        async with self.pool.read() as db:
+            async def read_count():
+                async with db.execute('''
+                    SELECT count FROM achievements
+                    WHERE user_id = ? AND token_id = ?
+                ''', (user_id, token_id)) as cursor:
+                    result = await cursor.fetchone()
+                    return result[0] if result else 0
+
+            count = await self.counters.consistent_read(read_count)
+        return count + self.counters.pending_token(user_id, token_id)
 
     async def debug_achievements(self, user_id: int):
         """Отладочный метод для проверки таблицы achievements"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.read() as db:
             print("\nDebug achievements table:")
             async with db.execute('''
                 SELECT a.user_id, a.token_id, a.count, t.name
@@ -639,277 +725,128 @@ class Database:
                 for row in rows:
                     print(f"Task {row[0]}: {'Completed' if row[1] else 'Not completed'}")
 
-    async def complete_daily_task(self, user_id: int, task_id: int) -> bool:
-        """Отмечает задание как выполненное и начисляет токен"""
+    async def _award_tokens(self, db, user_id: int, query: str, params: tuple) -> Dict[int, int]:
+        """Выполняет UPSERT начисления жетонов и возвращает новые количества начисленных жетонов"""
+        async with db.execute(query, params) as cursor:
+            rows = await cursor.fetchall()
+        # Соединение писателя занято нами, поэтому буфер счетчиков сейчас не сбрасывается
+        return {row[0]: row[1] + self.counters.pending_token(user_id, row[0]) for row in rows}
+
+    async def complete_daily_task(self, user_id: int, task_id: int) -> Optional[Dict[int, int]]:
+        """Отмечает задание как выполненное и начисляет токены.
+
+        Возвращает новые количества начисленных жетонов или None, если задание уже выполнено.
+        """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 today = date.today()
                 
-                # Проверяем, не было ли задание уже выполнено
-                async with db.execute('''
-                    SELECT completed FROM user_daily_tasks
-                    WHERE user_id = ? AND task_id = ? AND date = ?
-                ''', (user_id, task_id, today)) as cursor:
-                    result = await cursor.fetchone()
-                    if result and result[0]:
-                        return False  # Задание уже выполнено
+                # Отмечаем задание как выполненное, если оно еще не выполнено
+                if not await self._complete_daily_item(db, 'daily_tasks', user_id, task_id, today):
+                    return None  # Задание уже выполнено
                 
-                # Отмечаем задание как выполненное
-                await db.execute('''
-                    UPDATE user_daily_tasks 
-                    SET completed = TRUE 
-                    WHERE user_id = ? AND task_id = ? AND date = ?
-                ''', (user_id, task_id, today))
-                
-                # Проверяем существование записи в achievements для токена "Звезда дня"
-                await db.execute('''
-                    INSERT OR IGNORE INTO achievements (user_id, token_id, count)
-                    VALUES (?, 2, 0)
-                ''', (user_id,))
-                
-                # Увеличиваем количество токенов за выполнение задания
-                await db.execute('''
-                    UPDATE achievements 
-                    SET count = count + 1,
+                # "Звезда дня" за задание и "Чемпион дня", если выполнены все 5 заданий
+                awards = await self._award_tokens(db, user_id, '''
+                    INSERT INTO achievements (user_id, token_id, count, last_updated)
+                    SELECT ?, 2, 1, CURRENT_TIMESTAMP
+                    UNION ALL
+                    SELECT ?, 8, 1, CURRENT_TIMESTAMP
+                    WHERE (
+                        SELECT COUNT(*) FROM user_daily_tasks
+                        WHERE user_id = ? AND date = ? AND completed = TRUE
+                    ) = 5
+                    ON CONFLICT (user_id, token_id) DO UPDATE SET
+                        count = count + 1,
                         last_updated = CURRENT_TIMESTAMP
-                    WHERE user_id = ? AND token_id = 2
-                ''', (user_id,))
-                
-                # Проверяем, все ли задания выполнены
-                async with db.execute('''
-                    SELECT COUNT(*) FROM user_daily_tasks
-                    WHERE user_id = ? AND date = ? AND completed = TRUE
-                ''', (user_id, today)) as cursor:
-                    completed_count = (await cursor.fetchone())[0]
-                    
-                # Если выполнены все 5 заданий, начисляем дополнительный токен
-                if completed_count == 5:
-                    # Проверяем существование записи для токена "Чемпион дня"
-                    await db.execute('''
-                        INSERT OR IGNORE INTO achievements (user_id, token_id, count)
-                        VALUES (?, 8, 0)
-                    ''', (user_id,))
-                    
-                    await db.execute('''
-                        UPDATE achievements 
-                        SET count = count + 1,
-                            last_updated = CURRENT_TIMESTAMP
-                        WHERE user_id = ? AND token_id = 8
-                    ''', (user_id,))
+                    RETURNING token_id, count
+                ''', (user_id, user_id, user_id, today))
                 
                 await db.commit()
-                print(f"Completing task {task_id} for user {user_id}")
-                print(f"Task completion success: True")
-                print(f"Completed tasks count: {completed_count}")
-                return True
+                return awards
         except Exception as e:
             print(f"Error in complete_daily_task: {e}")
-            return False 
+            return None
 
-    async def get_token_by_id(self, token_id: int) -> dict:
-        """Получает информацию о токене по его id."""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute(
-                "SELECT * FROM tokens WHERE id = ?",
-                (token_id,)
-            ) as cursor:
-                token = await cursor.fetchone()
-                if token:
-                    return dict(token)
-                return None 
+    async def get_token_by_id(self, token_id: int) -> Optional[Dict]:
+        """Получает информацию о токене по его ID"""
+        token = self.catalog.snapshot.tokens_by_id.get(token_id)
+        return dict(token) if token else None
 
     async def add_achievement(self, user_id: int, token_id: int) -> bool:
         """Добавляет достижение пользователю."""
-        max_retries = 3
-        retry_delay = 0.1  # 100ms
-        
-        for attempt in range(max_retries):
-            try:
-                async with aiosqlite.connect(self.db_path) as db:
-                    # Создаем запись, если её нет
-                    await db.execute('''
-                        INSERT OR IGNORE INTO achievements (user_id, token_id, count)
-                        VALUES (?, ?, 0)
-                    ''', (user_id, token_id))
-                    
-                    # Увеличиваем счетчик
-                    await db.execute('''
-                        UPDATE achievements 
-                        SET count = count + 1,
-                            last_updated = CURRENT_TIMESTAMP
-                        WHERE user_id = ? AND token_id = ?
-                    ''', (user_id, token_id))
-                    
-                    await db.commit()
-                    return True
-            except Exception as e:
-                if "database is locked" in str(e) and attempt < max_retries - 1:
-                    print(f"Database locked, retrying... (attempt {attempt + 1})")
-                    await asyncio.sleep(retry_delay * (attempt + 1))
-                    continue
-                print(f"Error in add_achievement: {e}")
-                return False
-        return False
+        self.counters.add_token(user_id, token_id)
+        return True
 
     async def get_random_token(self) -> dict:
         """Возвращает случайный токен из базы данных."""
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                async with db.execute(
-                    "SELECT * FROM tokens WHERE id != 8 ORDER BY RANDOM() LIMIT 1"
-                ) as cursor:
-                    token = await cursor.fetchone()
-                    if token:
-                        return dict(token)
-                    return None
-        except Exception as e:
-            print(f"Error in get_random_token: {e}")
-            return None 
+        snapshot = self.catalog.snapshot
+        # Из двух разных жетонов хотя бы один не "Чемпион дня", поэтому выбор равномерен среди остальных
+        candidates = [token_id for token_id in snapshot.samplers['tokens'].sample(2) if token_id != 8]
+        return dict(snapshot.tokens_by_id[candidates[0]]) if candidates else None
 
     async def get_user_riddles(self, user_id: int) -> Tuple[List[Dict], int]:
         """Получает загадки пользователя на сегодня и количество разгаданных"""
-        today = date.today()
-        async with aiosqlite.connect(self.db_path) as db:
-            # Проверяем, есть ли у пользователя загадки на сегодня
-            async with db.execute('''
-                SELECT COUNT(*) FROM user_riddles 
-                WHERE user_id = ? AND date = ?
-            ''', (user_id, today)) as cursor:
-                count = await cursor.fetchone()
-                
-            if count[0] == 0:
-                # Выбираем 5 случайных загадок
-                async with db.execute('SELECT id, question, answer FROM riddles ORDER BY RANDOM() LIMIT 5') as cursor:
-                    selected_riddles = await cursor.fetchall()
-                    
-                # Добавляем загадки пользователю
-                for riddle in selected_riddles:
-                    await db.execute('''
-                        INSERT INTO user_riddles (user_id, riddle_id, date)
-                        VALUES (?, ?, ?)
-                    ''', (user_id, riddle[0], today))
-                await db.commit()
-            
-            # Получаем текущие загадки пользователя
-            async with db.execute('''
-                SELECT r.id, r.question, r.answer, ur.completed 
-                FROM riddles r
-                JOIN user_riddles ur ON r.id = ur.riddle_id
-                WHERE ur.user_id = ? AND ur.date = ?
-                ORDER BY ur.id
-            ''', (user_id, today)) as cursor:
-                riddles = await cursor.fetchall()
-                
-            # Подсчитываем количество разгаданных загадок
-            async with db.execute('''
-                SELECT COUNT(*) FROM user_riddles
-                WHERE user_id = ? AND date = ? AND completed = TRUE
-            ''', (user_id, today)) as cursor:
-                completed_count = (await cursor.fetchone())[0]
-                
-            return [{
-                'id': riddle[0],
-                'question': riddle[1],
-                'answer': riddle[2],
-                'completed': riddle[3]
-            } for riddle in riddles], completed_count
+        riddles = self.catalog.snapshot.riddles_by_id
+        riddles_list = [{
+            'id': riddle_id,
+            'question': riddles[riddle_id]['question'],
+            'answer': riddles[riddle_id]['answer'],
+            'completed': completed
+        } for riddle_id, completed in await self._get_daily_assignment('riddles', user_id) if riddle_id in riddles]
+        completed_count = sum(1 for riddle in riddles_list if riddle['completed'])
+
+        return riddles_list, completed_count
 
     async def check_riddle_answer(self, user_id: int, riddle_id: int, answer: str) -> bool:
         """Проверяет ответ на загадку и отмечает её как разгаданную если ответ верный"""
         today = date.today()
-        async with aiosqlite.connect(self.db_path) as db:
-            # Получаем правильный ответ
-            async with db.execute('''
-                SELECT r.answer FROM riddles r
-                JOIN user_riddles ur ON r.id = ur.riddle_id
-                WHERE ur.user_id = ? AND ur.riddle_id = ? AND ur.date = ?
-            ''', (user_id, riddle_id, today)) as cursor:
-                result = await cursor.fetchone()
-                if not result:
-                    return False
-                
-                correct_answer = result[0].lower()
-                user_answer = answer.lower()
-                
-                if correct_answer == user_answer:
-                    # Отмечаем загадку как разгаданную
-                    await db.execute('''
-                        UPDATE user_riddles 
-                        SET completed = TRUE
-                        WHERE user_id = ? AND riddle_id = ? AND date = ?
-                    ''', (user_id, riddle_id, today))
-                    
-                    # Создаем запись для токена "Мудрец" если её нет
-                    await db.execute('''
-                        INSERT OR IGNORE INTO achievements (user_id, token_id, count)
-                        VALUES (?, 7, 0)
-                    ''', (user_id,))
-                    
-                    # Увеличиваем количество токенов за разгадку
-                    await db.execute('''
-                        UPDATE achievements 
-                        SET count = count + 1,
-                            last_updated = CURRENT_TIMESTAMP
-                        WHERE user_id = ? AND token_id = 7
-                    ''', (user_id,))
-                    
-                    # Проверяем, все ли загадки разгаданы
-                    async with db.execute('''
+        riddle = self.catalog.snapshot.riddles_by_id.get(riddle_id)
+        if not riddle or riddle['answer'].lower() != answer.lower():
+            return False
+
+        async with self.pool.write() as db:
+            # Отмечаем загадку как разгаданную
+            completed = await self._complete_daily_item(db, 'riddles', user_id, riddle_id, today)
+            if completed is None:
+                return False  # Эта загадка не выдавалась пользователю сегодня
+
+            if completed:
+                # "Мудрец" за разгадку и "Чемпион дня", если разгаданы все 5 загадок
+                await self._award_tokens(db, user_id, '''
+                    INSERT INTO achievements (user_id, token_id, count, last_updated)
+                    SELECT ?, 7, 1, CURRENT_TIMESTAMP
+                    UNION ALL
+                    SELECT ?, 8, 1, CURRENT_TIMESTAMP
+                    WHERE (
                         SELECT COUNT(*) FROM user_riddles
                         WHERE user_id = ? AND date = ? AND completed = TRUE
-                    ''', (user_id, today)) as cursor:
-                        completed_count = (await cursor.fetchone())[0]
-                        
-                        if completed_count == 5:
-                            # Создаем запись для токена "Чемпион дня" если её нет
-                            await db.execute('''
-                                INSERT OR IGNORE INTO achievements (user_id, token_id, count)
-                                VALUES (?, 8, 0)
-                            ''', (user_id,))
-                            
-                            # Добавляем супер-награду
-                            await db.execute('''
-                                UPDATE achievements 
-                                SET count = count + 1,
-                                    last_updated = CURRENT_TIMESTAMP
-                                WHERE user_id = ? AND token_id = 8
-                            ''', (user_id,))
-                    
-                    await db.commit()
-                    return True
-                return False
+                    ) = 5
+                    ON CONFLICT (user_id, token_id) DO UPDATE SET
+                        count = count + 1,
+                        last_updated = CURRENT_TIMESTAMP
+                    RETURNING token_id, count
+                ''', (user_id, user_id, user_id, today))
+
+            await db.commit()
+            return True
 
     async def spend_token(self, user_id: int, token_id: int) -> bool:
         """Тратит жетон пользователя"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                # Проверяем количество жетонов
-                async with db.execute('''
-                    SELECT count FROM achievements
-                    WHERE user_id = ? AND token_id = ?
-                ''', (user_id, token_id)) as cursor:
-                    result = await cursor.fetchone()
-                    if not result or result[0] <= 0:
-                        return False
-                    
-                # Уменьшаем количество жетонов
-                await db.execute('''
-                    UPDATE achievements
-                    SET count = count - 1
-                    WHERE user_id = ? AND token_id = ?
-                ''', (user_id, token_id))
-                
-                await db.commit()
+            # Списания выполняются по одному под блокировкой: остаток читается вместе с еще
+            # не записанными изменениями буфера, а между проверкой и списанием нет await,
+            # поэтому одновременные списания не уведут счетчик в минус
+            async with self._spend_lock:
+                if await self.get_token_count(user_id, token_id) <= 0:
+                    return False
+                self.counters.add_token(user_id, token_id, -1)
                 return True
         except Exception:
             return False 
 
     async def get_next_exercise_video(self, user_id: int, exercise_type: str) -> dict:
         """Получает следующее доступное видео для пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
+        async with self.pool.read() as db:
             
             # Получаем текущую дату
             today = datetime.now().date()
@@ -919,11 +856,11 @@ class Database:
                 SELECT v.*, 
                        (SELECT status FROM user_exercise_views 
                         WHERE user_id = ? AND video_id = v.id 
-                        AND date(date) = date(?) 
+                        AND date = date(?) 
                         ORDER BY id DESC LIMIT 1) as view_status,
                        (SELECT COUNT(*) FROM user_exercise_views 
                         WHERE user_id = ? AND video_id = v.id 
-                        AND date(date) = date(?) 
+                        AND date = date(?) 
                         AND (status = 'full' OR status = 'partial')) as completed_today
                 FROM exercise_videos v
                 WHERE v.type = ?
@@ -942,9 +879,6 @@ class Database:
 
     async def record_exercise_view(self, user_id: int, video_id: int, status: str) -> None:
         """Записывает просмотр упражнения пользователем"""
-        max_retries = 3
-        base_delay = 0.1  # 100ms
-        
         # Нормализуем статус
         if status == 'not_done':
             normalized_status = 'not_done'
@@ -953,94 +887,48 @@ class Database:
         else:
             normalized_status = 'full'
         
-        for attempt in range(max_retries):
-            try:
-                async with aiosqlite.connect(self.db_path) as db:
-                    await db.execute(
-                        """
-                        INSERT INTO user_exercise_views (user_id, video_id, status, date)
-                        VALUES (?, ?, ?, date('now'))
-                        """,
-                        (user_id, video_id, normalized_status)
-                    )
-                    await db.commit()
-                    return
-                    
-            except Exception as e:
-                delay = base_delay * (2 ** attempt)  # Экспоненциальная задержка
-                print(f"Attempt {attempt + 1} failed. Retrying in {delay:.2f}s...")
-                await asyncio.sleep(delay)
-                continue
-                
-        print(f"Failed to record exercise view after {max_retries} attempts") 
+        try:
+            async with self.pool.write() as db:
+                await db.execute(
+                    """
+                    INSERT INTO user_exercise_views (user_id, video_id, status, date)
+                    VALUES (?, ?, ?, date('now'))
+                    """,
+                    (user_id, video_id, normalized_status)
+                )
+                await db.commit()
+        except Exception as e:
+            print(f"Error recording exercise view: {e}")
+
+    async def is_exercise_rewarded_today(self, user_id: int, video_id: int) -> bool:
+        """Проверяет, получал ли пользователь сегодня жетон за упражнение"""
+        today = datetime.now().date()
+        async with self.pool.read() as db:
+            cursor = await db.execute("""
+                SELECT COUNT(*) FROM user_exercise_views
+                WHERE user_id = ? AND video_id = ?
+                AND date = date(?)
+                AND (status = 'full' OR status = 'partial')
+            """, (user_id, video_id, today))
+            return (await cursor.fetchone())[0] > 0
 
     async def get_exercise_video(self, video_id: int) -> dict:
         """Получает информацию о видео по его ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute(
-                "SELECT * FROM exercise_videos WHERE id = ?",
-                (video_id,)
-            ) as cursor:
-                video = await cursor.fetchone()
-                if video:
-                    return dict(video)
-                return None 
+        video = self.catalog.snapshot.exercise_videos_by_id.get(video_id)
+        return dict(video) if video else None
 
     async def update_achievement(self, user_id: int, token_id: int) -> bool:
         """Обновляет достижения пользователя"""
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                # Проверяем, есть ли уже запись для этого пользователя и токена
-                async with db.execute(
-                    'SELECT count FROM achievements WHERE user_id = ? AND token_id = ?',
-                    (user_id, token_id)
-                ) as cursor:
-                    result = await cursor.fetchone()
-                    
-                if result is None:
-                    # Если записи нет, создаем новую
-                    await db.execute(
-                        'INSERT INTO achievements (user_id, token_id, count, last_updated) VALUES (?, ?, 1, CURRENT_TIMESTAMP)',
-                        (user_id, token_id)
-                    )
-                else:
-                    # Если запись есть, увеличиваем счетчик
-                    await db.execute(
-                        'UPDATE achievements SET count = count + 1, last_updated = CURRENT_TIMESTAMP WHERE user_id = ? AND token_id = ?',
-                        (user_id, token_id)
-                    )
-                
-                await db.commit()
-                return True
-        except Exception as e:
-            print(f"Ошибка при обновлении достижений: {e}")
-            return False
-
-    async def get_token_by_id(self, token_id: int) -> Optional[Dict]:
-        """Получает информацию о токене по его ID"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute(
-                'SELECT * FROM tokens WHERE id = ?',
-                (token_id,)
-            ) as cursor:
-                token = await cursor.fetchone()
-                if token:
-                    return {
-                        'id': token[0],
-                        'emoji': token[1],
-                        'name': token[2],
-                        'description': token[3]
-                    }
-                return None 
+        self.counters.add_token(user_id, token_id)
+        return True
 
     async def get_user_puzzles(self, user_id: int) -> Tuple[List[Dict], int]:
         """Получает ребусы пользователя на сегодня и количество решенных"""
         today = date.today()
-        async with aiosqlite.connect(self.db_path) as db:
-            # Проверяем, есть ли у пользователя ребусы на сегодня
+        async with self.pool.read() as db:
+            # Изображения не читаем: для отправки достаточно file_id Telegram
             async with db.execute('''
-                SELECT p.id, p.image_data, p.answer1, p.answer2, p.answer3,
+                SELECT p.id, p.telegram_file_id, p.answer1, p.answer2, p.answer3,
                        up.solved1, up.solved2, up.solved3
                 FROM puzzles p
                 LEFT JOIN user_puzzles up ON p.id = up.puzzle_id 
@@ -1053,24 +941,16 @@ class Database:
                 if not puzzles:
                     return [], 0
 
-                # Сохраняем изображения во временные файлы
-                result = []
-                for puzzle in puzzles:
-                    # Создаем временный файл для изображения
-                    temp_path = os.path.join(self.temp_dir, f"puzzle_{puzzle[0]}.png")
-                    with open(temp_path, "wb") as f:
-                        f.write(puzzle[1])
-                    
-                    result.append({
-                        'id': puzzle[0],
-                        'image_path': temp_path,
-                        'answers': [puzzle[2], puzzle[3], puzzle[4]],
-                        'solved': [
-                            puzzle[5] if puzzle[5] is not None else False,
-                            puzzle[6] if puzzle[6] is not None else False,
-                            puzzle[7] if puzzle[7] is not None else False
-                        ]
-                    })
+                result = [{
+                    'id': puzzle[0],
+                    'file_id': puzzle[1],
+                    'answers': [puzzle[2], puzzle[3], puzzle[4]],
+                    'solved': [
+                        puzzle[5] if puzzle[5] is not None else False,
+                        puzzle[6] if puzzle[6] is not None else False,
+                        puzzle[7] if puzzle[7] is not None else False
+                    ]
+                } for puzzle in puzzles]
 
                 # Подсчитываем общее количество решенных ребусов
                 total_solved = sum(
@@ -1080,228 +960,164 @@ class Database:
                 
                 return result, total_solved
 
+    async def get_puzzle_image_path(self, puzzle_id: int) -> Optional[str]:
+        """Возвращает путь к файлу изображения ребуса (нужен только для первой загрузки в Telegram)"""
+        async with self.pool.read() as db:
+            async with db.execute("SELECT image_sha256 FROM puzzles WHERE id = ?", (puzzle_id,)) as cursor:
+                row = await cursor.fetchone()
+        return self.media.find(row[0]) if row else None
+
+    async def set_puzzle_file_id(self, puzzle_id: int, file_id: Optional[str]) -> None:
+        """Сохраняет file_id Telegram загруженного изображения ребуса"""
+        async with self.pool.write() as db:
+            await db.execute("UPDATE puzzles SET telegram_file_id = ? WHERE id = ?", (file_id, puzzle_id))
+            await db.commit()
+
     async def check_puzzle_answer(self, user_id: int, puzzle_id: int, rebus_number: int, answer: str) -> bool:
         """Проверяет ответ на ребус и отмечает его как решенный если ответ верный"""
         today = date.today()
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.write() as db:
             # Получаем правильный ответ
             async with db.execute('''
                 SELECT answer1, answer2, answer3 FROM puzzles
                 WHERE id = ?
             ''', (puzzle_id,)) as cursor:
                 answers = await cursor.fetchone()
-                if not answers:
-                    return False
-                
-                # Проверяем ответ
-                correct_answer = answers[rebus_number - 1].lower()
-                if answer.lower() != correct_answer:
-                    return False
-                
-                # Проверяем, существует ли запись в user_puzzles
+            if not answers:
+                return False
+            
+            # Проверяем ответ
+            correct_answer = answers[rebus_number - 1].lower()
+            if answer.lower() != correct_answer:
+                return False
+            
+            # Отмечаем ребус как решенный
+            solved_field = f'solved{rebus_number}'
+            cursor = await db.execute(f'''
+                UPDATE user_puzzles
+                SET {solved_field} = TRUE
+                WHERE user_id = ? AND puzzle_id = ? AND date = ? AND NOT {solved_field}
+            ''', (user_id, puzzle_id, today))
+            newly_solved = cursor.rowcount > 0
+            
+            if not newly_solved:
+                # Записи на сегодня еще нет - создаем ее
                 async with db.execute('''
                     SELECT COUNT(*) FROM user_puzzles
                     WHERE user_id = ? AND puzzle_id = ? AND date = ?
                 ''', (user_id, puzzle_id, today)) as cursor:
-                    count = await cursor.fetchone()
-                    
-                if count[0] == 0:
-                    # Создаем новую запись
-                    await db.execute('''
-                        INSERT INTO user_puzzles (user_id, puzzle_id, date)
-                        VALUES (?, ?, ?)
+                    exists = (await cursor.fetchone())[0] > 0
+                if not exists:
+                    await db.execute(f'''
+                        INSERT INTO user_puzzles (user_id, puzzle_id, date, {solved_field})
+                        VALUES (?, ?, ?, TRUE)
                     ''', (user_id, puzzle_id, today))
-                
-                # Отмечаем ребус как решенный
-                solved_field = f'solved{rebus_number}'
-                await db.execute(f'''
-                    UPDATE user_puzzles
-                    SET {solved_field} = TRUE
-                    WHERE user_id = ? AND puzzle_id = ? AND date = ?
-                ''', (user_id, puzzle_id, today))
-                
-                await db.commit()
-                
-                # Проверяем, все ли ребусы на этой картинке решены
-                async with db.execute('''
-                    SELECT solved1, solved2, solved3
-                    FROM user_puzzles
-                    WHERE user_id = ? AND puzzle_id = ? AND date = ?
-                ''', (user_id, puzzle_id, today)) as cursor:
-                    solved = await cursor.fetchone()
-                    
-                if solved and all(solved):
-                    # Добавляем достижение "Мастер ребусов"
-                    await self.add_achievement(user_id, 3)
-                    
-                    # Проверяем, все ли ребусы на сегодня решены
-                    async with db.execute('''
-                        SELECT COUNT(*) FROM user_puzzles
-                        WHERE user_id = ? AND date = ? AND
-                              solved1 = TRUE AND solved2 = TRUE AND solved3 = TRUE
-                    ''', (user_id, today)) as cursor:
-                        all_solved_count = await cursor.fetchone()
-                        
-                    if all_solved_count and all_solved_count[0] == 3:
-                        # Добавляем достижение "Чемпион дня"
-                        await self.add_achievement(user_id, 8)
-                
-                return True
+                    newly_solved = True
+            
+            if newly_solved:
+                # "Мастер ребусов", если решена вся картинка, и "Чемпион дня", если решены все 3 картинки
+                await self._award_tokens(db, user_id, '''
+                    WITH solved AS (
+                        SELECT puzzle_id FROM user_puzzles
+                        WHERE user_id = ? AND date = ?
+                          AND solved1 = TRUE AND solved2 = TRUE AND solved3 = TRUE
+                    )
+                    INSERT INTO achievements (user_id, token_id, count, last_updated)
+                    SELECT ?, 3, 1, CURRENT_TIMESTAMP
+                    WHERE EXISTS (SELECT 1 FROM solved WHERE puzzle_id = ?)
+                    UNION ALL
+                    SELECT ?, 8, 1, CURRENT_TIMESTAMP
+                    WHERE EXISTS (SELECT 1 FROM solved WHERE puzzle_id = ?)
+                      AND (SELECT COUNT(*) FROM solved) = 3
+                    ON CONFLICT (user_id, token_id) DO UPDATE SET
+                        count = count + 1,
+                        last_updated = CURRENT_TIMESTAMP
+                    RETURNING token_id, count
+                ''', (user_id, today, user_id, puzzle_id, user_id, puzzle_id))
+            
+            await db.commit()
+        
+        return True
 
     async def get_user_tongue_twisters(self, user_id: int) -> Tuple[List[Dict], int]:
         """Получает скороговорки пользователя на сегодня и количество выполненных"""
-        today = date.today()
-        async with aiosqlite.connect(self.db_path) as db:
-            # Проверяем, есть ли у пользователя скороговорки на сегодня
-            async with db.execute('''
-                SELECT COUNT(*) FROM user_tongue_twisters 
-                WHERE user_id = ? AND date = ?
-            ''', (user_id, today)) as cursor:
-                count = await cursor.fetchone()
-                
-            if count[0] == 0:
-                # Выбираем 3 случайные скороговорки
-                async with db.execute('SELECT id, text FROM tongue_twisters') as cursor:
-                    all_twisters = await cursor.fetchall()
-                    selected_twisters = random.sample(all_twisters, 3)
-                    
-                # Добавляем скороговорки пользователю
-                for twister in selected_twisters:
-                    await db.execute('''
-                        INSERT INTO user_tongue_twisters (user_id, twister_id, date)
-                        VALUES (?, ?, ?)
-                    ''', (user_id, twister[0], today))
-                await db.commit()
-            
-            # Получаем текущие скороговорки пользователя
-            async with db.execute('''
-                SELECT tt.id, tt.text, utt.completed 
-                FROM tongue_twisters tt
-                JOIN user_tongue_twisters utt ON tt.id = utt.twister_id
-                WHERE utt.user_id = ? AND utt.date = ?
-            ''', (user_id, today)) as cursor:
-                twisters = await cursor.fetchall()
-                twisters_list = [{
-                    'id': twister[0],
-                    'text': twister[1],
-                    'completed': bool(twister[2])
-                } for twister in twisters]
-                completed_count = sum(1 for twister in twisters_list if twister['completed'])
-                
-                return twisters_list, completed_count
+        twisters = self.catalog.snapshot.tongue_twisters_by_id
+        twisters_list = [{
+            'id': twister_id,
+            'text': twisters[twister_id]['text'],
+            'completed': completed
+        } for twister_id, completed in await self._get_daily_assignment('tongue_twisters', user_id) if twister_id in twisters]
+        completed_count = sum(1 for twister in twisters_list if twister['completed'])
+
+        return twisters_list, completed_count
 
-    async def complete_tongue_twister(self, user_id: int, twister_id: int) -> bool:
-        """Отмечает скороговорку как выполненную и начисляет токен"""
+    async def complete_tongue_twister(self, user_id: int, twister_id: int) -> Optional[Dict[int, int]]:
+        """Отмечает скороговорку как выполненную и начисляет токены.
+
+        Возвращает новые количества начисленных жетонов или None, если скороговорка уже выполнена.
+        """
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 today = date.today()
                 
-                # Проверяем, не была ли скороговорка уже выполнена
-                async with db.execute('''
-                    SELECT completed FROM user_tongue_twisters
-                    WHERE user_id = ? AND twister_id = ? AND date = ?
-                ''', (user_id, twister_id, today)) as cursor:
-                    result = await cursor.fetchone()
-                    if result and result[0]:
-                        return False  # Скороговорка уже выполнена
-                
-                # Отмечаем скороговорку как выполненную
-                await db.execute('''
-                    UPDATE user_tongue_twisters 
-                    SET completed = TRUE 
-                    WHERE user_id = ? AND twister_id = ? AND date = ?
-                ''', (user_id, twister_id, today))
-                
-                # Проверяем существование записи в achievements для токена "Говорун"
-                await db.execute('''
-                    INSERT OR IGNORE INTO achievements (user_id, token_id, count)
-                    VALUES (?, 4, 0)
-                ''', (user_id,))
+                # Отмечаем скороговорку как выполненную, если она еще не выполнена
+                if not await self._complete_daily_item(db, 'tongue_twisters', user_id, twister_id, today):
+                    return None  # Скороговорка уже выполнена
                 
-                # Увеличиваем количество токенов за выполнение скороговорки
-                await db.execute('''
-                    UPDATE achievements 
-                    SET count = count + 1,
+                # "Говорун" за скороговорку и "Чемпион дня", если выполнены все 3 скороговорки
+                awards = await self._award_tokens(db, user_id, '''
+                    INSERT INTO achievements (user_id, token_id, count, last_updated)
+                    SELECT ?, 4, 1, CURRENT_TIMESTAMP
+                    UNION ALL
+                    SELECT ?, 8, 1, CURRENT_TIMESTAMP
+                    WHERE (
+                        SELECT COUNT(*) FROM user_tongue_twisters
+                        WHERE user_id = ? AND date = ? AND completed = TRUE
+                    ) = 3
+                    ON CONFLICT (user_id, token_id) DO UPDATE SET
+                        count = count + 1,
                         last_updated = CURRENT_TIMESTAMP
-                    WHERE user_id = ? AND token_id = 4
-                ''', (user_id,))
-                
-                # Проверяем, все ли скороговорки выполнены
-                async with db.execute('''
-                    SELECT COUNT(*) FROM user_tongue_twisters
-                    WHERE user_id = ? AND date = ? AND completed = TRUE
-                ''', (user_id, today)) as cursor:
-                    completed_count = (await cursor.fetchone())[0]
-                    
-                # Если выполнены все 3 скороговорки, начисляем дополнительный токен
-                if completed_count == 3:
-                    # Проверяем существование записи для токена "Чемпион дня"
-                    await db.execute('''
-                        INSERT OR IGNORE INTO achievements (user_id, token_id, count)
-                        VALUES (?, 8, 0)
-                    ''', (user_id,))
-                    
-                    await db.execute('''
-                        UPDATE achievements 
-                        SET count = count + 1,
-                            last_updated = CURRENT_TIMESTAMP
-                        WHERE user_id = ? AND token_id = 8
-                    ''', (user_id,))
+                    RETURNING token_id, count
+                ''', (user_id, user_id, user_id, today))
                 
                 await db.commit()
-                return True
+                return awards
         except Exception as e:
             print(f"Error in complete_tongue_twister: {e}")
-            return False 
+            return None
 
     async def get_next_creativity_video(self, user_id: int, section: str, current_id: Optional[int] = None, direction: str = "next") -> Optional[Dict]:
         """Получает следующее видео для творчества"""
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                
-                # Получаем все видео для данного раздела
-                query = """
-                    SELECT id, title, description, video_url
-                    FROM creativity_videos
-                    WHERE type = ?
-                    ORDER BY sequence_number
-                """
-                async with db.execute(query, (section,)) as cursor:
-                    videos = await cursor.fetchall()
-                    
-                if not videos:
-                    return None
-                    
-                # Если текущее видео не указано, возвращаем первое
-                if current_id is None:
-                    return dict(videos[0])
-                    
-                # Находим индекс текущего видео
-                current_index = next((i for i, v in enumerate(videos) if v['id'] == current_id), -1)
-                if current_index == -1:
-                    return dict(videos[0])
-                    
-                # Определяем следующий индекс
-                if direction == "next":
-                    next_index = current_index + 1
-                else:
-                    next_index = current_index - 1
-                    
-                # Проверяем границы
-                if 0 <= next_index < len(videos):
-                    return dict(videos[next_index])
-                    
-                return None
-                
-        except Exception as e:
-            print(f"Error getting next creativity video: {e}")
+        # Видео раздела уже упорядочены по sequence_number
+        videos = self.catalog.snapshot.creativity_videos_by_type.get(section, ())
+        if not videos:
             return None
 
+        # Если текущее видео не указано, возвращаем первое
+        if current_id is None:
+            return dict(videos[0])
+
+        # Находим индекс текущего видео
+        current_index = next((i for i, v in enumerate(videos) if v['id'] == current_id), -1)
+        if current_index == -1:
+            return dict(videos[0])
+
+        # Определяем следующий индекс
+        if direction == "next":
+            next_index = current_index + 1
+        else:
+            next_index = current_index - 1
+
+        # Проверяем границы
+        if 0 <= next_index < len(videos):
+            return dict(videos[next_index])
+
+        return None
+
     async def complete_creativity_masterclass(self, user_id: int, video_id: int) -> bool:
         """Отмечает мастер-класс как выполненный"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 await db.execute("""
                     INSERT OR IGNORE INTO user_creativity_completions
                     (user_id, video_id) VALUES (?, ?)
@@ -1314,24 +1130,13 @@ class Database:
 
     async def get_creativity_video_by_id(self, video_id: int) -> Optional[Dict]:
         """Получает видео по ID"""
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                async with db.execute("""
-                    SELECT id, title, description, video_url, type
-                    FROM creativity_videos
-                    WHERE id = ?
-                """, (video_id,)) as cursor:
-                    video = await cursor.fetchone()
-                    return dict(video) if video else None
-        except Exception as e:
-            print(f"Error getting creativity video by id: {e}")
-            return None
+        video = self.catalog.snapshot.creativity_videos_by_id.get(video_id)
+        return dict(video) if video else None
 
     async def is_creativity_masterclass_completed(self, user_id: int, video_id: int) -> bool:
         """Проверяет, выполнен ли мастер-класс пользователем"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.read() as db:
                 async with db.execute("""
                     SELECT COUNT(*) FROM user_creativity_completions
                     WHERE user_id = ? AND video_id = ?
@@ -1349,7 +1154,7 @@ class Database:
     async def add_referral(self, referrer_id: int, referred_id: int) -> bool:
         """Добавляет реферала в базу"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 await db.execute("""
                     INSERT OR IGNORE INTO referrals (referrer_id, referred_id)
                     VALUES (?, ?)
@@ -1363,7 +1168,7 @@ class Database:
     async def activate_referral(self, referrer_id: int, referred_id: int) -> bool:
         """Активирует реферала после покупки подписки"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 # Активируем реферала
                 await db.execute("""
                     UPDATE referrals 
@@ -1395,14 +1200,16 @@ class Database:
                     """, (referrer_id, referred_id))
                 
                 await db.commit()
-                return True
+            # Подписка реферера могла продлиться
+            self.entitlements.invalidate(referrer_id)
+            return True
         except Exception as e:
             logging.error(f"Error activating referral: {e}")
             return False
 
     async def get_referral_stats(self, user_id: int) -> dict:
         """Получает статистику рефералов пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.read() as db:
             # Получаем количество активных рефералов
             cursor = await db.execute("""
                 SELECT COUNT(*) 
@@ -1424,28 +1231,17 @@ class Database:
                 'total': total_count
             } 
 
-    async def cleanup_temp_files(self):
-        """Очищает временные файлы"""
-        for filename in os.listdir(self.temp_dir):
-            file_path = os.path.join(self.temp_dir, filename)
-            try:
-                if os.path.isfile(file_path):
-                    os.unlink(file_path)
-            except Exception as e:
-                print(f"Error deleting {file_path}: {e}")
-        try:
-            os.rmdir(self.temp_dir)
-        except Exception as e:
-            print(f"Error deleting temp directory {self.temp_dir}: {e}") 
-
-    async def add_puzzle(self, image_data: bytes, answer1: str, answer2: str, answer3: str) -> bool:
+    async def add_puzzle(self, image_data: bytes, answer1: str, answer2: str, answer3: str,
+                         telegram_file_id: Optional[str] = None) -> bool:
         """Добавляет новый ребус в базу данных"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute(
-                    'INSERT INTO puzzles (image_data, answer1, answer2, answer3) VALUES (?, ?, ?, ?)',
-                    (image_data, answer1, answer2, answer3)
-                )
+            # Одинаковые изображения хранятся в одном файле
+            image_sha256 = await asyncio.to_thread(self.media.put, image_data)
+            async with self.pool.write() as db:
+                await db.execute('''
+                    INSERT INTO puzzles (image_sha256, image_size, answer1, answer2, answer3, telegram_file_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (image_sha256, len(image_data), answer1, answer2, answer3, telegram_file_id))
                 await db.commit()
                 return True
         except Exception as e:
@@ -1455,7 +1251,7 @@ class Database:
     async def add_creativity_video(self, title: str, description: str, video_url: str, video_type: str, sequence_number: Optional[int] = None) -> bool:
         """Добавляет новое видео для творчества"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 if sequence_number is None and video_type == "sculpting":
                     # Для лепки автоматически определяем следующий sequence_number
                     async with db.execute("""
@@ -1471,124 +1267,142 @@ class Database:
                 """, (video_type, title, description, video_url, sequence_number))
                 
                 await db.commit()
-                return True
+            await self.catalog.reload()
+            return True
         except Exception as e:
             print(f"Error adding creativity video: {e}")
             return False 
 
-    async def get_all_creativity_videos(self, video_type: str) -> List[Dict]:
-        """Получает все видео творчества определенного типа"""
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                async with db.execute("""
-                    SELECT id, title, description, video_url, sequence_number
-                    FROM creativity_videos
-                    WHERE type = ?
-                    ORDER BY sequence_number
-                """, (video_type,)) as cursor:
-                    videos = await cursor.fetchall()
-                    return [dict(video) for video in videos]
-        except Exception as e:
-            print(f"Error getting creativity videos: {e}")
-            return [] 
-
-    async def get_all_puzzles(self) -> List[Dict]:
-        """Возвращает все ребусы из базы данных"""
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                cursor = await db.execute(
-                    "SELECT id, answer1, answer2, answer3 FROM puzzles"
-                )
-                puzzles = await cursor.fetchall()
-                return [dict(puzzle) for puzzle in puzzles]
-        except Exception as e:
-            print(f"Ошибка при получении списка ребусов: {e}")
-            return [] 
+    async def get_media_file_id(self, source_url: str) -> Optional[str]:
+        """Возвращает file_id Telegram для ранее загруженного видео"""
+        async with self.pool.read() as db:
+            async with db.execute("SELECT file_id FROM media_file_ids WHERE source_url = ?", (source_url,)) as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row else None
 
-    async def get_all_daily_tasks(self) -> List[Dict]:
-        """Возвращает все ежедневные задания из базы данных"""
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                cursor = await db.execute(
-                    "SELECT id, task_text as text FROM daily_tasks"
-                )
-                tasks = await cursor.fetchall()
-                return [dict(task) for task in tasks]
-        except Exception as e:
-            print(f"Ошибка при получении списка ежедневных заданий: {e}")
-            return []
+    async def set_media_file_id(self, source_url: str, file_id: str, file_unique_id: Optional[str] = None) -> None:
+        """Сохраняет file_id Telegram после успешной загрузки видео"""
+        async with self.pool.write() as db:
+            await db.execute("""
+                INSERT INTO media_file_ids (source_url, file_id, file_unique_id, updated_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (source_url) DO UPDATE SET
+                    file_id = excluded.file_id,
+                    file_unique_id = excluded.file_unique_id,
+                    updated_at = CURRENT_TIMESTAMP
+            """, (source_url, file_id, file_unique_id))
+            await db.commit()
 
-    async def get_exercise_videos(self, exercise_type: str) -> List[Dict]:
-        """Возвращает все видео упражнений определенного типа"""
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                cursor = await db.execute(
-                    "SELECT id, title, description, video_url FROM exercise_videos WHERE type = ?",
-                    (exercise_type,)
-                )
-                videos = await cursor.fetchall()
-                return [dict(video) for video in videos]
-        except Exception as e:
-            print(f"Ошибка при получении списка видео упражнений: {e}")
-            return []
+    async def delete_media_file_id(self, source_url: str) -> None:
+        """Удаляет недействительный file_id"""
+        async with self.pool.write() as db:
+            await db.execute("DELETE FROM media_file_ids WHERE source_url = ?", (source_url,))
+            await db.commit()
 
-    async def get_all_riddles(self) -> List[Dict]:
-        """Возвращает все загадки из базы данных"""
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                cursor = await db.execute(
-                    "SELECT id, question as text, answer FROM riddles"
-                )
-                riddles = await cursor.fetchall()
-                return [dict(riddle) for riddle in riddles]
-        except Exception as e:
-            print(f"Ошибка при получении списка загадок: {e}")
-            return [] 
+    async def get_all_video_urls(self) -> List[str]:
+        """Возвращает ссылки всех видео упражнений и мастер-классов без повторов"""
+        snapshot = self.catalog.snapshot
+        videos = list(snapshot.exercise_videos_by_id.values()) + list(snapshot.creativity_videos_by_id.values())
+        return list(dict.fromkeys(video['video_url'] for video in videos if video['video_url']))
 
-    async def get_all_creativity(self, creativity_type: str) -> List[Dict]:
-        """Возвращает все элементы творчества определенного типа"""
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                cursor = await db.execute(
-                    "SELECT id, title, description, video_url FROM creativity_videos WHERE type = ?",
-                    (creativity_type,)
+    async def get_all_creativity_videos(self, video_type: str) -> List[Dict]:
+        """Получает все видео творчества определенного типа"""
+        return [
+            {key: video[key] for key in ('id', 'title', 'description', 'video_url', 'sequence_number')}
+            for video in self.catalog.snapshot.creativity_videos_by_type.get(video_type, ())
+        ]
+
+    async def get_puzzles_page(self, cursor: Optional[int] = None, limit: int = 5, backward: bool = False) -> Page:
+        """Страница ребусов по возрастанию id без чтения изображений"""
+        async with self.pool.read() as db:
+            if backward:
+                rows_cursor = await db.execute(
+                    "SELECT id, answer1, answer2, answer3 FROM puzzles WHERE id < ? ORDER BY id DESC LIMIT ?",
+                    (cursor, limit + 1)
                 )
-                items = await cursor.fetchall()
-                return [dict(item) for item in items]
-        except Exception as e:
-            print(f"Ошибка при получении списка элементов творчества: {e}")
-            return [] 
-
-    async def get_all_tongue_twisters(self) -> List[Dict]:
-        """Возвращает все скороговорки из базы данных"""
-        try:
-            async with aiosqlite.connect(self.db_path) as db:
-                db.row_factory = aiosqlite.Row
-                cursor = await db.execute(
-                    "SELECT id, text FROM tongue_twisters"
+            else:
+                rows_cursor = await db.execute(
+                    "SELECT id, answer1, answer2, answer3 FROM puzzles WHERE id > ? ORDER BY id LIMIT ?",
+                    (cursor or 0, limit + 1)
                 )
-                twisters = await cursor.fetchall()
-                return [dict(twister) for twister in twisters]
-        except Exception as e:
-            print(f"Ошибка при получении списка скороговорок: {e}")
-            return [] 
+            rows = await rows_cursor.fetchall()
+            async with db.execute("SELECT COUNT(*) FROM puzzles") as count_cursor:
+                total = (await count_cursor.fetchone())[0]
+        return page_from_rows(rows, limit, total, cursor, backward)
+
+    async def get_content_page(self, content_type: str, cursor: Optional[int] = None, limit: int = 5,
+                               backward: bool = False) -> Page:
+        """Страница контента для админ-панели: справочники листаются по снимку в памяти, ребусы - в базе"""
+        if content_type == "puzzles":
+            return await self.get_puzzles_page(cursor, limit, backward)
+
+        snapshot = self.catalog.snapshot
+        cursor_key = cursor
+        convert = dict
+        if content_type == "daily":
+            rows, keys = snapshot.daily_tasks, snapshot.page_keys['daily_tasks']
+            convert = lambda task: {'id': task['id'], 'text': task['task_text']}
+        elif content_type == "riddles":
+            rows, keys = snapshot.riddles, snapshot.page_keys['riddles']
+            convert = lambda riddle: {'id': riddle['id'], 'text': riddle['question'], 'answer': riddle['answer']}
+        elif content_type == "twisters":
+            rows, keys = snapshot.tongue_twisters, snapshot.page_keys['tongue_twisters']
+            convert = lambda twister: {'id': twister['id'], 'text': twister['text']}
+        elif content_type.startswith("creativity_"):
+            video_type = content_type.split("_")[1]
+            rows = snapshot.creativity_videos_by_type.get(video_type, ())
+            keys = snapshot.page_keys.get(f'creativity_videos:{video_type}', ())
+            # Мастер-классы идут по sequence_number, курсор - id элемента
+            item = snapshot.creativity_videos_by_id.get(cursor)
+            cursor_key = creativity_order(item) if item else None
+        elif content_type in ("articular", "neuro"):
+            rows = snapshot.exercise_videos_by_type.get(content_type, ())
+            keys = snapshot.page_keys.get(f'exercise_videos:{content_type}', ())
+        else:
+            rows, keys = (), ()
+        return keyset_slice(rows, keys, cursor_key, limit, backward, convert)
+
+    async def search_counts(self, text: str) -> Dict[str, int]:
+        """Количество совпадений полнотекстового поиска по разделам админ-панели"""
+        match = match_expression(text)
+        if match is None:
+            return {}
+        counts = {}
+        async with self.pool.read() as db:
+            for section in SEARCH_SECTIONS:
+                async with db.execute(count_query(section), (match,)) as cursor:
+                    counts[section] = (await cursor.fetchone())[0]
+        return counts
+
+    async def search(self, section: str, text: str, total: int, cursor: Optional[int] = None,
+                     limit: int = 5, backward: bool = False) -> Page:
+        """Страница совпадений полнотекстового поиска в разделе, лучшие совпадения первыми.
+
+        Курсор - rowid крайнего совпадения, его rank пересчитывается тем же MATCH; total берется
+        из search_counts, посчитанного один раз при поиске.
+        """
+        match = match_expression(text)
+        if match is None or section not in SEARCH_SECTIONS:
+            return Page([], 0, limit, has_prev=False, has_next=False)
+        async with self.pool.read() as db:
+            async with db.execute(
+                page_query(section, backward),
+                (match, cursor, match, cursor, cursor, limit + 1)
+            ) as rows_cursor:
+                rows = await rows_cursor.fetchall()
+        return page_from_rows(rows, limit, total, cursor, backward)
 
     async def add_riddle(self, question: str, answer: str) -> bool:
         """Добавляет новую загадку в базу данных"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 await db.execute(
                     "INSERT INTO riddles (question, answer) VALUES (?, ?)",
                     (question, answer)
                 )
                 await db.commit()
-                return True
+            await self.catalog.reload()
+            return True
         except Exception as e:
             print(f"Ошибка при добавлении загадки: {e}")
             return False 
@@ -1596,13 +1410,14 @@ class Database:
     async def add_daily_task(self, task_text: str) -> bool:
         """Добавляет новое ежедневное задание в базу данных"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 await db.execute(
                     "INSERT INTO daily_tasks (task_text) VALUES (?)",
                     (task_text,)
                 )
                 await db.commit()
-                return True
+            await self.catalog.reload()
+            return True
         except Exception as e:
             print(f"Ошибка при добавлении ежедневного задания: {e}")
             return False 
@@ -1610,13 +1425,14 @@ class Database:
     async def add_tongue_twister(self, text: str) -> bool:
         """Добавляет новую скороговорку в базу данных"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 await db.execute(
                     "INSERT INTO tongue_twisters (text) VALUES (?)",
                     (text,)
                 )
                 await db.commit()
-                return True
+            await self.catalog.reload()
+            return True
         except Exception as e:
             print(f"Ошибка при добавлении скороговорки: {e}")
             return False 
@@ -1624,13 +1440,14 @@ class Database:
     async def add_exercise_video(self, title: str, description: str, video_url: str, video_type: str) -> bool:
         """Добавляет новое видео упражнения в базу данных"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 await db.execute("""
                     INSERT INTO exercise_videos (type, title, description, video_url)
                     VALUES (?, ?, ?, ?)
                 """, (video_type, title, description, video_url))
                 await db.commit()
-                return True
+            await self.catalog.reload()
+            return True
         except Exception as e:
             print(f"Ошибка при добавлении видео упражнения: {e}")
             return False 
@@ -1638,7 +1455,7 @@ class Database:
     async def delete_content(self, content_type: str, content_id: int) -> bool:
         """Удаляет контент указанного типа"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self.pool.write() as db:
                 # Определяем таблицу на основе типа контента
                 tables = {
                     "daily": "daily_tasks",
@@ -1660,22 +1477,59 @@ class Database:
                 # Удаляем контент
                 await db.execute(f"DELETE FROM {table} WHERE id = ?", (content_id,))
                 await db.commit()
-                return True
+            if table != "puzzles":
+                await self.catalog.reload()
+            return True
         except Exception as e:
             print(f"Ошибка при удалении контента: {e}")
             return False 
 
-    async def get_all_user_subscriptions(self) -> List[Dict]:
-        """Получает список всех активных подписок пользователей"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            cursor = await db.execute("""
-                SELECT us.id, us.user_id, us.subscription_id, us.start_date, us.end_date,
-                       u.username as user_name, s.name as tariff_name
+    async def get_user_subscriptions_page(self, cursor: Optional[int] = None, limit: int = 5,
+                                          backward: bool = False) -> Page:
+        """Страница активных подписок от поздних к ранним; курсор - rowid подписки, его end_date берется из базы"""
+        async with self.pool.read() as db:
+            if cursor is None:
+                rows_cursor = await db.execute("""
+                    SELECT us.rowid as id, us.user_id, us.subscription_id, us.start_date, us.end_date,
+                           COALESCE(u.username, u.full_name) as user_name, s.name as tariff_name
+                    FROM user_subscriptions us
+                    JOIN users u ON us.user_id = u.telegram_id
+                    JOIN subscriptions s ON us.subscription_id = s.id
+                    WHERE us.is_active = TRUE
+                    ORDER BY us.end_date DESC, us.rowid DESC
+                    LIMIT ?
+                """, (limit + 1,))
+            elif backward:
+                rows_cursor = await db.execute("""
+                    SELECT us.rowid as id, us.user_id, us.subscription_id, us.start_date, us.end_date,
+                           COALESCE(u.username, u.full_name) as user_name, s.name as tariff_name
+                    FROM user_subscriptions us
+                    JOIN users u ON us.user_id = u.telegram_id
+                    JOIN subscriptions s ON us.subscription_id = s.id
+                    WHERE us.is_active = TRUE
+                      AND (us.end_date, us.rowid) > ((SELECT end_date FROM user_subscriptions WHERE rowid = ?), ?)
+                    ORDER BY us.end_date, us.rowid
+                    LIMIT ?
+                """, (cursor, cursor, limit + 1))
+            else:
+                rows_cursor = await db.execute("""
+                    SELECT us.rowid as id, us.user_id, us.subscription_id, us.start_date, us.end_date,
+                           COALESCE(u.username, u.full_name) as user_name, s.name as tariff_name
+                    FROM user_subscriptions us
+                    JOIN users u ON us.user_id = u.telegram_id
+                    JOIN subscriptions s ON us.subscription_id = s.id
+                    WHERE us.is_active = TRUE
+                      AND (us.end_date, us.rowid) < ((SELECT end_date FROM user_subscriptions WHERE rowid = ?), ?)
+                    ORDER BY us.end_date DESC, us.rowid DESC
+                    LIMIT ?
+                """, (cursor, cursor, limit + 1))
+            rows = await rows_cursor.fetchall()
+            async with db.execute("""
+                SELECT COUNT(*)
                 FROM user_subscriptions us
-                JOIN users u ON us.user_id = u.id
+                JOIN users u ON us.user_id = u.telegram_id
                 JOIN subscriptions s ON us.subscription_id = s.id
                 WHERE us.is_active = TRUE
-                ORDER BY us.end_date DESC
-            """)
-            return [dict(row) for row in await cursor.fetchall()] 
\ No newline at end of file
+            """) as count_cursor:
+                total = (await count_cursor.fetchone())[0]
+        return page_from_rows(rows, limit, total, cursor, backward)
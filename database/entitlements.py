@@ -0,0 +1,103 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+# Разделы, которые доступны без подписки по бесплатной попытке
+FREE_TRIAL_FEATURES = ('daily_tasks', 'drawing')
+
+
+def _utc_today() -> str:
+    """Текущая дата по UTC в том же формате, что и date('now') в SQLite"""
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+@dataclass
+class Entitlement:
+    """Права пользователя: активная подписка и использованные бесплатные попытки"""
+    user_id: int
+    subscription: Optional[dict]
+    # feature_type -> (использовано попыток, дата последней попытки)
+    attempts: Dict[str, Tuple[int, Optional[str]]] = field(default_factory=dict)
+    expires_at: float = 0.0
+
+    @property
+    def has_subscription(self) -> bool:
+        return self.subscription is not None
+
+    def allows(self, feature_type: str) -> bool:
+        """Проверяет доступ к разделу"""
+        if self.has_subscription:
+            return True
+
+        # Для всех разделов кроме daily_tasks и drawing требуется подписка
+        if feature_type not in FREE_TRIAL_FEATURES:
+            return False
+
+        if feature_type not in self.attempts:
+            # Первая попытка - разрешаем доступ
+            return True
+
+        attempts_used, last_attempt_date = self.attempts[feature_type]
+        if feature_type == 'daily_tasks':
+            # Разрешаем доступ только в течение первого дня
+            return not last_attempt_date or last_attempt_date == _utc_today()
+        # Для рисования разрешаем только один мастер-класс
+        return attempts_used < 1
+
+    def record_attempt(self, feature_type: str) -> None:
+        """Учитывает новую бесплатную попытку"""
+        used, _ = self.attempts.get(feature_type, (0, None))
+        self.attempts[feature_type] = (used + 1, _utc_today())
+
+
+class EntitlementCache:
+    """Кэш прав пользователей в памяти процесса с ограниченным временем жизни"""
+
+    def __init__(self, ttl_seconds: int = 300, max_size: int = 10000):
+        self.ttl = ttl_seconds
+        self.max_size = max(1, max_size)
+        self._entries: "OrderedDict[int, Entitlement]" = OrderedDict()
+        # Растет при каждой инвалидации: загрузка, начатая до нее, не попадет в кэш
+        self.generation = 0
+
+    def _expires_at(self, subscription: Optional[dict]) -> float:
+        expires_at = time.time() + self.ttl
+        if subscription and subscription.get('end_date'):
+            # Подписка действует до конца дня end_date (по UTC, как date('now') в SQLite)
+            end = datetime.strptime(subscription['end_date'], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+            expires_at = min(expires_at, (end + timedelta(days=1)).timestamp())
+        return expires_at
+
+    def get(self, user_id: int) -> Optional[Entitlement]:
+        entitlement = self._entries.get(user_id)
+        if entitlement is None:
+            return None
+        if entitlement.expires_at <= time.time():
+            # Истек срок кэша или самой подписки
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return entitlement
+
+    def put(self, entitlement: Entitlement, generation: int) -> Entitlement:
+        """Сохраняет загруженные права, если за время загрузки их никто не инвалидировал"""
+        entitlement.expires_at = self._expires_at(entitlement.subscription)
+        if generation != self.generation:
+            return entitlement
+        self._entries[entitlement.user_id] = entitlement
+        self._entries.move_to_end(entitlement.user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entitlement
+
+    def record_attempt(self, user_id: int, feature_type: str) -> None:
+        """Учитывает бесплатную попытку в закэшированных правах"""
+        entitlement = self._entries.get(user_id)
+        if entitlement is not None:
+            entitlement.record_attempt(feature_type)
+
+    def invalidate(self, user_id: int) -> None:
+        self.generation += 1
+        self._entries.pop(user_id, None)
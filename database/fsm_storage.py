@@ -0,0 +1,204 @@
+import asyncio
+import pickle
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database.database import Database
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class _Record:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище состояний FSM в таблице fsm_storage той же базы SQLite.
+
+    Данные сериализуются pickle и живут ttl_seconds с последней записи. Изменения
+    копятся в памяти и записываются одной транзакцией при вызове flush (после
+    обработки каждого обновления), поэтому несколько update_data в одном
+    обработчике дают одну запись. Брошенные сессии раз в sweep_interval секунд
+    удаляет фоновая очистка.
+    """
+
+    def __init__(self, db: Database, ttl_seconds: int = 86400, sweep_interval: float = 600,
+                 sweep_batch_size: int = 500, clock: Callable[[], float] = time.time):
+        self.db = db
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+        self.sweep_batch_size = sweep_batch_size
+        self._clock = clock
+        self._task: Optional[asyncio.Task] = None
+        # Измененные, но еще не записанные состояния
+        self._pending: Dict[str, _Record] = {}
+        # Состояния, которые сейчас записываются: до коммита они все еще видны при чтении
+        self._flushing: Dict[str, _Record] = {}
+        self._flush_lock = asyncio.Lock()
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        parts = [key.bot_id, key.chat_id, key.user_id]
+        if key.thread_id is not None:
+            parts.append(key.thread_id)
+        parts.append(key.destiny)
+        return ":".join(map(str, parts))
+
+    async def _load(self, key: str) -> _Record:
+        record = self._pending.get(key) or self._flushing.get(key)
+        if record is not None:
+            return record
+        async with self.db.pool.read() as conn:
+            cursor = await conn.execute(
+                "SELECT state, data FROM fsm_storage WHERE key = ? AND expires_at > ?",
+                (key, self._clock())
+            )
+            row = await cursor.fetchone()
+        if row is None:
+            return _Record()
+        return _Record(row[0], pickle.loads(row[1]) if row[1] else {})
+
+    async def _edit(self, key: str) -> _Record:
+        """Возвращает запись для изменения, помечая ее к записи в базу"""
+        record = self._pending.get(key)
+        if record is None:
+            loaded = await self._load(key)
+            record = self._pending.setdefault(key, _Record(loaded.state, dict(loaded.data)))
+        return record
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._edit(self._key(key))
+        record.state = state.state if isinstance(state, State) else state
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(self._key(key))).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._edit(self._key(key))
+        record.data = data.copy()
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._load(self._key(key))).data.copy()
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        record = await self._edit(self._key(key))
+        record.data.update(data)
+        return record.data.copy()
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> None:
+        """Записывает все накопленные изменения одной транзакцией"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            self._flushing, self._pending = self._pending, {}
+            touched_at = self._clock()
+            expires_at = touched_at + self.ttl_seconds
+            upserts = []
+            deletes = []
+            for key, record in self._flushing.items():
+                if record.state is None and not record.data:
+                    deletes.append((key,))  # Пустое состояние хранить незачем
+                else:
+                    data = pickle.dumps(record.data, pickle.HIGHEST_PROTOCOL) if record.data else None
+                    upserts.append((key, record.state, data, touched_at, expires_at))
+            try:
+                async with self.db.pool.write() as conn:
+                    if upserts:
+                        await conn.executemany(
+                            """
+                            INSERT INTO fsm_storage (key, state, data, touched_at, expires_at)
+                            VALUES (?, ?, ?, ?, ?)
+                            ON CONFLICT(key) DO UPDATE SET
+                                state = excluded.state,
+                                data = excluded.data,
+                                touched_at = excluded.touched_at,
+                                expires_at = excluded.expires_at
+                            """,
+                            upserts
+                        )
+                    if deletes:
+                        await conn.executemany("DELETE FROM fsm_storage WHERE key = ?", deletes)
+                    await conn.commit()
+            except Exception:
+                # Не записанное возвращаем в буфер, не затирая более новые изменения
+                for key, record in self._flushing.items():
+                    self._pending.setdefault(key, record)
+                raise
+            finally:
+                self._flushing = {}
+
+    async def sweep(self) -> int:
+        """Удаляет истекшие сессии пачками и возвращает их количество"""
+        removed = 0
+        while True:
+            async with self.db.pool.write() as conn:
+                cursor = await conn.execute(
+                    """
+                    DELETE FROM fsm_storage WHERE key IN (
+                        SELECT key FROM fsm_storage WHERE expires_at <= ? LIMIT ?
+                    )
+                    """,
+                    (self._clock(), self.sweep_batch_size)
+                )
+                await conn.commit()
+            removed += cursor.rowcount
+            if cursor.rowcount < self.sweep_batch_size:
+                return removed
+            await asyncio.sleep(0)  # Между пачками пропускаем вперед запись обработчиков
+
+    def start(self) -> None:
+        """Запускает фоновую очистку брошенных сессий"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                removed = await self.sweep()
+                if removed:
+                    logger.info(f"Удалено брошенных сессий FSM: {removed}")
+            except Exception as e:
+                logger.error(f"Ошибка при очистке сессий FSM: {e}")
+            await asyncio.sleep(self.sweep_interval)
+
+    async def stats(self) -> Dict[str, float]:
+        """Число живых сессий, их примерный размер в байтах и время самого старого обращения"""
+        async with self.db.pool.read() as conn:
+            cursor = await conn.execute(
+                """
+                SELECT COUNT(*),
+                       COALESCE(SUM(LENGTH(key) + COALESCE(LENGTH(state), 0) + COALESCE(LENGTH(data), 0)), 0),
+                       MIN(touched_at)
+                FROM fsm_storage WHERE expires_at > ?
+                """,
+                (self._clock(),)
+            )
+            entries, size, oldest = await cursor.fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "oldest_touched_at": oldest,
+            "pending": len(self._pending),
+        }
+
+    async def close(self) -> None:
+        """Останавливает очистку и записывает оставшиеся изменения (вызывать до закрытия базы)"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,57 @@
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+
+def media_dir_for(db_path: str) -> str:
+    """Каталог медиафайлов рядом с файлом базы данных"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), "media")
+
+
+class MediaStore:
+    """Хранилище медиафайлов, адресуемых по SHA-256 содержимого.
+
+    Одинаковые файлы хранятся один раз, в базе остается только хэш. Файл лежит
+    в подкаталоге по первым двум символам хэша, чтобы каталоги не разрастались.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.isfile(self.path(sha256))
+
+    def put(self, data: bytes) -> str:
+        """Сохраняет содержимое и возвращает его хэш (повторное сохранение ничего не пишет)"""
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.path(sha256)
+        if os.path.isfile(path):
+            return sha256
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Пишем во временный файл и переименовываем, чтобы читатели не увидели файл наполовину
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return sha256
+
+    def remove(self, sha256: str) -> None:
+        try:
+            os.unlink(self.path(sha256))
+        except FileNotFoundError:
+            pass
+
+    def find(self, sha256: Optional[str]) -> Optional[str]:
+        """Возвращает путь к файлу, если он есть в хранилище"""
+        if sha256 and self.exists(sha256):
+            return self.path(sha256)
+        return None
@@ -0,0 +1,480 @@
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Sequence, Union
+
+import aiosqlite
+
+from database.media_store import MediaStore, media_dir_for
+from database.search import FTS_TABLES
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# Шаг миграции: SQL-выражение или корутина, получающая соединение
+Step = Union[str, Callable[[aiosqlite.Connection], Awaitable[None]]]
+
+
+@dataclass(frozen=True)
+class Migration:
+    """Одна версия схемы базы данных"""
+    version: int
+    description: str
+    steps: Sequence[Step]
+
+
+async def _ensure_columns(db: aiosqlite.Connection, table: str, columns: Dict[str, str]) -> None:
+    """Добавляет в таблицу недостающие столбцы без пересоздания таблицы"""
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        existing = {row[1] for row in await cursor.fetchall()}
+    for name, ddl in columns.items():
+        if name not in existing:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+            logger.info(f"Миграция: в таблицу {table} добавлен столбец {name}")
+
+
+async def _reconcile_legacy_columns(db: aiosqlite.Connection) -> None:
+    """Приводит таблицы, созданные старым create_tables, к столбцам, которые используют запросы"""
+    await _ensure_columns(db, "users", {
+        "telegram_id": "INTEGER",
+        "full_name": "TEXT",
+        "registration_date": "TIMESTAMP",
+    })
+    await _ensure_columns(db, "daily_tasks", {"task_text": "TEXT"})
+    await _ensure_columns(db, "riddles", {"question": "TEXT"})
+    for table in ("user_daily_tasks", "user_riddles", "user_tongue_twisters"):
+        await _ensure_columns(db, table, {
+            "completed": "BOOLEAN DEFAULT FALSE",
+            "date": "DATE",
+        })
+    await _ensure_columns(db, "user_exercise_views", {
+        "status": "TEXT",
+        "date": "DATE",
+    })
+    await _ensure_columns(db, "achievements", {"last_updated": "TIMESTAMP"})
+    await _ensure_columns(db, "free_attempts", {
+        "feature_type": "TEXT",
+        "attempts_used": "INTEGER DEFAULT 0",
+        "last_attempt_date": "TEXT",
+    })
+    # Уникальные ключи, на которые опираются UPSERT-запросы
+    await db.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_telegram_id ON users (telegram_id)")
+    await db.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_free_attempts_user_feature ON free_attempts (user_id, feature_type)"
+    )
+
+
+async def _move_puzzle_images(db: aiosqlite.Connection) -> None:
+    """Переносит изображения ребусов из BLOB-столбца в хранилище файлов по SHA-256"""
+    async with db.execute("PRAGMA database_list") as cursor:
+        db_path = next(row[2] for row in await cursor.fetchall() if row[1] == "main")
+    store = MediaStore(media_dir_for(db_path))
+
+    await _ensure_columns(db, "puzzles", {
+        "image_sha256": "TEXT",
+        "image_size": "INTEGER",
+    })
+    async with db.execute("SELECT id FROM puzzles WHERE image_data IS NOT NULL") as cursor:
+        puzzle_ids = [row[0] for row in await cursor.fetchall()]
+    # Изображения читаем по одному, чтобы не держать в памяти все сразу
+    for puzzle_id in puzzle_ids:
+        async with db.execute("SELECT image_data FROM puzzles WHERE id = ?", (puzzle_id,)) as cursor:
+            image = (await cursor.fetchone())[0]
+        await db.execute(
+            "UPDATE puzzles SET image_sha256 = ?, image_size = ? WHERE id = ?",
+            (store.put(image), len(image), puzzle_id)
+        )
+    if puzzle_ids:
+        logger.info(f"Миграция: изображений ребусов перенесено в {store.root}: {len(puzzle_ids)}")
+    await db.execute("ALTER TABLE puzzles DROP COLUMN image_data")
+
+
+def _fts_index(table: str, columns: Sequence[str]) -> List[str]:
+    """Шаги создания индекса FTS5 над таблицей: виртуальная таблица, триггеры синхронизации и заполнение.
+
+    Индекс хранит только токены (content=''), поэтому в него можно класть текст с ё, замененной на е:
+    токенизатор unicode61 эти буквы не уравнивает. Тексты для выдачи читаются из самой таблицы.
+    """
+    fts = f"{table}_fts"
+    names = ", ".join(columns)
+
+    def normalized(prefix: str) -> str:
+        return ", ".join(f"replace(replace({prefix}{column}, 'ё', 'е'), 'Ё', 'Е')" for column in columns)
+
+    return [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+            {names}, content='',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts} (rowid, {names}) VALUES (new.id, {normalized("new.")});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.id, {normalized("old.")});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {names} ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.id, {normalized("old.")});
+            INSERT INTO {fts} (rowid, {names}) VALUES (new.id, {normalized("new.")});
+        END
+        """,
+        f"INSERT INTO {fts} (rowid, {names}) SELECT id, {normalized('')} FROM {table}",
+    ]
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Базовая схема", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER UNIQUE NOT NULL,
+            username TEXT,
+            full_name TEXT NOT NULL,
+            registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS tokens (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            emoji TEXT NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS achievements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            token_id INTEGER,
+            count INTEGER DEFAULT 0,
+            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (telegram_id),
+            FOREIGN KEY (token_id) REFERENCES tokens (id),
+            UNIQUE(user_id, token_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS daily_tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_text TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_daily_tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            task_id INTEGER,
+            completed BOOLEAN DEFAULT FALSE,
+            date DATE NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (telegram_id),
+            FOREIGN KEY (task_id) REFERENCES daily_tasks (id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS riddles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_riddles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            riddle_id INTEGER,
+            completed BOOLEAN DEFAULT FALSE,
+            date DATE NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (telegram_id),
+            FOREIGN KEY (riddle_id) REFERENCES riddles (id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS tongue_twisters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            text TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_tongue_twisters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            twister_id INTEGER,
+            completed BOOLEAN DEFAULT FALSE,
+            date DATE NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (telegram_id),
+            FOREIGN KEY (twister_id) REFERENCES tongue_twisters (id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS exercise_videos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,  -- 'neuro' или 'articular'
+            title TEXT NOT NULL,
+            description TEXT NOT NULL,
+            video_url TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_exercise_views (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            video_id INTEGER,
+            status TEXT NOT NULL,  -- 'full', 'partial', или 'not_done'
+            date DATE NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (telegram_id),
+            FOREIGN KEY (video_id) REFERENCES exercise_videos (id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS creativity_videos (
+            id INTEGER PRIMARY KEY,
+            type TEXT NOT NULL,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL,
+            video_url TEXT NOT NULL,
+            sequence_number INTEGER
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_creativity_completions (
+            user_id INTEGER,
+            video_id INTEGER,
+            completion_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, video_id),
+            FOREIGN KEY (user_id) REFERENCES users (telegram_id),
+            FOREIGN KEY (video_id) REFERENCES creativity_videos (id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL,
+            duration_days INTEGER NOT NULL,
+            price REAL NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_subscriptions (
+            user_id INTEGER NOT NULL,
+            subscription_id INTEGER NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            FOREIGN KEY (user_id) REFERENCES users(telegram_id),
+            FOREIGN KEY (subscription_id) REFERENCES subscriptions(id),
+            PRIMARY KEY (user_id, subscription_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS free_attempts (
+            user_id INTEGER NOT NULL,
+            feature_type TEXT NOT NULL,  -- 'daily_tasks', 'drawing'
+            attempts_used INTEGER DEFAULT 0,
+            last_attempt_date TEXT,
+            PRIMARY KEY (user_id, feature_type)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS referrals (
+            referrer_id INTEGER NOT NULL,
+            referred_id INTEGER NOT NULL,
+            join_date TEXT NOT NULL DEFAULT (date('now')),
+            is_active BOOLEAN DEFAULT FALSE,
+            reward_claimed BOOLEAN DEFAULT FALSE,
+            PRIMARY KEY (referrer_id, referred_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS puzzles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            image_data BLOB NOT NULL,
+            answer1 TEXT NOT NULL,
+            answer2 TEXT NOT NULL,
+            answer3 TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS user_puzzles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            puzzle_id INTEGER,
+            solved1 BOOLEAN DEFAULT FALSE,
+            solved2 BOOLEAN DEFAULT FALSE,
+            solved3 BOOLEAN DEFAULT FALSE,
+            date DATE NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (telegram_id),
+            FOREIGN KEY (puzzle_id) REFERENCES puzzles (id)
+        )
+        """,
+        # Токен "Алмаз" за творческие мастер-классы
+        """
+        INSERT OR IGNORE INTO tokens (id, emoji, name, description)
+        VALUES (9, '💎', 'Алмаз', 'Даётся за выполнение творческих мастер-классов')
+        """,
+    ]),
+    Migration(2, "Недостающие столбцы в таблицах старого формата", [
+        _reconcile_legacy_columns,
+    ]),
+    Migration(3, "Покрывающие индексы для запросов по пользователю и дню", [
+        # Задания, загадки и скороговорки на день: поиск по (user_id, date), выборка id и completed
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_daily_tasks_user_date
+        ON user_daily_tasks (user_id, date, task_id, completed)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_riddles_user_date
+        ON user_riddles (user_id, date, riddle_id, completed)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_tongue_twisters_user_date
+        ON user_tongue_twisters (user_id, date, twister_id, completed)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_puzzles_user_date
+        ON user_puzzles (user_id, date, puzzle_id, solved1, solved2, solved3)
+        """,
+        # Просмотры упражнений растут с каждым нажатием, ищем по (user_id, video_id, date)
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_exercise_views_user_video_date
+        ON user_exercise_views (user_id, video_id, date, status)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_referrals_referrer_active
+        ON referrals (referrer_id, is_active)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_subscriptions_active_end
+        ON user_subscriptions (is_active, end_date)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_subscriptions_user_active_end
+        ON user_subscriptions (user_id, is_active, end_date)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_exercise_videos_type
+        ON exercise_videos (type, id)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_creativity_videos_type_sequence
+        ON creativity_videos (type, sequence_number)
+        """,
+    ]),
+    Migration(4, "file_id Telegram для изображений ребусов", [
+        "ALTER TABLE puzzles ADD COLUMN telegram_file_id TEXT",
+    ]),
+    Migration(5, "Изображения ребусов в хранилище файлов по SHA-256", [
+        _move_puzzle_images,
+    ]),
+    # file_id загруженных в Telegram видео, ключ - исходная ссылка из exercise_videos и creativity_videos
+    Migration(6, "Реестр file_id видео", [
+        """
+        CREATE TABLE IF NOT EXISTS media_file_ids (
+            source_url TEXT PRIMARY KEY,
+            file_id TEXT NOT NULL,
+            file_unique_id TEXT,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    Migration(7, "Состояния диалогов (FSM)", [
+        """
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data BLOB,
+            expires_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_fsm_storage_expires ON fsm_storage (expires_at)",
+    ]),
+    Migration(8, "Время последнего обращения к состоянию FSM", [
+        "ALTER TABLE fsm_storage ADD COLUMN touched_at REAL",
+    ]),
+    # Поиск для админ-панели по таблицам из database.search.FTS_TABLES
+    Migration(9, "Полнотекстовый поиск по пользователям и контенту", [
+        step for table, columns in FTS_TABLES.items() for step in _fts_index(table, columns)
+    ]),
+    # Рассылки администратора: cursor - id последнего обработанного получателя в users
+    Migration(10, "Рассылки", [
+        """
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id INTEGER NOT NULL,
+            from_chat_id INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            progress_message_id INTEGER,
+            status TEXT NOT NULL DEFAULT 'running',  -- 'running', 'done', 'cancelled' или 'failed'
+            cursor INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            blocked INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_broadcasts_status ON broadcasts (status)",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+async def get_schema_version(db: aiosqlite.Connection) -> int:
+    """Возвращает текущую версию схемы (0, если миграции еще не применялись)"""
+    async with db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    ) as cursor:
+        if await cursor.fetchone() is None:
+            return 0
+    async with db.execute("SELECT MAX(version) FROM schema_version") as cursor:
+        row = await cursor.fetchone()
+        return row[0] or 0
+
+
+async def _apply(db: aiosqlite.Connection, migration: Migration) -> None:
+    """Применяет одну миграцию в отдельной транзакции"""
+    await db.execute("BEGIN")
+    try:
+        for step in migration.steps:
+            if isinstance(step, str):
+                await db.execute(step)
+            else:
+                await step(db)
+        await db.execute(
+            "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+            (migration.version, migration.description)
+        )
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+
+
+async def run_migrations(db: aiosqlite.Connection) -> int:
+    """Применяет все недостающие миграции и возвращает итоговую версию схемы"""
+    current = await get_schema_version(db)
+    if current >= LATEST_VERSION:
+        return current
+
+    await db.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    await db.commit()
+
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        logger.info(f"Применяется миграция {migration.version}: {migration.description}")
+        await _apply(db, migration)
+        current = migration.version
+    return current
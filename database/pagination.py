@@ -0,0 +1,59 @@
+import math
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence
+
+
+@dataclass(frozen=True)
+class Page:
+    """Страница списка, прочитанная от курсора (keyset): элементы, общее число и наличие соседних страниц"""
+    items: List[dict]
+    total: int
+    limit: int
+    has_prev: bool
+    has_next: bool
+
+    @property
+    def total_pages(self) -> int:
+        return max(1, math.ceil(self.total / self.limit))
+
+    @property
+    def first_id(self) -> Optional[int]:
+        """Курсор для перехода на предыдущую страницу"""
+        return self.items[0]['id'] if self.items else None
+
+    @property
+    def last_id(self) -> Optional[int]:
+        """Курсор для перехода на следующую страницу"""
+        return self.items[-1]['id'] if self.items else None
+
+
+def page_from_rows(rows: Sequence, limit: int, total: int, cursor: Any, backward: bool,
+                   convert: Callable[[Any], dict] = dict) -> Page:
+    """Собирает страницу из limit + 1 строк, прочитанных от курсора.
+
+    Лишняя строка только показывает, что дальше есть еще элементы. При чтении назад
+    строки приходят в обратном порядке и разворачиваются.
+    """
+    has_more = len(rows) > limit
+    items = [convert(row) for row in rows[:limit]]
+    if backward:
+        items.reverse()
+        return Page(items, total, limit, has_prev=has_more, has_next=True)
+    return Page(items, total, limit, has_prev=cursor is not None, has_next=has_more)
+
+
+def keyset_slice(rows: Sequence, keys: Sequence, cursor_key: Any, limit: int,
+                 backward: bool = False, convert: Callable[[Any], dict] = dict) -> Page:
+    """Та же страница по списку в памяти: keys - заранее посчитанные ключи порядка строк,
+    курсор ищется по ним бинарным поиском"""
+    if cursor_key is None:
+        chunk = rows[:limit + 1]
+    elif backward:
+        end = bisect_left(keys, cursor_key)
+        chunk = rows[max(0, end - limit - 1):end][::-1]
+    else:
+        start = bisect_right(keys, cursor_key)
+        chunk = rows[start:start + limit + 1]
+    return page_from_rows(chunk, limit, len(rows), cursor_key, backward, convert)
+
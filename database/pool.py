@@ -0,0 +1,89 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+import aiosqlite
+
+
+class ConnectionPool:
+    """Пул долгоживущих соединений с SQLite: несколько читателей и один писатель"""
+
+    def __init__(self, db_path: str, readers: int = 4, pragmas: Optional[Dict[str, object]] = None):
+        self.db_path = db_path
+        self.pragmas = dict(pragmas or {})
+        self.readers_count = max(1, readers)
+        self._readers: "asyncio.Queue[aiosqlite.Connection]" = asyncio.Queue()
+        self._all_readers: List[aiosqlite.Connection] = []
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._writer_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        """Открывает одно соединение с общими настройками"""
+        conn = await aiosqlite.connect(self.db_path)
+        conn.row_factory = aiosqlite.Row
+        for name, value in self.pragmas.items():
+            await conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    async def open(self) -> None:
+        """Открывает все соединения пула"""
+        if self.is_open:
+            return
+        self._writer = await self._connect()
+        for _ in range(self.readers_count):
+            conn = await self._connect()
+            self._all_readers.append(conn)
+            self._readers.put_nowait(conn)
+
+    async def active_settings(self) -> Dict[str, object]:
+        """Возвращает фактические значения PRAGMA на соединении писателя"""
+        settings = {}
+        async with self.write() as conn:
+            for name in self.pragmas:
+                async with conn.execute(f"PRAGMA {name}") as cursor:
+                    row = await cursor.fetchone()
+                    settings[name] = row[0] if row else None
+        return settings
+
+    async def close(self) -> None:
+        """Закрывает все соединения пула"""
+        if self._writer is not None:
+            async with self._writer_lock:
+                await self._writer.close()
+                self._writer = None
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers.clear()
+        self._readers = asyncio.Queue()
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Выдает соединение только для чтения"""
+        if not self.is_open:
+            raise RuntimeError("Пул соединений с базой данных не открыт")
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Выдает единственное соединение для записи.
+
+        Незафиксированная транзакция откатывается при возврате соединения,
+        чтобы следующий пользователь пула не унаследовал чужие изменения.
+        """
+        if not self.is_open:
+            raise RuntimeError("Пул соединений с базой данных не открыт")
+        async with self._writer_lock:
+            conn = self._writer
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    await conn.rollback()
@@ -0,0 +1,125 @@
+"""Проверка планов запросов Database: ни один запрос не должен читать большую таблицу целиком.
+
+Запуск: python -m database.query_plans [путь_к_базе]
+
+Без аргумента проверка идет на пустой базе, созданной миграциями. С путем к базе
+проверяется ее копия, чтобы планировщик учитывал реальную статистику.
+"""
+import ast
+import asyncio
+import os
+import re
+import shutil
+import sys
+import tempfile
+from typing import Dict, Iterator, List, Set, Tuple
+
+import aiosqlite
+
+from database.migrations import run_migrations
+from database.search import search_queries
+
+DATABASE_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database.py")
+
+# Справочники, которые заполняет администратор: их размер не зависит от числа пользователей
+CATALOG_TABLES: Set[str] = {
+    "tokens", "subscriptions", "daily_tasks", "riddles", "tongue_twisters",
+    "puzzles", "exercise_videos", "creativity_videos",
+}
+
+# Методы, которым полный проход по таблице нужен намеренно (счетчик для админ-панели и ночные задачи)
+ALLOWED_SCANS: Dict[str, Set[str]] = {
+    "count_users": {"users"},
+    "get_active_user_ids": {"users"},
+}
+
+# Виртуальная таблица FTS5 с условием MATCH читается по полнотекстовому индексу, а не целиком
+FTS_MATCH = re.compile(r"VIRTUAL TABLE INDEX \d+:\S*M")
+SQL_START = re.compile(r"^\s*(SELECT|WITH|UPDATE|DELETE|INSERT)\b", re.IGNORECASE)
+TABLE_REF = re.compile(r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+SQL_KEYWORDS = {"where", "on", "join", "left", "inner", "order", "group", "set", "values", "limit", "using"}
+
+
+def iter_queries(source_path: str = DATABASE_SOURCE) -> Iterator[Tuple[str, int, str]]:
+    """Находит SQL-строки в методах класса Database: (метод, строка, запрос)"""
+    with open(source_path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if not (isinstance(node, ast.ClassDef) and node.name == "Database"):
+            continue
+        for method in node.body:
+            if not isinstance(method, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                continue
+            # Части f-строк не являются самостоятельными запросами
+            formatted = {
+                id(part)
+                for item in ast.walk(method) if isinstance(item, ast.JoinedStr)
+                for part in item.values
+            }
+            for item in ast.walk(method):
+                if id(item) in formatted:
+                    continue
+                if isinstance(item, ast.Constant) and isinstance(item.value, str) and SQL_START.match(item.value):
+                    yield method.name, item.lineno, item.value
+    # Запросы поиска собираются из шаблонов database.search и в исходнике целиком не встречаются
+    for name, sql in search_queries().items():
+        yield name, 0, sql
+
+
+def _aliases(sql: str) -> Dict[str, str]:
+    """Сопоставляет псевдонимы из запроса с именами таблиц"""
+    result = {}
+    for table, alias in TABLE_REF.findall(sql):
+        result[table] = table
+        if alias and alias.lower() not in SQL_KEYWORDS:
+            result[alias] = table
+    return result
+
+
+async def check_plans(db: aiosqlite.Connection) -> List[str]:
+    """Возвращает список нарушений: полные проходы по таблицам и запросы с ошибками"""
+    async with db.execute("SELECT name FROM sqlite_master WHERE type = 'table'") as cursor:
+        tables = {row[0] for row in await cursor.fetchall()}
+
+    problems = []
+    for method, lineno, sql in iter_queries():
+        params = (None,) * sql.count("?")
+        try:
+            async with db.execute(f"EXPLAIN QUERY PLAN {sql}", params) as cursor:
+                plan = [row[3] for row in await cursor.fetchall()]
+        except Exception as e:
+            problems.append(f"{method} (строка {lineno}): ошибка в запросе: {e}")
+            continue
+
+        aliases = _aliases(sql)
+        allowed = CATALOG_TABLES | ALLOWED_SCANS.get(method, set())
+        for detail in plan:
+            match = re.match(r"SCAN (\w+)", detail)
+            if not match or FTS_MATCH.search(detail):
+                continue
+            table = aliases.get(match.group(1), match.group(1))
+            if table in tables and table not in allowed:
+                problems.append(f"{method} (строка {lineno}): {detail}")
+    return problems
+
+
+async def main(db_path: str = None) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "plans.db")
+        if db_path:
+            shutil.copy(db_path, path)
+        async with aiosqlite.connect(path) as db:
+            await run_migrations(db)
+            problems = await check_plans(db)
+
+    for problem in problems:
+        print(problem)
+    if problems:
+        print(f"Найдено проблем: {len(problems)}")
+        return 1
+    print("Все запросы используют индексы")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else None)))
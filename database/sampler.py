@@ -0,0 +1,105 @@
+import hashlib
+import random
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence
+
+
+class IdSampler:
+    """Случайный выбор id контента без обращения к базе.
+
+    Хранит компактный массив id и, если заданы веса, таблицы метода псевдонимов
+    (Walker/Vose): один выбор стоит O(1), выборка из k элементов - O(k)
+    независимо от размера справочника.
+    """
+
+    def __init__(self, ids: Iterable[int], weights: Optional[Sequence[float]] = None):
+        self.ids = array('q', ids)
+        self._weights: Optional[array] = None
+        self._prob: Optional[array] = None
+        self._alias: Optional[array] = None
+        self._digest: Optional[str] = None
+        if weights is not None:
+            if len(weights) != len(self.ids):
+                raise ValueError("Количество весов не совпадает с количеством id")
+            if any(w < 0 for w in weights):
+                raise ValueError("Веса не могут быть отрицательными")
+            self._weights = array('d', weights)
+            self._positive = sum(1 for w in weights if w > 0)
+            self._build_alias(weights)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def digest(self) -> str:
+        """Отпечаток набора id: меняется только вместе с составом справочника"""
+        if self._digest is None:
+            self._digest = hashlib.blake2b(",".join(map(str, self.ids)).encode(), digest_size=8).hexdigest()
+        return self._digest
+
+    def _build_alias(self, weights: Sequence[float]) -> None:
+        n = len(weights)
+        total = float(sum(weights))
+        if n == 0 or total <= 0:
+            raise ValueError("Сумма весов должна быть положительной")
+        scaled = [w * n / total for w in weights]
+        prob = array('d', [0.0] * n)
+        alias = array('q', [0] * n)
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Остатки равны 1 с точностью до погрешности округления
+        for i in small + large:
+            prob[i] = 1.0
+        self._prob, self._alias = prob, alias
+
+    def _draw_index(self, rng: random.Random) -> int:
+        i = rng.randrange(len(self.ids))
+        if self._prob is None or rng.random() < self._prob[i]:
+            return i
+        return self._alias[i]
+
+    def choice(self, rng: random.Random = random) -> Optional[int]:
+        """Возвращает один id с учетом весов или None, если массив пуст"""
+        if not self.ids:
+            return None
+        return self.ids[self._draw_index(rng)]
+
+    def sample(self, k: int, rng: random.Random = random) -> List[int]:
+        """Возвращает до k различных id в случайном порядке"""
+        n = len(self.ids)
+        k = min(k, n)
+        if k <= 0:
+            return []
+
+        if self._prob is None:
+            # Частичная перетасовка Фишера-Йетса: переставленные позиции хранятся в словаре,
+            # поэтому массив не копируется и работа занимает O(k)
+            swapped: Dict[int, int] = {}
+            result = []
+            for i in range(k):
+                j = rng.randrange(i, n)
+                result.append(self.ids[swapped.get(j, j)])
+                swapped[j] = swapped.get(i, i)
+            return result
+
+        # Взвешенная выборка без возвращения: повторные попадания отбрасываются.
+        # Когда k близко к числу элементов с ненулевым весом, отбрасываний становится много,
+        # поэтому переходим на ключи Эфраимидиса-Спиракиса
+        k = min(k, self._positive)
+        if 2 * k > self._positive:
+            keys = sorted(
+                (i for i in range(n) if self._weights[i] > 0),
+                key=lambda i: rng.random() ** (1.0 / self._weights[i]),
+                reverse=True,
+            )
+            return [self.ids[i] for i in keys[:k]]
+        chosen: Dict[int, None] = {}
+        while len(chosen) < k:
+            chosen.setdefault(self._draw_index(rng))
+        return [self.ids[i] for i in chosen]
@@ -0,0 +1,77 @@
+import re
+from typing import Dict, Optional, Sequence, Tuple
+
+# Полнотекстовые индексы FTS5: таблица-источник и индексируемые столбцы
+FTS_TABLES: Dict[str, Sequence[str]] = {
+    "users": ("username", "full_name"),
+    "riddles": ("question", "answer"),
+    "daily_tasks": ("task_text",),
+    "tongue_twisters": ("text",),
+    "exercise_videos": ("title",),
+    "creativity_videos": ("title",),
+}
+
+# Разделы выдачи /search: таблица из FTS_TABLES (в запросе - псевдоним t) и выбираемые столбцы
+SEARCH_SECTIONS: Dict[str, Tuple[str, str]] = {
+    "users": ("users", "t.id, t.telegram_id, t.username, t.full_name"),
+    "riddles": ("riddles", "t.id, t.question AS text"),
+    "daily": ("daily_tasks", "t.id, t.task_text AS text"),
+    "twisters": ("tongue_twisters", "t.id, t.text"),
+    "exercises": ("exercise_videos", "t.id, t.title AS text, t.type AS content_type"),
+    "creativity": ("creativity_videos", "t.id, t.title AS text, 'creativity_' || t.type AS content_type"),
+}
+
+COUNT_TEMPLATE = "SELECT COUNT(*) FROM {fts} WHERE {fts} MATCH ?"
+
+# Страница от курсора по (rank, rowid); rank курсора пересчитывается тем же MATCH.
+# Без курсора (первая страница) условие по нему не действует
+PAGE_TEMPLATE = """
+    SELECT {columns}
+    FROM {fts} JOIN {table} t ON t.id = {fts}.rowid
+    WHERE {fts} MATCH ?
+      AND (? IS NULL OR ({fts}.rank, {fts}.rowid) {op} (
+          (SELECT rank FROM {fts} WHERE {fts} MATCH ? AND rowid = ?), ?))
+    ORDER BY {fts}.rank{order}, {fts}.rowid{order}
+    LIMIT ?
+"""
+
+# Больше слов в запросе администратору не нужно, а длинный MATCH замедляет поиск
+MAX_QUERY_TERMS = 8
+
+WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def match_expression(text: str) -> Optional[str]:
+    """Превращает введенный текст в выражение MATCH: все слова, каждое как префикс (ё ищется как е)"""
+    terms = WORD.findall(text.lower().replace("ё", "е"))[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def count_query(section: str) -> str:
+    """Запрос количества совпадений в разделе"""
+    table, _ = SEARCH_SECTIONS[section]
+    return COUNT_TEMPLATE.format(fts=f"{table}_fts")
+
+
+def page_query(section: str, backward: bool) -> str:
+    """Запрос страницы совпадений в разделе: вперед - лучшие первыми, назад - в обратном порядке"""
+    table, columns = SEARCH_SECTIONS[section]
+    return PAGE_TEMPLATE.format(
+        columns=columns,
+        table=table,
+        fts=f"{table}_fts",
+        op="<" if backward else ">",
+        order=" DESC" if backward else "",
+    )
+
+
+def search_queries() -> Dict[str, str]:
+    """Все запросы поиска по имени для проверки планов (database.query_plans)"""
+    queries = {}
+    for section in SEARCH_SECTIONS:
+        queries[f"search_counts:{section}"] = count_query(section)
+        queries[f"search:{section}"] = page_query(section, backward=False)
+        queries[f"search:{section}:backward"] = page_query(section, backward=True)
+    return queries
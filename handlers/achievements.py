@@ -26,9 +26,8 @@ async def show_photo_album(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "achievements_list")
-async def show_achievements_list(callback: CallbackQuery):
+async def show_achievements_list(callback: CallbackQuery, db: Database):
     """Показывает список достижений пользователя"""
-    db = Database()
     user_achievements = await db.get_user_achievements(callback.from_user.id)
     tokens = await db.get_all_tokens()
     
@@ -1,16 +1,18 @@
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
-from aiogram.filters import StateFilter
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from database.database import Database
-from keyboards.admin import AdminKeyboard
+from database.fsm_storage import SQLiteStorage
+from keyboards.admin import SEARCH_SECTIONS, AdminKeyboard
 from keyboards.main_menu import MainMenuKeyboard
+from services.broadcast import Broadcaster
+from services.video_delivery import drive_breaker, media_cache, warm_video_file_ids
 from config import config
-import math
+from datetime import datetime
 
 router = Router()
-db = Database()
 
 # Состояния для редактирования тарифов
 class TariffStates(StatesGroup):
@@ -37,8 +39,32 @@ class TokenStates(StatesGroup):
     waiting_for_emoji = State()
     waiting_for_name = State()
 
+# Состояния для подготовки рассылки
+class BroadcastStates(StatesGroup):
+    waiting_for_message = State()
+
 ITEMS_PER_PAGE = 5
 
+# Заголовки списков контента по типу
+CONTENT_HEADERS = {
+    "daily": "📝 Список заданий на день",
+    "riddles": "🤔 Список загадок",
+    "twisters": "👅 Список скороговорок",
+    "puzzles": "🧩 Список ребусов",
+    "creativity_drawing": "🎨 Список мастер-классов по рисованию",
+    "creativity_paper": "📄 Список мастер-классов по бумаге",
+    "creativity_sculpting": "🏺 Список мастер-классов по лепке",
+    "articular": "🗣 Список упражнений для артикуляции",
+    "neuro": "🧠 Список упражнений для нейрогимнастики"
+}
+
+def parse_page_callback(parts: list) -> tuple:
+    """Разбирает хвост callback-данных списка: номер страницы, курсор и направление (p - назад, n - вперед)"""
+    page = int(parts[0]) if parts else 1
+    if len(parts) < 3:
+        return page, None, False
+    return page, int(parts[2]), parts[1] == "p"
+
 @router.callback_query(F.data == "admin_panel")
 async def show_admin_menu(callback: CallbackQuery):
     """Показывает главное меню админ-панели"""
@@ -58,70 +84,245 @@ async def show_admin_menu(callback: CallbackQuery):
     )
     await callback.answer()
 
+@router.message(Command("warm_media"))
+async def warm_media(message: Message, db: Database):
+    """Заранее загружает все видео в служебный чат, чтобы пользователям они отправлялись по file_id"""
+    if message.from_user.id not in config.ADMIN_IDS:
+        return
+    if not config.MEDIA_STORAGE_CHAT_ID:
+        await message.answer("❌ Не задан MEDIA_STORAGE_CHAT_ID")
+        return
+
+    await message.answer("⏳ Загружаю видео в служебный чат...")
+    stats = await warm_video_file_ids(message.bot, db, config.MEDIA_STORAGE_CHAT_ID)
+    await message.answer(
+        "✅ Прогрев видео завершен\n\n"
+        f"Загружено: {stats['uploaded']}\n"
+        f"Уже были загружены: {stats['skipped']}\n"
+        f"Ошибок: {stats['failed']}"
+    )
+
+@router.message(Command("media_status"))
+async def media_status(message: Message):
+    """Показывает состояние доставки видео: предохранитель Google Drive и дисковый кэш"""
+    if message.from_user.id not in config.ADMIN_IDS:
+        return
+
+    stats = drive_breaker.stats()
+    states = {"closed": "🟢 работает", "half_open": "🟡 пробный запрос", "open": "🔴 недоступен"}
+    await message.answer(
+        "📊 Доставка видео\n\n"
+        f"Google Drive: {states[stats['state']]}\n"
+        f"Неудач подряд: {stats['failures']}\n"
+        f"Отклонено без запроса: {stats['rejected']}\n"
+        f"Размыканий: {stats['open_count']}, "
+        f"пробных запросов: {stats['half_open_count']}, "
+        f"восстановлений: {stats['closed_count']}\n\n"
+        f"Кэш видео: {media_cache.total_bytes // (1024 * 1024)} МБ из {media_cache.max_bytes // (1024 * 1024)} МБ"
+    )
+
+@router.message(Command("fsm_status"))
+async def fsm_status(message: Message, fsm_storage: SQLiteStorage):
+    """Показывает, сколько сессий диалогов хранится и сколько места они занимают"""
+    if message.from_user.id not in config.ADMIN_IDS:
+        return
+
+    stats = await fsm_storage.stats()
+    oldest = (
+        datetime.fromtimestamp(stats['oldest_touched_at']).strftime('%d.%m.%Y %H:%M')
+        if stats['oldest_touched_at'] else "—"
+    )
+    await message.answer(
+        "📊 Сессии диалогов\n\n"
+        f"Активных сессий: {stats['entries']}\n"
+        f"Объем данных: {stats['bytes'] / 1024:.1f} КБ\n"
+        f"Ожидают записи: {stats['pending']}\n"
+        f"Самое давнее обращение: {oldest}"
+    )
+
+@router.message(Command("search"))
+async def search(message: Message, command: CommandObject, state: FSMContext, db: Database):
+    """Ищет пользователей и контент по словам запроса"""
+    if message.from_user.id not in config.ADMIN_IDS:
+        return
+
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer(
+            "🔎 Использование: /search <текст>\n\n"
+            "Ищет пользователей по имени и нику, загадки, задания на день, скороговорки и видео по названию."
+        )
+        return
+
+    counts = await db.search_counts(query)
+    if not any(counts.values()):
+        await message.answer(f"🔎 По запросу «{query}» ничего не найдено")
+        return
+
+    # Запрос нужен для листания результатов, в callback-данные он может не поместиться;
+    # количество совпадений сохраняем, чтобы не пересчитывать его на каждой странице
+    await state.update_data(search_query=query, search_counts=counts)
+    await message.answer(
+        f"🔎 Результаты поиска «{query}»:",
+        reply_markup=AdminKeyboard.get_search_sections_keyboard(counts)
+    )
+
+@router.callback_query(F.data == "search_sections")
+async def show_search_sections(callback: CallbackQuery, state: FSMContext):
+    """Возвращает к разделам с результатами последнего поиска"""
+    if callback.from_user.id not in config.ADMIN_IDS:
+        await callback.answer("У вас нет доступа к админ-панели", show_alert=True)
+        return
+
+    data = await state.get_data()
+    query = data.get("search_query")
+    if not query:
+        await callback.answer("Поиск устарел, повторите команду /search", show_alert=True)
+        return
+
+    await callback.message.edit_text(
+        f"🔎 Результаты поиска «{query}»:",
+        reply_markup=AdminKeyboard.get_search_sections_keyboard(data.get("search_counts", {}))
+    )
+    await callback.answer()
+
+@router.callback_query(F.data.startswith("search:"))
+async def show_search_results(callback: CallbackQuery, state: FSMContext, db: Database):
+    """Показывает страницу результатов поиска в разделе"""
+    if callback.from_user.id not in config.ADMIN_IDS:
+        await callback.answer("У вас нет доступа к админ-панели", show_alert=True)
+        return
+
+    data = await state.get_data()
+    query = data.get("search_query")
+    if not query:
+        await callback.answer("Поиск устарел, повторите команду /search", show_alert=True)
+        return
+
+    # search:{раздел}:{страница}, при листании еще направление и курсор
+    parts = callback.data.split(":")
+    section = parts[1]
+    page, cursor, backward = parse_page_callback(parts[2:])
+    total = data.get("search_counts", {}).get(section, 0)
+    results = await db.search(section, query, total, cursor, ITEMS_PER_PAGE, backward)
+
+    await callback.message.edit_text(
+        f"🔎 «{query}»: {SEARCH_SECTIONS.get(section, section)}\n\n"
+        f"Найдено: {results.total}, страница {page}/{results.total_pages}",
+        reply_markup=AdminKeyboard.get_search_results_keyboard(section, results, page)
+    )
+    await callback.answer()
+
+@router.message(Command("broadcast"))
+async def start_broadcast(message: Message, state: FSMContext):
+    """Начинает подготовку рассылки всем пользователям"""
+    if message.from_user.id not in config.ADMIN_IDS:
+        return
+
+    await state.set_state(BroadcastStates.waiting_for_message)
+    await message.answer(
+        "📣 Отправьте сообщение для рассылки: текст, фото, видео или документ.\n\n"
+        "Оно будет скопировано всем пользователям бота.",
+        reply_markup=AdminKeyboard.get_cancel_keyboard()
+    )
+
+@router.message(BroadcastStates.waiting_for_message)
+async def process_broadcast_message(message: Message, state: FSMContext, db: Database):
+    """Показывает, как будет выглядеть рассылка, и просит подтверждения"""
+    # Рассылка копирует сообщение из чата администратора, поэтому храним только ссылку на него
+    await state.update_data(broadcast_chat_id=message.chat.id, broadcast_message_id=message.message_id)
+    await message.send_copy(chat_id=message.chat.id)
+    await message.answer(
+        "👆 Так сообщение увидят пользователи.\n\n"
+        f"Получателей: {await db.count_users()}. Отправить?",
+        reply_markup=AdminKeyboard.get_broadcast_confirm_keyboard()
+    )
+
+@router.callback_query(F.data == "broadcast_confirm", BroadcastStates.waiting_for_message)
+async def confirm_broadcast(callback: CallbackQuery, state: FSMContext, broadcaster: Broadcaster):
+    """Запускает рассылку; ход рассылки будет обновляться в этом же сообщении"""
+    if callback.from_user.id not in config.ADMIN_IDS:
+        await callback.answer("У вас нет доступа к админ-панели", show_alert=True)
+        return
+
+    data = await state.get_data()
+    await state.clear()
+    await broadcaster.start(
+        admin_id=callback.from_user.id,
+        from_chat_id=data['broadcast_chat_id'],
+        message_id=data['broadcast_message_id'],
+        progress_message_id=callback.message.message_id
+    )
+    await callback.answer("📣 Рассылка запущена")
+
+@router.callback_query(F.data.startswith("broadcast_stop:"))
+async def stop_broadcast(callback: CallbackQuery, broadcaster: Broadcaster):
+    """Останавливает рассылку"""
+    if callback.from_user.id not in config.ADMIN_IDS:
+        await callback.answer("У вас нет доступа к админ-панели", show_alert=True)
+        return
+
+    broadcast_id = int(callback.data.split(":")[1])
+    if await broadcaster.cancel(broadcast_id):
+        await callback.answer("⏹ Рассылка останавливается")
+    else:
+        await callback.answer("Рассылка уже завершена", show_alert=True)
+
 @router.callback_query(F.data == "admin_users")
-async def show_users_list(callback: CallbackQuery, page: int = 1):
+async def show_users_list(callback: CallbackQuery, db: Database, page: int = 1,
+                          cursor: int = None, backward: bool = False):
     """Показывает список пользователей"""
     if callback.from_user.id not in config.ADMIN_IDS:
         await callback.answer("У вас нет доступа к админ-панели", show_alert=True)
         return
     
-    db = Database()
-    users = await db.get_all_users()
-    
-    total_pages = math.ceil(len(users) / ITEMS_PER_PAGE)
-    start_idx = (page - 1) * ITEMS_PER_PAGE
-    end_idx = start_idx + ITEMS_PER_PAGE
-    
-    current_users = users[start_idx:end_idx]
+    users = await db.get_users_page(cursor, ITEMS_PER_PAGE, backward)
+    if not users.has_prev:
+        page = 1
     
     await callback.message.edit_text(
-        f"👥 Список пользователей (страница {page}/{total_pages}):",
-        reply_markup=AdminKeyboard.get_users_keyboard(current_users, page, total_pages)
+        f"👥 Список пользователей (страница {page}/{users.total_pages}):",
+        reply_markup=AdminKeyboard.get_users_keyboard(users, page)
     )
     await callback.answer()
 
 @router.callback_query(F.data.startswith("users_page_"))
-async def navigate_users(callback: CallbackQuery):
+async def navigate_users(callback: CallbackQuery, db: Database):
     """Обрабатывает навигацию по страницам пользователей"""
-    page = int(callback.data.split("_")[2])
-    await show_users_list(callback, page)
+    page, cursor, backward = parse_page_callback(callback.data.split("_")[2:])
+    await show_users_list(callback, db, page, cursor, backward)
 
 @router.callback_query(F.data == "admin_subscriptions")
-async def show_subscriptions_list(callback: CallbackQuery, page: int = 1):
+async def show_subscriptions_list(callback: CallbackQuery, db: Database, page: int = 1,
+                                  cursor: int = None, backward: bool = False):
     """Показывает список подписок"""
     if callback.from_user.id not in config.ADMIN_IDS:
         await callback.answer("У вас нет доступа к админ-панели", show_alert=True)
         return
     
-    db = Database()
-    subscriptions = await db.get_all_user_subscriptions()
-    
-    total_pages = math.ceil(len(subscriptions) / ITEMS_PER_PAGE)
-    start_idx = (page - 1) * ITEMS_PER_PAGE
-    end_idx = start_idx + ITEMS_PER_PAGE
-    
-    current_subscriptions = subscriptions[start_idx:end_idx]
+    subscriptions = await db.get_user_subscriptions_page(cursor, ITEMS_PER_PAGE, backward)
+    if not subscriptions.has_prev:
+        page = 1
     
     await callback.message.edit_text(
-        f"💳 Список подписок (страница {page}/{total_pages}):",
-        reply_markup=AdminKeyboard.get_subscriptions_keyboard(current_subscriptions, page, total_pages)
+        f"💳 Список подписок (страница {page}/{subscriptions.total_pages}):",
+        reply_markup=AdminKeyboard.get_subscriptions_keyboard(subscriptions, page)
     )
     await callback.answer()
 
 @router.callback_query(F.data.startswith("subs_page_"))
-async def navigate_subscriptions(callback: CallbackQuery):
+async def navigate_subscriptions(callback: CallbackQuery, db: Database):
     """Обрабатывает навигацию по страницам подписок"""
-    page = int(callback.data.split("_")[2])
-    await show_subscriptions_list(callback, page)
+    page, cursor, backward = parse_page_callback(callback.data.split("_")[2:])
+    await show_subscriptions_list(callback, db, page, cursor, backward)
 
 @router.callback_query(F.data == "manage_tariffs")
-async def show_tariffs(callback: CallbackQuery):
+async def show_tariffs(callback: CallbackQuery, db: Database):
     """Показывает список тарифов"""
     if callback.from_user.id not in config.ADMIN_IDS:
         await callback.answer("У вас нет доступа к админ-панели", show_alert=True)
         return
     
-    db = Database()
     tariffs = await db.get_all_subscriptions()
     
     await callback.message.edit_text(
@@ -152,13 +353,12 @@ async def process_tariff_name(message: Message, state: FSMContext):
     await message.answer("Введите новую стоимость тарифа (в рублях):")
 
 @router.message(TariffStates.waiting_for_price)
-async def process_tariff_price(message: Message, state: FSMContext):
+async def process_tariff_price(message: Message, state: FSMContext, db: Database):
     """Обрабатывает ввод стоимости тарифа"""
     try:
         price = int(message.text)
         data = await state.get_data()
         
-        db = Database()
         await db.update_subscription(
             data['tariff_id'],
             data['new_name'],
@@ -187,62 +387,34 @@ async def show_content_menu(callback: CallbackQuery):
     )
     await callback.answer()
 
+async def render_content_list(callback: CallbackQuery, db: Database, content_type: str, page: int = 1,
+                              cursor: int = None, backward: bool = False):
+    """Выводит страницу списка контента указанного типа"""
+    items = await db.get_content_page(content_type, cursor, ITEMS_PER_PAGE, backward)
+    if not items.has_prev:
+        page = 1
+    
+    header = CONTENT_HEADERS.get(content_type, "📋 Список элементов")
+    
+    await callback.message.edit_text(
+        text=f"{header}\n\nСтраница {page}/{items.total_pages}",
+        reply_markup=AdminKeyboard.get_content_list_keyboard(items, page, content_type)
+    )
+
 @router.callback_query(F.data.startswith("show_content:"))
-async def show_content_list(callback: CallbackQuery, state: FSMContext):
-    # Разбираем callback данные
+async def show_content_list(callback: CallbackQuery, state: FSMContext, db: Database):
+    # Разбираем callback данные: тип контента, затем номер страницы и, при листании, курсор
     parts = callback.data.split(":")
     
-    # Определяем тип контента и страницу
-    if len(parts) == 4 and parts[1] == "creativity":
+    if parts[1] == "creativity":
         content_type = f"creativity_{parts[2]}"
-        page = int(parts[3])
+        tail = parts[3:]
     else:
         content_type = parts[1]
-        page = int(parts[2]) if len(parts) > 2 else 1
-    
-    db = Database()
-    items = []
-    
-    if content_type == "daily":
-        items = await db.get_all_daily_tasks()
-    elif content_type == "riddles":
-        items = await db.get_all_riddles()
-    elif content_type == "twisters":
-        items = await db.get_all_tongue_twisters()
-    elif content_type == "puzzles":
-        items = await db.get_all_puzzles()
-    elif content_type.startswith("creativity_"):
-        creativity_type = content_type.split("_")[1]
-        items = await db.get_all_creativity(creativity_type)
-    elif content_type == "articular":
-        items = await db.get_exercise_videos("articular")
-    elif content_type == "neuro":
-        items = await db.get_exercise_videos("neuro")
-
-    total_pages = math.ceil(len(items) / ITEMS_PER_PAGE)
-    
-    # Получаем клавиатуру для списка контента
-    keyboard = AdminKeyboard.get_content_list_keyboard(items, page, total_pages, content_type)
-    
-    # Формируем заголовок в зависимости от типа контента
-    headers = {
-        "daily": "📝 Список заданий на день",
-        "riddles": "🤔 Список загадок",
-        "twisters": "👅 Список скороговорок",
-        "puzzles": "🧩 Список ребусов",
-        "creativity_drawing": "🎨 Список мастер-классов по рисованию",
-        "creativity_paper": "📄 Список мастер-классов по бумаге",
-        "creativity_sculpting": "🏺 Список мастер-классов по лепке",
-        "articular": "🗣 Список упражнений для артикуляции",
-        "neuro": "🧠 Список упражнений для нейрогимнастики"
-    }
-    
-    header = headers.get(content_type, "📋 Список элементов")
+        tail = parts[2:]
     
-    await callback.message.edit_text(
-        text=f"{header}\n\nСтраница {page}/{total_pages}",
-        reply_markup=keyboard
-    )
+    page, cursor, backward = parse_page_callback(tail)
+    await render_content_list(callback, db, content_type, page, cursor, backward)
 
 @router.callback_query(F.data.startswith("admin_add_content:"))
 async def start_content_addition(callback: CallbackQuery, state: FSMContext):
@@ -293,27 +465,25 @@ async def process_puzzle_image(message: Message, state: FSMContext):
         await message.answer("Пожалуйста, отправьте изображение ребуса")
         return
         
-    photo = message.photo[-1]
-    file = await message.bot.get_file(photo.file_id)
-    file_bytes = await message.bot.download_file(file.file_path)
-    
-    await state.update_data(puzzle_image=file_bytes.read())
+    # В состоянии храним только file_id: само изображение скачаем, когда придут ответы.
+    # file_id фото администратора подходит и для отправки пользователям
+    await state.update_data(puzzle_file_id=message.photo[-1].file_id)
     await state.set_state(ContentStates.waiting_for_puzzle_answers)
     await message.answer("Теперь отправьте три варианта ответа через запятую")
 
 @router.message(ContentStates.waiting_for_puzzle_answers)
-async def process_puzzle_answers(message: Message, state: FSMContext):
+async def process_puzzle_answers(message: Message, state: FSMContext, db: Database):
     answers = [answer.strip() for answer in message.text.split(",")]
     if len(answers) != 3:
         await message.answer("Пожалуйста, отправьте ровно три варианта ответа через запятую")
         return
         
     data = await state.get_data()
-    image_bytes = data["puzzle_image"]
     
-    db = Database()
     try:
-        await db.add_puzzle(image_bytes, answers[0], answers[1], answers[2])
+        file = await message.bot.get_file(data["puzzle_file_id"])
+        file_bytes = await message.bot.download_file(file.file_path)
+        await db.add_puzzle(file_bytes.read(), answers[0], answers[1], answers[2], data["puzzle_file_id"])
         await message.answer("✅ Ребус успешно добавлен!")
     except Exception as e:
         await message.answer(f"❌ Ошибка при добавлении ребуса: {str(e)}")
@@ -321,9 +491,8 @@ async def process_puzzle_answers(message: Message, state: FSMContext):
     await state.clear()
 
 @router.message(ContentStates.waiting_for_twister)
-async def process_twister(message: Message, state: FSMContext):
+async def process_twister(message: Message, state: FSMContext, db: Database):
     """Обрабатывает добавление скороговорки"""
-    db = Database()
     await db.add_tongue_twister(message.text)
     
     await state.clear()
@@ -340,11 +509,10 @@ async def process_riddle(message: Message, state: FSMContext):
     await message.answer("Введите ответ на загадку:")
 
 @router.message(ContentStates.waiting_for_riddle_answer)
-async def process_riddle_answer(message: Message, state: FSMContext):
+async def process_riddle_answer(message: Message, state: FSMContext, db: Database):
     """Обрабатывает ответ на загадку"""
     data = await state.get_data()
     
-    db = Database()
     await db.add_riddle(data['riddle_text'], message.text)
     
     await state.clear()
@@ -354,9 +522,8 @@ async def process_riddle_answer(message: Message, state: FSMContext):
     )
 
 @router.message(ContentStates.waiting_for_daily_task)
-async def process_daily_task(message: Message, state: FSMContext):
+async def process_daily_task(message: Message, state: FSMContext, db: Database):
     """Обрабатывает добавление ежедневного задания"""
-    db = Database()
     await db.add_daily_task(message.text)
     
     await state.clear()
@@ -366,14 +533,14 @@ async def process_daily_task(message: Message, state: FSMContext):
     )
 
 @router.callback_query(F.data.in_({"back_to_admin", "back_to_content", "back_to_subscriptions"}))
-async def process_back_button(callback: CallbackQuery):
+async def process_back_button(callback: CallbackQuery, db: Database):
     """Обрабатывает нажатие кнопок "Назад" """
     if callback.data == "back_to_admin":
         await show_admin_menu(callback)
     elif callback.data == "back_to_content":
         await show_content_menu(callback)
     elif callback.data == "back_to_subscriptions":
-        await show_subscriptions_list(callback)
+        await show_subscriptions_list(callback, db)
 
 @router.callback_query(F.data == "cancel_action")
 async def cancel_action(callback: CallbackQuery, state: FSMContext):
@@ -416,9 +583,8 @@ async def process_exercise_description(message: Message, state: FSMContext):
     await message.answer("Отправьте ссылку на видео упражнения:")
 
 @router.message(ContentStates.waiting_for_exercise_video)
-async def process_exercise_video(message: Message, state: FSMContext):
+async def process_exercise_video(message: Message, state: FSMContext, db: Database):
     data = await state.get_data()
-    db = Database()
     try:
         await db.add_exercise_video(
             data['title'], 
@@ -447,13 +613,12 @@ async def process_creativity_description(message: Message, state: FSMContext):
     await message.answer("Отправьте ссылку на видео мастер-класса:")
 
 @router.message(ContentStates.waiting_for_creativity_video)
-async def process_creativity_video(message: Message, state: FSMContext):
+async def process_creativity_video(message: Message, state: FSMContext, db: Database):
     """Обрабатывает ссылку на видео мастер-класса"""
     data = await state.get_data()
     content_type = data.get('content_type')
     creativity_type = content_type.split('_')[1] if content_type else None
     
-    db = Database()
     try:
         await db.add_creativity_video(
             title=data['title'],
@@ -488,7 +653,7 @@ async def delete_content_confirmation(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("confirm_delete:"))
-async def confirm_delete_content(callback: CallbackQuery):
+async def confirm_delete_content(callback: CallbackQuery, db: Database):
     """Подтверждает удаление контента"""
     if callback.from_user.id not in config.ADMIN_IDS:
         await callback.answer("У вас нет доступа к админ-панели", show_alert=True)
@@ -498,56 +663,16 @@ async def confirm_delete_content(callback: CallbackQuery):
     _, content_type, content_id = callback.data.split(":")
     content_id = int(content_id)
     
-    db = Database()
     if await db.delete_content(content_type, content_id):
         await callback.answer("✅ Элемент успешно удален!", show_alert=True)
         
-        # Получаем список контента заново
-        items = []
-        if content_type == "daily":
-            items = await db.get_all_daily_tasks()
-        elif content_type == "riddles":
-            items = await db.get_all_riddles()
-        elif content_type == "twisters":
-            items = await db.get_all_tongue_twisters()
-        elif content_type == "puzzles":
-            items = await db.get_all_puzzles()
-        elif content_type.startswith("creativity_"):
-            creativity_type = content_type.split("_")[1]
-            items = await db.get_all_creativity(creativity_type)
-        elif content_type == "articular":
-            items = await db.get_exercise_videos("articular")
-        elif content_type == "neuro":
-            items = await db.get_exercise_videos("neuro")
-        
-        total_pages = math.ceil(len(items) / ITEMS_PER_PAGE)
-        current_page = 1  # Возвращаемся на первую страницу после удаления
-        
-        # Формируем заголовок в зависимости от типа контента
-        headers = {
-            "daily": "📝 Список заданий на день",
-            "riddles": "🤔 Список загадок",
-            "twisters": "👅 Список скороговорок",
-            "puzzles": "🧩 Список ребусов",
-            "creativity_drawing": "🎨 Список мастер-классов по рисованию",
-            "creativity_paper": "📄 Список мастер-классов по бумаге",
-            "creativity_sculpting": "🏺 Список мастер-классов по лепке",
-            "articular": "🗣 Список упражнений для артикуляции",
-            "neuro": "🧠 Список упражнений для нейрогимнастики"
-        }
-        
-        header = headers.get(content_type, "📋 Список элементов")
-        
-        # Обновляем сообщение с обновленным списком
-        await callback.message.edit_text(
-            text=f"{header}\n\nСтраница {current_page}/{total_pages}",
-            reply_markup=AdminKeyboard.get_content_list_keyboard(items, current_page, total_pages, content_type)
-        )
+        # Возвращаемся на первую страницу обновленного списка
+        await render_content_list(callback, db, content_type)
     else:
         await callback.answer("❌ Ошибка при удалении элемента", show_alert=True)
 
 @router.callback_query(F.data.startswith("view_content:"))
-async def view_content(callback: CallbackQuery):
+async def view_content(callback: CallbackQuery, db: Database):
     """Показывает детали контента"""
     if callback.from_user.id not in config.ADMIN_IDS:
         await callback.answer("У вас нет доступа к админ-панели", show_alert=True)
@@ -557,37 +682,32 @@ async def view_content(callback: CallbackQuery):
     _, content_type, content_id = callback.data.split(":")
     content_id = int(content_id)
     
-    db = Database()
     # Здесь можно добавить логику просмотра деталей контента
     await callback.answer("🔍 Просмотр деталей контента (функционал в разработке)", show_alert=True)
 
 @router.callback_query(F.data == "admin_tokens")
-async def show_tokens_list(callback: CallbackQuery, page: int = 1):
+async def show_tokens_list(callback: CallbackQuery, db: Database, page: int = 1,
+                           cursor: int = None, backward: bool = False):
     """Показывает список жетонов пользователей"""
     if callback.from_user.id not in config.ADMIN_IDS:
         await callback.answer("У вас нет доступа к админ-панели", show_alert=True)
         return
     
-    db = Database()
-    tokens = await db.get_all_tokens()
-    
-    total_pages = math.ceil(len(tokens) / ITEMS_PER_PAGE)
-    start_idx = (page - 1) * ITEMS_PER_PAGE
-    end_idx = start_idx + ITEMS_PER_PAGE
-    
-    current_tokens = tokens[start_idx:end_idx]
+    tokens = await db.get_tokens_page(cursor, ITEMS_PER_PAGE, backward)
+    if not tokens.has_prev:
+        page = 1
     
     await callback.message.edit_text(
-        f"🏆 Список жетонов (страница {page}/{total_pages}):",
-        reply_markup=AdminKeyboard.get_tokens_keyboard(current_tokens, page, total_pages)
+        f"🏆 Список жетонов (страница {page}/{tokens.total_pages}):",
+        reply_markup=AdminKeyboard.get_tokens_keyboard(tokens, page)
     )
     await callback.answer()
 
 @router.callback_query(F.data.startswith("tokens_page_"))
-async def navigate_tokens(callback: CallbackQuery):
+async def navigate_tokens(callback: CallbackQuery, db: Database):
     """Обрабатывает навигацию по страницам жетонов"""
-    page = int(callback.data.split("_")[2])
-    await show_tokens_list(callback, page)
+    page, cursor, backward = parse_page_callback(callback.data.split("_")[2:])
+    await show_tokens_list(callback, db, page, cursor, backward)
 
 @router.callback_query(F.data.startswith("token_"))
 async def edit_token(callback: CallbackQuery, state: FSMContext):
@@ -615,9 +735,8 @@ async def edit_token(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.message(TokenStates.waiting_for_emoji)
-async def process_token_emoji(message: Message, state: FSMContext):
+async def process_token_emoji(message: Message, state: FSMContext, db: Database):
     """Обрабатывает новый эмодзи для токена"""
-    db = Database()
     if not db.is_valid_emoji(message.text):
         await message.answer(
             "❌ Пожалуйста, отправьте только один эмодзи\n\n"
@@ -645,9 +764,8 @@ async def process_token_emoji(message: Message, state: FSMContext):
     )
 
 @router.message(TokenStates.waiting_for_name)
-async def process_token_name(message: Message, state: FSMContext):
+async def process_token_name(message: Message, state: FSMContext, db: Database):
     """Обрабатывает новое название для токена"""
-    db = Database()
     if not db.is_valid_name(message.text):
         await message.answer(
             "❌ Название должно содержать только буквы и пробелы\n\n"
@@ -671,11 +789,10 @@ async def process_token_name(message: Message, state: FSMContext):
         await message.answer("✅ Токен успешно обновлен!")
         
         # Показываем обновленный список токенов
-        tokens = await db.get_all_tokens()
-        total_pages = math.ceil(len(tokens) / ITEMS_PER_PAGE)
+        tokens = await db.get_tokens_page(limit=ITEMS_PER_PAGE)
         await message.answer(
-            f"🏆 Список токенов (страница 1/{total_pages}):",
-            reply_markup=AdminKeyboard.get_tokens_keyboard(tokens[:ITEMS_PER_PAGE], 1, total_pages)
+            f"🏆 Список токенов (страница 1/{tokens.total_pages}):",
+            reply_markup=AdminKeyboard.get_tokens_keyboard(tokens, 1)
         )
     else:
         await message.answer("❌ Ошибка при обновлении токена")
@@ -9,9 +9,8 @@ from config import config
 router = Router()
 
 @router.message(Command("start"))
-async def cmd_start(message: Message):
+async def cmd_start(message: Message, db: Database):
     """Обработчик команды /start"""
-    db = Database()
     
     # Проверяем, есть ли реферальный код
     args = message.text.split()
@@ -3,9 +3,10 @@ from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from database.database import Database
+from database.entitlements import Entitlement
 from keyboards.creativity import CreativityKeyboard
 from keyboards.main_menu import MainMenuKeyboard
-from handlers.exercises import send_video, get_direct_download_link
+from services.video_delivery import send_video
 from config import config
 import random
 import logging
@@ -15,6 +16,12 @@ router = Router()
 class CreativityStates(StatesGroup):
     waiting_for_photo = State()
 
+MASTERCLASS_UNAVAILABLE = "Этот мастер-класс уже недоступен. Выбери мастер-класс заново!"
+
+async def masterclass_not_found(callback: CallbackQuery) -> None:
+    """Сообщает, что мастер-класса из состояния больше нет (состояние сброшено или видео удалено)"""
+    await callback.answer(MASTERCLASS_UNAVAILABLE, show_alert=True)
+
 SECTION_DESCRIPTIONS = {
     "drawing": {
         "title": "🎨 Рисование",
@@ -74,17 +81,15 @@ async def show_creativity_menu(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("creativity_"))
-async def show_section_menu(callback: CallbackQuery, state: FSMContext):
+async def show_section_menu(callback: CallbackQuery, state: FSMContext, entitlement: Entitlement):
     """Показывает меню конкретного раздела"""
     section = callback.data.split("_")[1]
     info = SECTION_DESCRIPTIONS.get(section, {})
     
-    db = Database()
     # Проверяем доступ к функции для всех разделов, кроме рисования
     if section in ["paper", "sculpting"]:
         # Для бумаги и лепки всегда требуется подписка
-        subscription = await db.get_user_subscription(callback.from_user.id)
-        if not subscription:
+        if not entitlement.has_subscription:
             await callback.message.edit_text(
                 "⭐ Доступ к этому разделу ограничен!\n\n"
                 "Для доступа к разделу необходима подписка.\n"
@@ -95,7 +100,7 @@ async def show_section_menu(callback: CallbackQuery, state: FSMContext):
             return
     elif section == "drawing":
         # Для рисования проверяем бесплатную попытку
-        has_access = await db.check_feature_access(callback.from_user.id, 'drawing')
+        has_access = entitlement.allows('drawing')
         if not has_access:
             await callback.message.edit_text(
                 "⭐ Доступ к мастер-классам ограничен!\n\n"
@@ -116,17 +121,15 @@ async def show_section_menu(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.callback_query(F.data == "start_masterclass")
-async def start_masterclass(callback: CallbackQuery, state: FSMContext):
+async def start_masterclass(callback: CallbackQuery, state: FSMContext, db: Database, entitlement: Entitlement):
     """Начинает сессию мастер-класса"""
     data = await state.get_data()
     section = data.get("current_section")
     
-    db = Database()
     # Проверяем доступ к функции для всех разделов
     if section in ["paper", "sculpting"]:
         # Для бумаги и лепки всегда требуется подписка
-        subscription = await db.get_user_subscription(callback.from_user.id)
-        if not subscription:
+        if not entitlement.has_subscription:
             await callback.message.edit_text(
                 "⭐ Доступ к этому разделу ограничен!\n\n"
                 "Для доступа к разделу необходима подписка.\n"
@@ -137,7 +140,7 @@ async def start_masterclass(callback: CallbackQuery, state: FSMContext):
             return
     elif section == "drawing":
         # Для рисования проверяем бесплатную попытку
-        has_access = await db.check_feature_access(callback.from_user.id, 'drawing')
+        has_access = entitlement.allows('drawing')
         if not has_access:
             await callback.message.edit_text(
                 "⭐ Доступ к мастер-классам ограничен!\n\n"
@@ -159,8 +162,8 @@ async def start_masterclass(callback: CallbackQuery, state: FSMContext):
         # Проверяем, было ли видео уже выполнено
         is_completed = await db.is_creativity_masterclass_completed(callback.from_user.id, video['id'])
         
-        await state.update_data(current_video=video)
-        await send_masterclass_video(callback.message, video, is_completed)
+        await state.update_data(current_video_id=video['id'])
+        await send_masterclass_video(callback.message, db, video, is_completed)
     else:
         await callback.message.edit_text(
             "К сожалению, сейчас нет доступных мастер-классов.",
@@ -168,12 +171,9 @@ async def start_masterclass(callback: CallbackQuery, state: FSMContext):
         )
     await callback.answer()
 
-async def send_masterclass_video(message, video, is_completed):
+async def send_masterclass_video(message, db: Database, video, is_completed):
     """Отправляет видео мастер-класса"""
     try:
-        # Получаем прямую ссылку на видео
-        direct_link = await get_direct_download_link(video['video_url'])
-        
         # Формируем текст описания
         text = f"🎨 {video['title']}\n\n{video['description']}\n\n"
         
@@ -185,8 +185,9 @@ async def send_masterclass_video(message, video, is_completed):
         # Отправляем видео
         success = await send_video(
             bot=message.bot,
+            db=db,
             chat_id=message.chat.id,
-            video_url=direct_link,
+            video_url=video['video_url'],
             caption=text,
             reply_markup=CreativityKeyboard.get_masterclass_keyboard(
                 video['id'],
@@ -208,18 +209,16 @@ async def send_masterclass_video(message, video, is_completed):
         )
 
 @router.callback_query(F.data.startswith("complete_masterclass_"))
-async def complete_masterclass(callback: CallbackQuery, state: FSMContext):
+async def complete_masterclass(callback: CallbackQuery, state: FSMContext, db: Database, entitlement: Entitlement):
     """Отмечает мастер-класс как выполненный"""
     try:
         data = await state.get_data()
         section = data.get("current_section")
         
-        db = Database()
         # Проверяем доступ к функции для всех разделов
         if section in ["paper", "sculpting"]:
             # Для бумаги и лепки всегда требуется подписка
-            subscription = await db.get_user_subscription(callback.from_user.id)
-            if not subscription:
+            if not entitlement.has_subscription:
                 await callback.message.edit_text(
                     "⭐ Доступ к этому разделу ограничен!\n\n"
                     "Для доступа к разделу необходима подписка.\n"
@@ -230,7 +229,7 @@ async def complete_masterclass(callback: CallbackQuery, state: FSMContext):
                 return
         elif section == "drawing":
             # Для рисования проверяем бесплатную попытку
-            has_access = await db.check_feature_access(callback.from_user.id, 'drawing')
+            has_access = entitlement.allows('drawing')
             if not has_access:
                 await callback.message.edit_text(
                     "⭐ Доступ к мастер-классам ограничен!\n\n"
@@ -299,17 +298,15 @@ async def complete_masterclass(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
 
 @router.callback_query(F.data.startswith("postpone_masterclass_"))
-async def postpone_masterclass(callback: CallbackQuery, state: FSMContext):
+async def postpone_masterclass(callback: CallbackQuery, state: FSMContext, db: Database, entitlement: Entitlement):
     """Откладывает текущий мастер-класс и показывает следующий"""
     data = await state.get_data()
     section = data.get("current_section")
     
-    db = Database()
     # Проверяем доступ к функции для всех разделов
     if section in ["paper", "sculpting"]:
         # Для бумаги и лепки всегда требуется подписка
-        subscription = await db.get_user_subscription(callback.from_user.id)
-        if not subscription:
+        if not entitlement.has_subscription:
             await callback.message.edit_text(
                 "⭐ Доступ к этому разделу ограничен!\n\n"
                 "Для доступа к разделу необходима подписка.\n"
@@ -320,7 +317,7 @@ async def postpone_masterclass(callback: CallbackQuery, state: FSMContext):
             return
     elif section == "drawing":
         # Для рисования проверяем бесплатную попытку
-        has_access = await db.check_feature_access(callback.from_user.id, 'drawing')
+        has_access = entitlement.allows('drawing')
         if not has_access:
             await callback.message.edit_text(
                 "⭐ Доступ к мастер-классам ограничен!\n\n"
@@ -335,8 +332,8 @@ async def postpone_masterclass(callback: CallbackQuery, state: FSMContext):
     next_video = await db.get_next_creativity_video(callback.from_user.id, section)
     
     if next_video:
-        await state.update_data(current_video=next_video)
-        await send_masterclass_video(callback.message, next_video, False)
+        await state.update_data(current_video_id=next_video['id'])
+        await send_masterclass_video(callback.message, db, next_video, False)
     else:
         await callback.message.edit_text(
             "Больше нет доступных мастер-классов.",
@@ -357,10 +354,14 @@ async def request_photo(callback: CallbackQuery, state: FSMContext):
     )
 
 @router.message(F.photo, CreativityStates.waiting_for_photo)
-async def process_photo(message: Message, state: FSMContext):
+async def process_photo(message: Message, state: FSMContext, db: Database):
     """Обрабатывает полученное фото"""
     data = await state.get_data()
-    current_video = data.get("current_video")
+    current_video = await db.get_creativity_video_by_id(data.get("current_video_id"))
+    if current_video is None:
+        await state.clear()
+        await message.answer(MASTERCLASS_UNAVAILABLE, reply_markup=CreativityKeyboard.get_section_keyboard())
+        return
     
     # Отправляем фото в канал
     await message.bot.send_photo(
@@ -373,7 +374,6 @@ async def process_photo(message: Message, state: FSMContext):
     )
     
     # Проверяем статус выполнения
-    db = Database()
     is_completed = await db.is_creativity_masterclass_completed(message.from_user.id, current_video['id'])
     
     await message.answer(
@@ -383,21 +383,24 @@ async def process_photo(message: Message, state: FSMContext):
     await state.clear()
 
 @router.callback_query(F.data == "cancel_photo")
-async def cancel_photo(callback: CallbackQuery, state: FSMContext):
+async def cancel_photo(callback: CallbackQuery, state: FSMContext, db: Database):
     """Отменяет отправку фото"""
     data = await state.get_data()
-    current_video = data.get("current_video")
+    current_video = await db.get_creativity_video_by_id(data.get("current_video_id"))
+    if current_video is None:
+        await state.clear()
+        await masterclass_not_found(callback)
+        return
     
     # Проверяем статус выполнения
-    db = Database()
     is_completed = await db.is_creativity_masterclass_completed(callback.from_user.id, current_video['id'])
     
     await state.clear()
-    await send_masterclass_video(callback.message, current_video, is_completed)
+    await send_masterclass_video(callback.message, db, current_video, is_completed)
     await callback.answer()
 
 @router.callback_query(F.data.startswith(("next_masterclass_", "prev_masterclass_")))
-async def navigate_masterclasses(callback: CallbackQuery, state: FSMContext):
+async def navigate_masterclasses(callback: CallbackQuery, state: FSMContext, db: Database, entitlement: Entitlement):
     """Навигация между мастер-классами"""
     try:
         direction = "next" if callback.data.startswith("next") else "prev"
@@ -406,12 +409,10 @@ async def navigate_masterclasses(callback: CallbackQuery, state: FSMContext):
         data = await state.get_data()
         section = data.get("current_section")
         
-        db = Database()
         # Проверяем доступ к функции для всех разделов
         if section in ["paper", "sculpting"]:
             # Для бумаги и лепки всегда требуется подписка
-            subscription = await db.get_user_subscription(callback.from_user.id)
-            if not subscription:
+            if not entitlement.has_subscription:
                 await callback.message.edit_caption(
                     caption="⭐ Доступ к этому разделу ограничен!\n\n"
                     "Для доступа к разделу необходима подписка.\n"
@@ -422,7 +423,7 @@ async def navigate_masterclasses(callback: CallbackQuery, state: FSMContext):
                 return
         elif section == "drawing":
             # Для рисования проверяем бесплатную попытку
-            has_access = await db.check_feature_access(callback.from_user.id, 'drawing')
+            has_access = entitlement.allows('drawing')
             if not has_access:
                 await callback.message.edit_caption(
                     caption="⭐ Доступ к мастер-классам ограничен!\n\n"
@@ -445,8 +446,8 @@ async def navigate_masterclasses(callback: CallbackQuery, state: FSMContext):
             # Проверяем, было ли видео уже выполнено
             is_completed = await db.is_creativity_masterclass_completed(callback.from_user.id, next_video['id'])
             
-            await state.update_data(current_video=next_video)
-            await send_masterclass_video(callback.message, next_video, is_completed)
+            await state.update_data(current_video_id=next_video['id'])
+            await send_masterclass_video(callback.message, db, next_video, is_completed)
         else:
             direction_text = "следующих" if direction == "next" else "предыдущих"
             await callback.message.edit_caption(
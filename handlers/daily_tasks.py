@@ -4,17 +4,17 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from keyboards.daily_tasks import DailyTasksKeyboard
 from keyboards.main_menu import MainMenuKeyboard
 from database.database import Database
+from database.entitlements import Entitlement
 import random
 
 router = Router()
 
 @router.callback_query(F.data == "daily_tasks")
-async def show_daily_tasks_menu(callback: CallbackQuery):
+async def show_daily_tasks_menu(callback: CallbackQuery, db: Database, entitlement: Entitlement):
     """Показывает главное меню раздела ежедневных заданий"""
-    db = Database()
     
     # Проверяем доступ к функции
-    has_access = await db.check_feature_access(callback.from_user.id, 'daily_tasks')
+    has_access = entitlement.allows('daily_tasks')
     if not has_access:
         await callback.message.edit_text(
             "⭐ Доступ к ежедневным заданиям ограничен!\n\n"
@@ -49,12 +49,11 @@ async def show_daily_tasks_menu(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "show_daily_tasks")
-async def show_next_task(callback: CallbackQuery):
+async def show_next_task(callback: CallbackQuery, db: Database, entitlement: Entitlement):
     """Показывает следующее невыполненное задание"""
-    db = Database()
     
     # Проверяем доступ к функции
-    has_access = await db.check_feature_access(callback.from_user.id, 'daily_tasks')
+    has_access = entitlement.allows('daily_tasks')
     if not has_access:
         await callback.message.edit_text(
             "⭐ Доступ к ежедневным заданиям ограничен!\n\n"
@@ -93,12 +92,11 @@ async def show_next_task(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("complete_task_"))
-async def complete_task(callback: CallbackQuery):
+async def complete_task(callback: CallbackQuery, db: Database, entitlement: Entitlement):
     """Обрабатывает выполнение задания"""
-    db = Database()
     
     # Проверяем доступ к функции
-    has_access = await db.check_feature_access(callback.from_user.id, 'daily_tasks')
+    has_access = entitlement.allows('daily_tasks')
     if not has_access:
         await callback.message.edit_text(
             "⭐ Доступ к ежедневным заданиям ограничен!\n\n"
@@ -113,15 +111,13 @@ async def complete_task(callback: CallbackQuery):
     task_id = int(callback.data.split("_")[2])
     
     # Отмечаем задание как выполненное
-    success = await db.complete_daily_task(callback.from_user.id, task_id)
-    if success:
+    awards = await db.complete_daily_task(callback.from_user.id, task_id)
+    if awards is not None:
         # Увеличиваем счетчик использования функции
         await db.increment_feature_attempt(callback.from_user.id, 'daily_tasks')
         
-        # Проверяем количество выполненных заданий
-        tasks, completed = await db.get_user_daily_tasks(callback.from_user.id)
-        
-        if completed == 5:
+        # "Чемпион дня" начисляется, когда выполнены все 5 заданий
+        if 8 in awards:
             # Получаем супер-приз (токен с id=8)
             super_token = await db.get_token_by_id(8)
             text = (
@@ -146,10 +142,9 @@ async def complete_task(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("skip_task_"))
-async def skip_task(callback: CallbackQuery):
+async def skip_task(callback: CallbackQuery, db: Database):
     """Пропускает текущее задание и показывает другое случайное"""
     current_task_id = int(callback.data.split("_")[2])
-    db = Database()
     tasks, completed = await db.get_user_daily_tasks(callback.from_user.id)
     
     if completed == 5:
@@ -1,15 +1,11 @@
 from aiogram import Router, F, types
-from aiogram.types import CallbackQuery, FSInputFile, BufferedInputFile
+from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
 from database.database import Database
+from database.entitlements import Entitlement
 from keyboards.exercises import ExercisesKeyboard
-import aiohttp
-from io import BytesIO
-import re
-from urllib.parse import urlencode
-import aiosqlite
-from datetime import datetime
 from keyboards.main_menu import MainMenuKeyboard
+from services.video_delivery import send_video
 
 router = Router()
 
@@ -49,59 +45,13 @@ EXERCISE_DESCRIPTIONS = {
     }
 }
 
-async def get_direct_download_link(url: str) -> str:
-    """Получает прямую ссылку на скачивание файла с Google Drive"""
-    # Извлекаем ID файла из URL
-    file_id = url.split('/d/')[1].split('/')[0]
-    # Формируем прямую ссылку для скачивания
-    direct_link = f"https://drive.google.com/uc?export=download&id={file_id}"
-    print(f"Прямая ссылка для скачивания: {direct_link}")
-    return direct_link
-
-async def send_video(bot, chat_id, video_url, caption, reply_markup=None):
-    """Отправляет видео по прямой ссылке"""
-    try:
-        # Отправляем видео напрямую по ссылке
-        await bot.send_video(
-            chat_id=chat_id,
-            video=video_url,
-            caption=caption,
-            reply_markup=reply_markup,
-            supports_streaming=True
-        )
-        return True
-    except Exception as e:
-        print(f"Ошибка при отправке видео: {e}")
-        try:
-            # Если не удалось отправить напрямую, пробуем скачать и отправить как файл
-            async with aiohttp.ClientSession() as session:
-                async with session.get(video_url) as response:
-                    if response.status == 200:
-                        video_data = await response.read()
-                        video_file = BufferedInputFile(
-                            video_data,
-                            filename="exercise.mp4"
-                        )
-                        await bot.send_video(
-                            chat_id=chat_id,
-                            video=video_file,
-                            caption=caption,
-                            reply_markup=reply_markup,
-                            supports_streaming=True
-                        )
-                        return True
-        except Exception as e2:
-            print(f"Ошибка при повторной попытке отправки видео: {e2}")
-        return False
-
 @router.callback_query(F.data.in_(["neuro_exercises", "articular_exercises"]))
-async def show_exercise_menu(callback: CallbackQuery, state: FSMContext):
+async def show_exercise_menu(callback: CallbackQuery, state: FSMContext, entitlement: Entitlement):
     """Показывает меню раздела упражнений"""
     exercise_type = 'neuro' if callback.data == "neuro_exercises" else 'articular'
     
-    db = Database()
     # Проверяем доступ к функции
-    has_access = await db.check_feature_access(callback.from_user.id, exercise_type + '_exercises')
+    has_access = entitlement.allows(exercise_type + '_exercises')
     if not has_access:
         await callback.message.edit_text(
             "⭐ Доступ к упражнениям ограничен!\n\n"
@@ -124,7 +74,7 @@ async def show_exercise_menu(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.callback_query(F.data == "watch_exercise")
-async def show_exercise_video(callback: CallbackQuery, state: FSMContext):
+async def show_exercise_video(callback: CallbackQuery, state: FSMContext, db: Database):
     """Показывает видео упражнения"""
     print("Обработка нажатия кнопки 'Смотреть'")
     
@@ -137,7 +87,6 @@ async def show_exercise_video(callback: CallbackQuery, state: FSMContext):
         await callback.message.edit_text("Произошла ошибка. Попробуйте начать сначала.")
         return
 
-    db = Database()
     video = await db.get_next_exercise_video(callback.from_user.id, exercise_type)
     print(f"Полученное видео из БД: {video}")
     
@@ -148,8 +97,6 @@ async def show_exercise_video(callback: CallbackQuery, state: FSMContext):
 
     try:
         print(f"Попытка загрузки видео по URL: {video['video_url']}")
-        direct_link = await get_direct_download_link(video['video_url'])
-        print(f"Получена прямая ссылка: {direct_link}")
         
         # Формируем подпись для видео
         caption = f"🎥 {video['title']}\n\n{video['description']}"
@@ -161,8 +108,9 @@ async def show_exercise_video(callback: CallbackQuery, state: FSMContext):
         # Отправляем видео новым сообщением
         success = await send_video(
             bot=callback.message.bot,
+            db=db,
             chat_id=callback.message.chat.id,
-            video_url=direct_link,
+            video_url=video['video_url'],
             caption=caption,
             reply_markup=ExercisesKeyboard.get_exercise_keyboard(
                 video['id'],
@@ -182,7 +130,7 @@ async def show_exercise_video(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.callback_query(F.data.startswith(("prev_video_", "next_video_")))
-async def navigate_videos(callback: CallbackQuery, state: FSMContext):
+async def navigate_videos(callback: CallbackQuery, state: FSMContext, db: Database):
     """Обрабатывает навигацию между видео"""
     try:
         action = callback.data.split('_')[0]  # prev или next
@@ -195,7 +143,6 @@ async def navigate_videos(callback: CallbackQuery, state: FSMContext):
             await callback.message.edit_text("Произошла ошибка. Попробуйте начать сначала.")
             return
         
-        db = Database()
         # Получаем следующее/предыдущее видео
         video = await db.get_next_exercise_video(callback.from_user.id, exercise_type)
         
@@ -203,8 +150,6 @@ async def navigate_videos(callback: CallbackQuery, state: FSMContext):
             await callback.answer("Больше видео нет")
             return
             
-        direct_link = await get_direct_download_link(video['video_url'])
-        
         # Формируем подпись для видео
         caption = f"🎥 {video['title']}\n\n{video['description']}"
         if video.get('already_viewed'):
@@ -215,8 +160,9 @@ async def navigate_videos(callback: CallbackQuery, state: FSMContext):
         # Отправляем видео
         success = await send_video(
             bot=callback.message.bot,
+            db=db,
             chat_id=callback.message.chat.id,
-            video_url=direct_link,
+            video_url=video['video_url'],
             caption=caption,
             reply_markup=ExercisesKeyboard.get_exercise_keyboard(
                 video['id'],
@@ -230,14 +176,14 @@ async def navigate_videos(callback: CallbackQuery, state: FSMContext):
             # Сохраняем ID видео в состоянии
             await state.update_data(current_video_id=video['id'])
         else:
-            await callback.answer("Произошла ошибка при загрузке видео")
+            await callback.answer("Не удалось загрузить видео. Попробуйте позже.")
         
     except Exception as e:
         print(f"Ошибка при навигации: {e}")
         await callback.answer("Произошла ошибка при переключении видео")
 
 @router.callback_query(F.data.startswith(("exercise_full_", "exercise_partial_", "exercise_not_done_")))
-async def process_exercise_completion(callback: CallbackQuery, state: FSMContext):
+async def process_exercise_completion(callback: CallbackQuery, state: FSMContext, db: Database):
     """Обрабатывает отметку о выполнении упражнения"""
     try:
         # Определяем статус из callback_data
@@ -250,7 +196,6 @@ async def process_exercise_completion(callback: CallbackQuery, state: FSMContext
             status = parts[1]  # full или partial
             video_id = int(parts[2])
         
-        db = Database()
         # Получаем информацию о видео для определения типа упражнения
         video = await db.get_exercise_video(video_id)
         if not video:
@@ -261,19 +206,9 @@ async def process_exercise_completion(callback: CallbackQuery, state: FSMContext
         info = EXERCISE_DESCRIPTIONS[exercise_type]
         
         # Проверяем, не получал ли пользователь уже жетоны за это упражнение сегодня
-        today = datetime.now().date()
-        async with aiosqlite.connect(db.db_path) as conn:
-            cursor = await conn.execute("""
-                SELECT COUNT(*) FROM user_exercise_views
-                WHERE user_id = ? AND video_id = ?
-                AND date(date) = date(?)
-                AND (status = 'full' OR status = 'partial')
-            """, (callback.from_user.id, video_id, today))
-            count = (await cursor.fetchone())[0]
-            
-            if count > 0 and status in ['full', 'partial']:
-                await callback.answer("Вы уже получили жетоны за это упражнение сегодня!")
-                return
+        if status in ['full', 'partial'] and await db.is_exercise_rewarded_today(callback.from_user.id, video_id):
+            await callback.answer("Вы уже получили жетоны за это упражнение сегодня!")
+            return
         
         # Записываем просмотр упражнения
         await db.record_exercise_view(callback.from_user.id, video_id, status)
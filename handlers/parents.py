@@ -22,9 +22,8 @@ async def show_parents_menu(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "referral_link")
-async def show_referral_info(callback: CallbackQuery):
+async def show_referral_info(callback: CallbackQuery, db: Database):
     """Показывает информацию о реферальной программе"""
-    db = Database()
     stats = await db.get_referral_stats(callback.from_user.id)
     link = await db.get_referral_link(callback.from_user.id)
     
@@ -44,9 +43,8 @@ async def show_referral_info(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "copy_referral")
-async def copy_referral_link(callback: CallbackQuery):
+async def copy_referral_link(callback: CallbackQuery, db: Database):
     """Копирует реферальную ссылку"""
-    db = Database()
     link = await db.get_referral_link(callback.from_user.id)
     await callback.answer("Ссылка скопирована!", show_alert=True)
 
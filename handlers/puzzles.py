@@ -1,24 +1,74 @@
 from aiogram import Router, F
 from aiogram.filters import StateFilter
-from aiogram.types import Message, CallbackQuery, FSInputFile
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message, CallbackQuery, FSInputFile, InlineKeyboardMarkup
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from typing import List, Optional
 from database.database import Database
+from database.entitlements import Entitlement
 from keyboards.main_menu import MainMenuKeyboard
 from keyboards.puzzles import PuzzlesKeyboard
+from services.single_flight import SingleFlight
 
 router = Router()
 
+# Первые загрузки картинок: одновременные показы одного ребуса ждут одну загрузку
+photo_uploads: SingleFlight[str] = SingleFlight()
+
 class PuzzleStates(StatesGroup):
     waiting_for_answer = State()
 
+async def send_puzzle_photo(message: Message, db: Database, puzzle: dict, caption: str, reply_markup: InlineKeyboardMarkup):
+    """Отправляет картинку ребуса по file_id, а изображение загружает только при первой отправке"""
+    if puzzle.get('file_id'):
+        try:
+            await message.answer_photo(photo=puzzle['file_id'], caption=caption, reply_markup=reply_markup)
+            return
+        except TelegramBadRequest:
+            pass  # file_id больше не действителен, загружаем изображение заново
+
+    async def upload() -> str:
+        # Файл читается потоком прямо при загрузке, целиком в память он не попадает
+        image_path = await db.get_puzzle_image_path(puzzle['id'])
+        sent = await message.answer_photo(
+            photo=FSInputFile(image_path, filename=f"puzzle_{puzzle['id']}.png"),
+            caption=caption,
+            reply_markup=reply_markup
+        )
+        file_id = sent.photo[-1].file_id
+        await db.set_puzzle_file_id(puzzle['id'], file_id)
+        return file_id
+
+    file_id, leader = await photo_uploads.do_shared(puzzle['id'], upload)
+    if not leader:
+        # Картинку уже загрузил другой пользователь, отправляем ее по полученному file_id
+        await message.answer_photo(photo=file_id, caption=caption, reply_markup=reply_markup)
+    puzzle['file_id'] = file_id
+
+def find_puzzle(puzzles: List[dict], puzzle_id: Optional[int]) -> Optional[dict]:
+    """Находит ребус в сегодняшнем наборе и запоминает в нем номер картинки (index, с единицы)"""
+    for index, puzzle in enumerate(puzzles, start=1):
+        if puzzle['id'] == puzzle_id:
+            puzzle['index'] = index
+            return puzzle
+    return None
+
+async def find_user_puzzle(db: Database, user_id: int, puzzle_id: Optional[int]) -> Optional[dict]:
+    """Находит ребус из сегодняшнего набора пользователя с актуальными отметками"""
+    puzzles, _ = await db.get_user_puzzles(user_id)
+    return find_puzzle(puzzles, puzzle_id)
+
+async def puzzle_not_found(callback: CallbackQuery) -> None:
+    """Сообщает, что ребуса больше нет в сегодняшнем наборе (например, наступил новый день)"""
+    await callback.answer("Эти ребусы уже недоступны. Начни ребусы заново!", show_alert=True)
+
 @router.callback_query(F.data == "puzzles")
-async def show_puzzles_menu(callback: CallbackQuery):
+async def show_puzzles_menu(callback: CallbackQuery, entitlement: Entitlement):
     """Показывает меню ребусов"""
-    db = Database()
     
     # Проверяем доступ к функции
-    has_access = await db.check_feature_access(callback.from_user.id, 'puzzles')
+    has_access = entitlement.allows('puzzles')
     if not has_access:
         await callback.message.edit_text(
             "⭐ Доступ к ребусам ограничен!\n\n"
@@ -42,9 +92,8 @@ async def show_puzzles_menu(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "start_puzzles")
-async def start_puzzles(callback: CallbackQuery, state: FSMContext):
+async def start_puzzles(callback: CallbackQuery, state: FSMContext, db: Database):
     """Начинает сессию ребусов"""
-    db = Database()
     puzzles, completed_count = await db.get_user_puzzles(callback.from_user.id)
     
     if completed_count == 9:  # 3 ребуса * 3 картинки
@@ -54,16 +103,14 @@ async def start_puzzles(callback: CallbackQuery, state: FSMContext):
             reply_markup=PuzzlesKeyboard.get_menu_keyboard()
         )
         await callback.answer()
-        await db.cleanup_temp_files()
         return
     
     # Показываем первый ребус
     puzzle = puzzles[0]
-    image = FSInputFile(puzzle['image_path'])
     
     # Отправляем изображение с ребусами
-    await callback.message.answer_photo(
-        photo=image,
+    await send_puzzle_photo(
+        callback.message, db, puzzle,
         caption=(
             f"Ребус {1}/3\n\n"
             "На картинке изображены 3 ребуса.\n"
@@ -72,18 +119,20 @@ async def start_puzzles(callback: CallbackQuery, state: FSMContext):
         reply_markup=PuzzlesKeyboard.get_puzzle_keyboard(puzzle['id'], puzzle['solved'])
     )
     
-    # Сохраняем текущий ребус в состояние
-    await state.update_data(current_puzzle=puzzle)
+    # В состоянии храним только id ребуса: ответы и отметки читаются из базы
+    await state.update_data(puzzle_id=puzzle['id'])
     await callback.answer()
 
 @router.callback_query(F.data.startswith("answer_puzzle_"))
-async def start_answer_puzzle(callback: CallbackQuery, state: FSMContext):
+async def start_answer_puzzle(callback: CallbackQuery, state: FSMContext, db: Database):
     """Начинает процесс ответа на ребус"""
     puzzle_id = int(callback.data.split('_')[2])
     rebus_number = int(callback.data.split('_')[3])
     
-    data = await state.get_data()
-    puzzle = data.get('current_puzzle')
+    puzzle = await find_user_puzzle(db, callback.from_user.id, puzzle_id)
+    if puzzle is None:
+        await puzzle_not_found(callback)
+        return
     
     if puzzle['solved'][rebus_number - 1]:
         # Отправляем новое сообщение вместо редактирования
@@ -96,11 +145,9 @@ async def start_answer_puzzle(callback: CallbackQuery, state: FSMContext):
     
     await state.set_state(PuzzleStates.waiting_for_answer)
     # Сохраняем все необходимые данные в состояние
-    puzzle['index'] = data.get('current_index', 0) + 1
     await state.update_data(
         puzzle_id=puzzle_id,
-        rebus_number=rebus_number,
-        current_puzzle=puzzle
+        rebus_number=rebus_number
     )
     
     # Отправляем новое сообщение вместо редактирования
@@ -112,13 +159,12 @@ async def start_answer_puzzle(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.message(PuzzleStates.waiting_for_answer)
-async def process_puzzle_answer(message: Message, state: FSMContext):
+async def process_puzzle_answer(message: Message, state: FSMContext, db: Database):
     """Обработка ответа на ребус"""
     data = await state.get_data()
     puzzle_id = data['puzzle_id']
     rebus_number = data['rebus_number']
     
-    db = Database()
     is_correct = await db.check_puzzle_answer(
         message.from_user.id,
         puzzle_id,
@@ -129,7 +175,14 @@ async def process_puzzle_answer(message: Message, state: FSMContext):
     if is_correct:
         # Получаем обновленные данные о ребусах
         puzzles, completed_count = await db.get_user_puzzles(message.from_user.id)
-        current_puzzle = next(p for p in puzzles if p['id'] == puzzle_id)
+        current_puzzle = find_puzzle(puzzles, puzzle_id)
+        if current_puzzle is None:
+            await state.clear()
+            await message.answer(
+                "Эти ребусы уже недоступны. Начни ребусы заново!",
+                reply_markup=PuzzlesKeyboard.get_menu_keyboard()
+            )
+            return
         
         # Считаем количество нерешенных ребусов на текущей картинке
         remaining = sum(1 for solved in current_puzzle['solved'] if not solved)
@@ -153,7 +206,6 @@ async def process_puzzle_answer(message: Message, state: FSMContext):
                     "Приходи завтра за новыми ребусами!",
                     reply_markup=PuzzlesKeyboard.get_menu_keyboard()
                 )
-                await db.cleanup_temp_files()
             else:
                 await message.answer(
                     f"✨ Отлично! Ты разгадал все ребусы на этой картинке!\n"
@@ -169,15 +221,17 @@ async def process_puzzle_answer(message: Message, state: FSMContext):
         )
 
 @router.callback_query(F.data.startswith("show_answers_"))
-async def show_puzzle_answers(callback: CallbackQuery, state: FSMContext):
+async def show_puzzle_answers(callback: CallbackQuery, state: FSMContext, db: Database):
     """Показывает ответы на ребусы"""
     puzzle_id = int(callback.data.split('_')[2])
+    puzzle = await find_user_puzzle(db, callback.from_user.id, puzzle_id)
+    if puzzle is None:
+        # Проверяем до списания, чтобы ключ не пропал зря
+        await puzzle_not_found(callback)
+        return
     
-    db = Database()
     # Пытаемся потратить ключ доступа
     if not await db.spend_token(callback.from_user.id, 1):
-        data = await state.get_data()
-        puzzle = data.get('current_puzzle')
         # Отправляем новое сообщение вместо редактирования
         await callback.message.answer(
             "У тебя нет 🔑 Ключа доступа!\n"
@@ -187,9 +241,6 @@ async def show_puzzle_answers(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
         return
     
-    data = await state.get_data()
-    puzzle = data.get('current_puzzle')
-    
     # Отправляем новое сообщение вместо редактирования
     await callback.message.answer(
         "Ответы на ребусы:\n\n"
@@ -202,27 +253,26 @@ async def show_puzzle_answers(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("cancel_puzzle_answer_"))
-async def cancel_puzzle_answer(callback: CallbackQuery, state: FSMContext):
+async def cancel_puzzle_answer(callback: CallbackQuery, state: FSMContext, db: Database):
     """Отменяет ввод ответа на ребус"""
     puzzle_id = int(callback.data.split('_')[3])
     rebus_number = int(callback.data.split('_')[4])
     
     # Получаем актуальные данные из БД
-    db = Database()
-    puzzles, completed_count = await db.get_user_puzzles(callback.from_user.id)
-    current_puzzle = next(p for p in puzzles if p['id'] == puzzle_id)
+    current_puzzle = await find_user_puzzle(db, callback.from_user.id, puzzle_id)
     
     # Очищаем состояние ожидания ответа
     await state.clear()
+    if current_puzzle is None:
+        await puzzle_not_found(callback)
+        return
     
-    # Восстанавливаем состояние текущего ребуса с актуальными данными
-    current_puzzle['index'] = next(i for i, p in enumerate(puzzles) if p['id'] == puzzle_id) + 1
-    await state.update_data(current_puzzle=current_puzzle)
+    # Восстанавливаем текущий ребус в состоянии
+    await state.update_data(puzzle_id=puzzle_id)
     
     # Отправляем изображение с актуальным состоянием кнопок
-    image = FSInputFile(current_puzzle['image_path'])
-    await callback.message.answer_photo(
-        photo=image,
+    await send_puzzle_photo(
+        callback.message, db, current_puzzle,
         caption=(
             f"Ребус {current_puzzle['index']}/3\n\n"
             "На картинке изображены 3 ребуса.\n"
@@ -233,16 +283,18 @@ async def cancel_puzzle_answer(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.callback_query(F.data == "next_puzzle")
-async def show_next_puzzle(callback: CallbackQuery, state: FSMContext):
+async def show_next_puzzle(callback: CallbackQuery, state: FSMContext, db: Database):
     """Показывает следующий ребус"""
-    db = Database()
     puzzles, completed_count = await db.get_user_puzzles(callback.from_user.id)
     
     # Находим текущий и следующий ребус
     data = await state.get_data()
-    current_puzzle = data.get('current_puzzle')
-    current_index = next(i for i, p in enumerate(puzzles) if p['id'] == current_puzzle['id'])
-    next_index = current_index + 1
+    current_puzzle = find_puzzle(puzzles, data.get('puzzle_id'))
+    if current_puzzle is None:
+        await state.clear()
+        await puzzle_not_found(callback)
+        return
+    next_index = current_puzzle['index']
     
     if next_index >= len(puzzles):
         await callback.message.answer(
@@ -256,10 +308,9 @@ async def show_next_puzzle(callback: CallbackQuery, state: FSMContext):
     # Показываем следующий ребус
     puzzle = puzzles[next_index]
     puzzle['index'] = next_index + 1  # Сохраняем индекс
-    image = FSInputFile(puzzle['image_path'])
     
-    await callback.message.answer_photo(
-        photo=image,
+    await send_puzzle_photo(
+        callback.message, db, puzzle,
         caption=(
             f"Ребус {next_index + 1}/3\n\n"
             "На картинке изображены 3 ребуса.\n"
@@ -269,15 +320,13 @@ async def show_next_puzzle(callback: CallbackQuery, state: FSMContext):
     )
     
     # Обновляем текущий ребус в состоянии
-    await state.update_data(current_puzzle=puzzle, current_index=next_index)
+    await state.update_data(puzzle_id=puzzle['id'])
     await callback.answer()
 
 @router.callback_query(F.data == "back_to_puzzles_menu")
 async def back_to_puzzles_menu(callback: CallbackQuery, state: FSMContext):
     """Возвращает в меню ребусов"""
-    db = Database()
     await state.clear()
-    await db.cleanup_temp_files()
     # Отправляем новое сообщение вместо редактирования
     await callback.message.answer(
         "🧩 Добро пожаловать в раздел Ребусы!\n\n"
@@ -1,9 +1,11 @@
+from typing import List, Optional
 from aiogram import Router, F
 from aiogram.filters import StateFilter
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from database.database import Database
+from database.entitlements import Entitlement
 from keyboards.main_menu import MainMenuKeyboard
 from keyboards.riddles import RiddlesKeyboard
 
@@ -12,13 +14,20 @@ router = Router()
 class RiddleStates(StatesGroup):
     waiting_for_answer = State()
 
+def find_riddle(riddles: List[dict], riddle_id: int) -> Optional[int]:
+    """Находит номер загадки в сегодняшнем наборе пользователя"""
+    return next((index for index, riddle in enumerate(riddles) if riddle['id'] == riddle_id), None)
+
+async def riddle_not_found(callback: CallbackQuery) -> None:
+    """Сообщает, что загадки больше нет в сегодняшнем наборе (например, наступил новый день)"""
+    await callback.answer("Эта загадка уже недоступна. Начни загадки заново!", show_alert=True)
+
 @router.callback_query(F.data == "riddles")
-async def show_riddles_menu(callback: CallbackQuery):
+async def show_riddles_menu(callback: CallbackQuery, entitlement: Entitlement):
     """Показывает меню загадок"""
-    db = Database()
     
     # Проверяем доступ к функции
-    has_access = await db.check_feature_access(callback.from_user.id, 'riddles')
+    has_access = entitlement.allows('riddles')
     if not has_access:
         await callback.message.edit_text(
             "⭐ Доступ к загадкам ограничен!\n\n"
@@ -42,9 +51,8 @@ async def show_riddles_menu(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "start_riddles")
-async def start_riddles(callback: CallbackQuery, state: FSMContext):
+async def start_riddles(callback: CallbackQuery, state: FSMContext, db: Database):
     """Начинает сессию загадок"""
-    db = Database()
     riddles, completed_count = await db.get_user_riddles(callback.from_user.id)
     
     if completed_count == 5:
@@ -56,75 +64,93 @@ async def start_riddles(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
         return
     
-    # Сохраняем загадки в состояние
-    await state.update_data(riddles=riddles, current_index=0)
-    
     # Показываем первую загадку
     riddle = riddles[0]
+    
+    # В состоянии храним только id загадки: сама загадка берется из справочника
+    await state.update_data(riddle_id=riddle['id'])
+    
     await callback.message.edit_text(
         f"Загадка {1}/5:\n\n"
         f"{riddle['question']}\n\n"
         f"{'✅ Разгадана!' if riddle['completed'] else '❌ Не разгадана'}",
-        reply_markup=RiddlesKeyboard.get_navigation_keyboard(0, len(riddles), riddle['completed'])
+        reply_markup=RiddlesKeyboard.get_navigation_keyboard(0, len(riddles), riddle['id'], riddle['completed'])
     )
     await callback.answer()
 
 @router.callback_query(F.data.startswith(("next_riddle_", "prev_riddle_")))
-async def navigate_riddles(callback: CallbackQuery, state: FSMContext):
+async def navigate_riddles(callback: CallbackQuery, state: FSMContext, db: Database):
     """Обработка навигации по загадкам"""
     data = await state.get_data()
-    riddles = data['riddles']
-    current_index = int(callback.data.split('_')[2])
+    riddles, _ = await db.get_user_riddles(callback.from_user.id)
+    current_index = find_riddle(riddles, int(callback.data.split('_')[2]))
+    if current_index is None:
+        await riddle_not_found(callback)
+        return
     
     if callback.data.startswith("next_"):
         new_index = current_index + 1
     else:
         new_index = current_index - 1
+    if new_index < 0 or new_index >= len(riddles):
+        await callback.answer("Больше загадок нет!")
+        return
     
+    riddle = riddles[new_index]
     # Очищаем состояние ответа, если оно было
-    await state.set_data({**data, 'current_index': new_index})
+    await state.set_data({**data, 'riddle_id': riddle['id']})
     
-    riddle = riddles[new_index]
     await callback.message.edit_text(
         f"Загадка {new_index + 1}/5:\n\n"
         f"{riddle['question']}\n\n"
         f"{'✅ Разгадана!' if riddle['completed'] else '❌ Не разгадана'}",
-        reply_markup=RiddlesKeyboard.get_navigation_keyboard(new_index, len(riddles), riddle['completed'])
+        reply_markup=RiddlesKeyboard.get_navigation_keyboard(new_index, len(riddles), riddle['id'], riddle['completed'])
     )
     await callback.answer()
 
 @router.callback_query(F.data.startswith("answer_riddle_"))
-async def start_answer_riddle(callback: CallbackQuery, state: FSMContext):
+async def start_answer_riddle(callback: CallbackQuery, state: FSMContext, db: Database):
     """Начинает процесс ответа на загадку"""
-    current_index = int(callback.data.split('_')[2])
-    data = await state.get_data()
-    riddle = data['riddles'][current_index]
+    riddles, _ = await db.get_user_riddles(callback.from_user.id)
+    current_index = find_riddle(riddles, int(callback.data.split('_')[2]))
+    if current_index is None:
+        await riddle_not_found(callback)
+        return
+    riddle = riddles[current_index]
     
     if riddle['completed']:
         await callback.message.edit_text(
             "Эта загадка уже разгадана! Переходи к следующей.",
-            reply_markup=RiddlesKeyboard.get_navigation_keyboard(current_index, len(data['riddles']))
+            reply_markup=RiddlesKeyboard.get_navigation_keyboard(current_index, len(riddles), riddle['id'])
         )
         await callback.answer()
         return
     
+    await state.update_data(riddle_id=riddle['id'])
     await state.set_state(RiddleStates.waiting_for_answer)
     await callback.message.edit_text(
         f"Загадка:\n{riddle['question']}\n\n"
         "Введи свой ответ одним словом.\n"
         "Для отмены нажми кнопку 'Назад'.",
-        reply_markup=RiddlesKeyboard.get_cancel_keyboard(current_index)
+        reply_markup=RiddlesKeyboard.get_cancel_keyboard(riddle['id'])
     )
     await callback.answer()
 
 @router.message(RiddleStates.waiting_for_answer)
-async def process_riddle_answer(message: Message, state: FSMContext):
+async def process_riddle_answer(message: Message, state: FSMContext, db: Database):
     """Обработка ответа на загадку"""
     data = await state.get_data()
-    current_index = data['current_index']
-    riddle = data['riddles'][current_index]
+    riddles, _ = await db.get_user_riddles(message.from_user.id)
+    current_index = find_riddle(riddles, data.get('riddle_id'))
+    if current_index is None:
+        await state.clear()
+        await message.answer(
+            "Эта загадка уже недоступна. Начни загадки заново!",
+            reply_markup=RiddlesKeyboard.get_menu_keyboard()
+        )
+        return
+    riddle = riddles[current_index]
     
-    db = Database()
     is_correct = await db.check_riddle_answer(
         message.from_user.id,
         riddle['id'],
@@ -134,7 +160,6 @@ async def process_riddle_answer(message: Message, state: FSMContext):
     if is_correct:
         # Получаем обновленные данные о загадках
         updated_riddles, completed_count = await db.get_user_riddles(message.from_user.id)
-        await state.update_data(riddles=updated_riddles)
         
         if completed_count == 5:
             # Получаем информацию о токенах
@@ -154,55 +179,59 @@ async def process_riddle_answer(message: Message, state: FSMContext):
             await message.answer(
                 f"✨ Правильно! Ты получаешь {riddle_token['emoji']} {riddle_token['name']}!\n"
                 f"Загадка {current_index + 1}/5 разгадана!",
-                reply_markup=RiddlesKeyboard.get_navigation_keyboard(current_index, len(updated_riddles))
+                reply_markup=RiddlesKeyboard.get_navigation_keyboard(current_index, len(updated_riddles), riddle['id'])
             )
     else:
         await message.answer(
             "🤔 Хм, подумай ещё!\n"
             "Попробуй дать другой ответ или нажми 'Назад' для отмены.",
-            reply_markup=RiddlesKeyboard.get_cancel_keyboard(current_index)
+            reply_markup=RiddlesKeyboard.get_cancel_keyboard(riddle['id'])
         )
 
 @router.callback_query(F.data.startswith("show_answer_"))
-async def show_riddle_answer(callback: CallbackQuery, state: FSMContext):
+async def show_riddle_answer(callback: CallbackQuery, state: FSMContext, db: Database):
     """Показывает ответ на загадку"""
-    db = Database()
+    riddles, _ = await db.get_user_riddles(callback.from_user.id)
+    current_index = find_riddle(riddles, int(callback.data.split('_')[2]))
+    if current_index is None:
+        await riddle_not_found(callback)
+        return
+    riddle = riddles[current_index]
+
     # Пытаемся потратить ключ доступа
     if not await db.spend_token(callback.from_user.id, 1):
-        data = await state.get_data()
-        current_index = int(callback.data.split('_')[2])
-        riddle = data['riddles'][current_index]
         await callback.message.edit_text(
             "У тебя нет 🔑 Ключа доступа!\n"
             "Попроси помощи у родителей или попробуй отгадать самостоятельно.",
             reply_markup=RiddlesKeyboard.get_navigation_keyboard(
                 current_index,
-                len(data['riddles']),
+                len(riddles),
+                riddle['id'],
                 riddle['completed']
             )
         )
         await callback.answer()
         return
     
-    data = await state.get_data()
-    current_index = int(callback.data.split('_')[2])
-    riddle = data['riddles'][current_index]
-    
     await callback.message.edit_text(
         f"Загадка {current_index + 1}/5:\n\n"
         f"{riddle['question']}\n\n"
         f"Ответ: {riddle['answer']}\n\n"
         "За просмотр ответа потрачен 1 🔑 Ключ доступа",
-        reply_markup=RiddlesKeyboard.get_navigation_keyboard(current_index, len(data['riddles']), riddle['completed'])
+        reply_markup=RiddlesKeyboard.get_navigation_keyboard(current_index, len(riddles), riddle['id'], riddle['completed'])
     )
     await callback.answer()
 
 @router.callback_query(F.data.startswith("cancel_answer_"))
-async def cancel_riddle_answer(callback: CallbackQuery, state: FSMContext):
+async def cancel_riddle_answer(callback: CallbackQuery, state: FSMContext, db: Database):
     """Отменяет ввод ответа на загадку"""
-    current_index = int(callback.data.split('_')[2])
     data = await state.get_data()
-    riddle = data['riddles'][current_index]
+    riddles, _ = await db.get_user_riddles(callback.from_user.id)
+    current_index = find_riddle(riddles, int(callback.data.split('_')[2]))
+    if current_index is None:
+        await riddle_not_found(callback)
+        return
+    riddle = riddles[current_index]
     
     await state.set_data(data)  # Сбрасываем состояние ответа
     
@@ -210,12 +239,12 @@ async def cancel_riddle_answer(callback: CallbackQuery, state: FSMContext):
         f"Загадка {current_index + 1}/5:\n\n"
         f"{riddle['question']}\n\n"
         f"{'✅ Разгадана!' if riddle['completed'] else '❌ Не разгадана'}",
-        reply_markup=RiddlesKeyboard.get_navigation_keyboard(current_index, len(data['riddles']), riddle['completed'])
+        reply_markup=RiddlesKeyboard.get_navigation_keyboard(current_index, len(riddles), riddle['id'], riddle['completed'])
     )
     await callback.answer()
 
 @router.callback_query(F.data == "back_to_riddles_menu")
-async def back_to_riddles_menu(callback: CallbackQuery, state: FSMContext):
+async def back_to_riddles_menu(callback: CallbackQuery, state: FSMContext, entitlement: Entitlement):
     """Возвращает в меню загадок"""
     await state.clear()
-    await show_riddles_menu(callback) 
\ No newline at end of file
+    await show_riddles_menu(callback, entitlement) 
\ No newline at end of file
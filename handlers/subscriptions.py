@@ -42,9 +42,8 @@ async def show_subscription_info(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "show_subscriptions")
-async def show_subscription_list(callback: CallbackQuery):
+async def show_subscription_list(callback: CallbackQuery, db: Database):
     """Показывает список доступных подписок"""
-    db = Database()
     subscriptions = await db.get_all_subscriptions()
     
     # Проверяем текущую подписку
@@ -66,9 +65,8 @@ async def show_subscription_list(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "buy_subscription")
-async def show_subscription_plans(callback: CallbackQuery):
+async def show_subscription_plans(callback: CallbackQuery, db: Database):
     """Показывает список доступных подписок"""
-    db = Database()
     subscriptions = await db.get_all_subscriptions()
     
     text = (
@@ -95,10 +93,9 @@ async def show_subscription_plans(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("activate_subscription_"))
-async def activate_subscription(callback: CallbackQuery):
+async def activate_subscription(callback: CallbackQuery, db: Database):
     """Активирует подписку на выбранный тариф"""
     subscription_id = int(callback.data.split("_")[2])
-    db = Database()
     
     # В реальном боте здесь должна быть интеграция с платежной системой
     # Сейчас просто активируем подписку
@@ -127,7 +124,7 @@ async def activate_subscription(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("check_payment_"))
-async def check_payment(callback: CallbackQuery):
+async def check_payment(callback: CallbackQuery, db: Database):
     """Проверяет статус оплаты"""
     subscription_id = int(callback.data.split("_")[2])
     
@@ -136,7 +133,6 @@ async def check_payment(callback: CallbackQuery):
     payment_successful = True  # В реальности здесь будет проверка статуса
     
     if payment_successful:
-        db = Database()
         if await db.add_subscription(callback.from_user.id, subscription_id):
             await callback.message.edit_text(
                 "🎉 Поздравляем! Подписка успешно активирована!\n\n"
@@ -162,9 +158,8 @@ async def back_to_subscriptions(callback: CallbackQuery):
     await show_subscriptions_menu(callback)
 
 @router.callback_query(F.data == "subscription")
-async def show_subscription_info(callback: CallbackQuery):
+async def show_subscription_info(callback: CallbackQuery, db: Database):
     """Показывает информацию о подписке"""
-    db = Database()
     subscription = await db.get_user_subscription(callback.from_user.id)
     
     if subscription:
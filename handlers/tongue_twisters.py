@@ -1,7 +1,9 @@
+from typing import List, Optional
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 from aiogram.fsm.context import FSMContext
 from database.database import Database
+from database.entitlements import Entitlement
 from keyboards.tongue_twisters import TongueTwistersKeyboard
 from keyboards.main_menu import MainMenuKeyboard
 import logging
@@ -16,13 +18,16 @@ MOTIVATIONAL_MESSAGES = [
     "С каждой попыткой ты становишься лучше! 🎯"
 ]
 
+def find_twister(twisters: List[dict], twister_id: int) -> Optional[int]:
+    """Находит номер скороговорки в сегодняшнем наборе пользователя"""
+    return next((index for index, twister in enumerate(twisters) if twister['id'] == twister_id), None)
+
 @router.callback_query(F.data == "tongue_twisters")
-async def show_tongue_twisters_menu(callback: CallbackQuery):
+async def show_tongue_twisters_menu(callback: CallbackQuery, entitlement: Entitlement):
     """Показывает меню скороговорок"""
-    db = Database()
     
     # Проверяем доступ к функции
-    has_access = await db.check_feature_access(callback.from_user.id, 'tongue_twisters')
+    has_access = entitlement.allows('tongue_twisters')
     if not has_access:
         await callback.message.edit_text(
             "⭐ Доступ к скороговоркам ограничен!\n\n"
@@ -47,16 +52,16 @@ async def show_tongue_twisters_menu(callback: CallbackQuery):
     await callback.answer()
 
 @router.callback_query(F.data == "start_tongue_twisters")
-async def start_tongue_twisters(callback: CallbackQuery, state: FSMContext):
+async def start_tongue_twisters(callback: CallbackQuery, state: FSMContext, db: Database):
     """Начинает сессию скороговорок"""
-    db = Database()
     twisters, completed_count = await db.get_user_tongue_twisters(callback.from_user.id)
     
-    # Сохраняем скороговорки в состояние
-    await state.update_data(twisters=twisters, current_index=0)
-    
     # Показываем первую скороговорку
     twister = twisters[0]
+    
+    # В состоянии храним только id скороговорки: сама скороговорка берется из справочника
+    await state.update_data(twister_id=twister['id'])
+    
     await callback.message.edit_text(
         f"Скороговорка {1}/3:\n\n"
         f"{twister['text']}\n\n"
@@ -66,21 +71,24 @@ async def start_tongue_twisters(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.callback_query(F.data.startswith(("prev_twister_", "next_twister_")))
-async def navigate_twisters(callback: CallbackQuery, state: FSMContext):
+async def navigate_twisters(callback: CallbackQuery, state: FSMContext, db: Database):
     """Навигация между скороговорками"""
     try:
-        # Получаем направление и текущий индекс
+        # Получаем направление и текущую скороговорку
         direction = "prev" if callback.data.startswith("prev") else "next"
-        current_index = int(callback.data.split("_")[2])
+        twister_id = int(callback.data.split("_")[2])
         
-        # Получаем данные из состояния
-        data = await state.get_data()
-        twisters = data.get('twisters', [])
+        twisters, _ = await db.get_user_tongue_twisters(callback.from_user.id)
         
         if not twisters:
             await callback.message.answer("Ошибка: скороговорки не найдены")
             return
         
+        current_index = find_twister(twisters, twister_id)
+        if current_index is None:
+            await callback.answer("Эта скороговорка уже недоступна. Начни заново!", show_alert=True)
+            return
+        
         # Вычисляем новый индекс
         new_index = current_index - 1 if direction == "prev" else current_index + 1
         
@@ -89,11 +97,11 @@ async def navigate_twisters(callback: CallbackQuery, state: FSMContext):
             await callback.answer("Больше скороговорок нет!")
             return
         
-        # Обновляем индекс в состоянии
-        await state.update_data(current_index=new_index)
-        
         # Получаем статус выполнения из списка скороговорок
         current_twister = twisters[new_index]
+        
+        # Обновляем скороговорку в состоянии
+        await state.update_data(twister_id=current_twister['id'])
         is_completed = current_twister['completed']
         
         # Формируем сообщение
@@ -122,23 +130,19 @@ async def navigate_twisters(callback: CallbackQuery, state: FSMContext):
         await callback.answer()
 
 @router.callback_query(F.data.startswith("complete_twister_"))
-async def complete_twister(callback: CallbackQuery, state: FSMContext):
+async def complete_twister(callback: CallbackQuery, state: FSMContext, db: Database):
     """Отмечает скороговорку как выполненную"""
     twister_id = int(callback.data.split("_")[2])
-    db = Database()
     
     # Отмечаем скороговорку как выполненную
-    success = await db.complete_tongue_twister(callback.from_user.id, twister_id)
-    if success:
-        # Проверяем количество выполненных скороговорок
-        twisters, completed_count = await db.get_user_tongue_twisters(callback.from_user.id)
+    awards = await db.complete_tongue_twister(callback.from_user.id, twister_id)
+    # Получаем обновленный список скороговорок
+    twisters, _ = await db.get_user_tongue_twisters(callback.from_user.id)
+    current_index = find_twister(twisters, twister_id)
+    if awards is not None and current_index is not None:
+        await state.update_data(twister_id=twister_id)
         
-        # Обновляем данные в состоянии
-        data = await state.get_data()
-        current_index = data.get('current_index', 0)
-        await state.update_data(twisters=twisters)
-        
-        if completed_count == 3:
+        if 8 in awards:  # Все 3 скороговорки выполнены
             # Получаем супер-приз (токен с id=8)
             super_token = await db.get_token_by_id(8)
             text = (
@@ -174,18 +178,20 @@ async def complete_twister(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("skip_twister_"))
-async def skip_twister(callback: CallbackQuery, state: FSMContext):
+async def skip_twister(callback: CallbackQuery, state: FSMContext, db: Database):
     """Пропускает текущую скороговорку"""
     import random
     
     # Получаем мотивирующее сообщение
     message = random.choice(MOTIVATIONAL_MESSAGES)
     
-    # Получаем данные из состояния
-    data = await state.get_data()
-    twisters = data.get('twisters', [])
-    current_index = data.get('current_index', 0)
+    twisters, _ = await db.get_user_tongue_twisters(callback.from_user.id)
+    current_index = find_twister(twisters, int(callback.data.split("_")[2]))
+    if current_index is None:
+        await callback.answer("Эта скороговорка уже недоступна. Начни заново!", show_alert=True)
+        return
     current_twister = twisters[current_index]
+    await state.update_data(twister_id=current_twister['id'])
     
     await callback.message.edit_text(
         f"{message}\n\n"
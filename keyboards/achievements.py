@@ -1,10 +1,12 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from keyboards.factory import static_keyboard
 
 class AchievementsKeyboard:
     """Класс для создания клавиатур раздела достижений"""
     
     @staticmethod
+    @static_keyboard
     def get_main_keyboard() -> InlineKeyboardMarkup:
         """Создает основную клавиатуру раздела достижений"""
         kb = InlineKeyboardBuilder()
@@ -21,6 +23,7 @@ class AchievementsKeyboard:
         return kb.as_markup()
     
     @staticmethod
+    @static_keyboard
     def get_back_button() -> InlineKeyboardMarkup:
         """Создает клавиатуру с кнопкой возврата"""
         kb = InlineKeyboardBuilder()
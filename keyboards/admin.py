@@ -1,10 +1,33 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from database.pagination import Page
+from keyboards.factory import cached_keyboard, static_keyboard
+
+
+def _page_nav(prefix: str, sep: str, page_number: int, page: Page) -> list:
+    """Кнопки соседних страниц: номер страницы для подписи, направление и курсор (id крайнего элемента)"""
+    buttons = []
+    if page.has_prev:
+        buttons.append(("⬅️", f"{prefix}{page_number - 1}{sep}p{sep}{page.first_id}"))
+    if page.has_next:
+        buttons.append(("➡️", f"{prefix}{page_number + 1}{sep}n{sep}{page.last_id}"))
+    return buttons
+
+
+# Разделы выдачи поиска /search
+SEARCH_SECTIONS = {
+    "users": "👥 Пользователи",
+    "riddles": "🤔 Загадки",
+    "daily": "📝 Задания на день",
+    "twisters": "👅 Скороговорки",
+    "exercises": "🗣 Упражнения",
+    "creativity": "🎨 Мастер-классы",
+}
 
-ITEMS_PER_PAGE = 5
 
 class AdminKeyboard:
     @staticmethod
+    @static_keyboard
     def get_menu_keyboard() -> InlineKeyboardMarkup:
         """Возвращает клавиатуру главного меню админ-панели"""
         builder = InlineKeyboardBuilder()
@@ -24,23 +47,19 @@ class AdminKeyboard:
         return builder.as_markup()
     
     @staticmethod
-    def get_users_keyboard(users: list, page: int, total_pages: int) -> InlineKeyboardMarkup:
+    def get_users_keyboard(users: Page, page: int) -> InlineKeyboardMarkup:
         """Возвращает клавиатуру со списком пользователей"""
         builder = InlineKeyboardBuilder()
         
         # Добавляем кнопки пользователей
-        for user in users:
+        for user in users.items:
             builder.button(
                 text=f"{user['full_name']} (@{user['username']})",
                 callback_data=f"user_{user['id']}"
             )
         
         # Добавляем кнопки навигации
-        nav_buttons = []
-        if page > 1:
-            nav_buttons.append(("⬅️", f"users_page_{page-1}"))
-        if page < total_pages:
-            nav_buttons.append(("➡️", f"users_page_{page+1}"))
+        nav_buttons = _page_nav("users_page_", "_", page, users)
         
         for text, callback_data in nav_buttons:
             builder.button(text=text, callback_data=callback_data)
@@ -48,7 +67,7 @@ class AdminKeyboard:
         builder.button(text="↩️ Назад", callback_data="back_to_admin")
         
         # Настраиваем расположение кнопок
-        if len(users) > 0:
+        if len(users.items) > 0:
             if len(nav_buttons) > 0:
                 builder.adjust(1, len(nav_buttons), 1)
             else:
@@ -59,7 +78,7 @@ class AdminKeyboard:
         return builder.as_markup()
     
     @staticmethod
-    def get_subscriptions_keyboard(subscriptions: list, page: int, total_pages: int) -> InlineKeyboardMarkup:
+    def get_subscriptions_keyboard(subscriptions: Page, page: int) -> InlineKeyboardMarkup:
         """Возвращает клавиатуру со списком подписок"""
         builder = InlineKeyboardBuilder()
         
@@ -67,18 +86,14 @@ class AdminKeyboard:
         builder.button(text="⚙️ Настройка тарифов", callback_data="manage_tariffs")
         
         # Добавляем кнопки подписок
-        for sub in subscriptions:
+        for sub in subscriptions.items:
             builder.button(
                 text=f"{sub['user_name']} - {sub['tariff_name']} до {sub['end_date']}",
                 callback_data=f"subscription_{sub['id']}"
             )
         
         # Добавляем кнопки навигации
-        nav_buttons = []
-        if page > 1:
-            nav_buttons.append(("⬅️", f"subs_page_{page-1}"))
-        if page < total_pages:
-            nav_buttons.append(("➡️", f"subs_page_{page+1}"))
+        nav_buttons = _page_nav("subs_page_", "_", page, subscriptions)
         
         for text, callback_data in nav_buttons:
             builder.button(text=text, callback_data=callback_data)
@@ -105,6 +120,7 @@ class AdminKeyboard:
         return builder.as_markup()
     
     @staticmethod
+    @static_keyboard
     def get_content_keyboard() -> InlineKeyboardMarkup:
         """Возвращает клавиатуру для выбора типа контента"""
         builder = InlineKeyboardBuilder()
@@ -130,15 +146,11 @@ class AdminKeyboard:
         return builder.as_markup()
     
     @staticmethod
-    def get_content_list_keyboard(items: list, page: int, total_pages: int, content_type: str) -> InlineKeyboardMarkup:
+    def get_content_list_keyboard(items: Page, page: int, content_type: str) -> InlineKeyboardMarkup:
         """Возвращает клавиатуру со списком контента"""
         builder = InlineKeyboardBuilder()
         
-        start_idx = (page - 1) * ITEMS_PER_PAGE
-        end_idx = start_idx + ITEMS_PER_PAGE
-        current_items = items[start_idx:end_idx]
-        
-        for item in current_items:
+        for item in items.items:
             if content_type == "daily":
                 text = item.get("task_text", "") or item.get("text", "")
             elif content_type == "riddles":
@@ -172,24 +184,15 @@ class AdminKeyboard:
         builder.adjust(2)  # Располагаем кнопки в два столбца
 
         # Добавляем навигационные кнопки
-        nav_buttons = []
-        if page > 1:
-            nav_buttons.append(InlineKeyboardButton(
-                text="⬅️",
-                callback_data=f"show_content:{content_type}:{page-1}"
-            ))
-        
-        nav_buttons.append(InlineKeyboardButton(
-            text=f"📄 {page}/{total_pages}",
+        nav_buttons = [
+            InlineKeyboardButton(text=text, callback_data=callback_data)
+            for text, callback_data in _page_nav(f"show_content:{content_type}:", ":", page, items)
+        ]
+        nav_buttons.insert(1 if items.has_prev else 0, InlineKeyboardButton(
+            text=f"📄 {page}/{items.total_pages}",
             callback_data="ignore"
         ))
         
-        if page < total_pages:
-            nav_buttons.append(InlineKeyboardButton(
-                text="➡️",
-                callback_data=f"show_content:{content_type}:{page+1}"
-            ))
-        
         builder.row(*nav_buttons)
         
         # Добавляем кнопку добавления нового контента
@@ -224,6 +227,7 @@ class AdminKeyboard:
         return builder.as_markup()
 
     @staticmethod
+    @static_keyboard
     def get_cancel_keyboard() -> InlineKeyboardMarkup:
         """Возвращает клавиатуру с кнопкой отмены"""
         builder = InlineKeyboardBuilder()
@@ -231,23 +235,19 @@ class AdminKeyboard:
         return builder.as_markup()
 
     @staticmethod
-    def get_tokens_keyboard(tokens: list, page: int, total_pages: int) -> InlineKeyboardMarkup:
+    def get_tokens_keyboard(tokens: Page, page: int) -> InlineKeyboardMarkup:
         """Возвращает клавиатуру со списком токенов"""
         builder = InlineKeyboardBuilder()
         
         # Добавляем кнопки токенов
-        for token in tokens:
+        for token in tokens.items:
             builder.button(
                 text=f"{token['emoji']} {token['name']}",
                 callback_data=f"token_{token['id']}"
             )
         
         # Добавляем кнопки навигации
-        nav_buttons = []
-        if page > 1:
-            nav_buttons.append(("⬅️", f"tokens_page_{page-1}"))
-        if page < total_pages:
-            nav_buttons.append(("➡️", f"tokens_page_{page+1}"))
+        nav_buttons = _page_nav("tokens_page_", "_", page, tokens)
         
         for text, callback_data in nav_buttons:
             builder.button(text=text, callback_data=callback_data)
@@ -255,4 +255,64 @@ class AdminKeyboard:
         builder.button(text="↩️ Назад", callback_data="back_to_admin")
         
         builder.adjust(1, len(nav_buttons), 1)
-        return builder.as_markup() 
\ No newline at end of file
+        return builder.as_markup()
+
+    @staticmethod
+    def get_search_sections_keyboard(counts: dict) -> InlineKeyboardMarkup:
+        """Возвращает клавиатуру с разделами, в которых есть совпадения поиска"""
+        builder = InlineKeyboardBuilder()
+        
+        for section, title in SEARCH_SECTIONS.items():
+            if counts.get(section):
+                builder.button(text=f"{title} ({counts[section]})", callback_data=f"search:{section}:1")
+        
+        builder.button(text="↩️ Назад", callback_data="back_to_admin")
+        
+        builder.adjust(1)
+        return builder.as_markup()
+
+    @staticmethod
+    def get_search_results_keyboard(section: str, results: Page, page: int) -> InlineKeyboardMarkup:
+        """Возвращает клавиатуру со страницей результатов поиска в разделе"""
+        builder = InlineKeyboardBuilder()
+        
+        for item in results.items:
+            if section == "users":
+                text = f"{item['full_name']} (@{item['username']})"
+                callback_data = f"user_{item['id']}"
+            else:
+                text = item['text']
+                content_type = item.get('content_type', section)
+                callback_data = f"view_content:{content_type}:{item['id']}"
+            
+            if len(text) > 40:
+                text = text[:37] + "..."
+            builder.button(text=text, callback_data=callback_data)
+        
+        nav_buttons = _page_nav(f"search:{section}:", ":", page, results)
+        
+        for text, callback_data in nav_buttons:
+            builder.button(text=text, callback_data=callback_data)
+        
+        builder.button(text="↩️ К разделам", callback_data="search_sections")
+        
+        builder.adjust(*([1] * len(results.items)), *([len(nav_buttons)] if nav_buttons else []), 1)
+        return builder.as_markup()
+
+    @staticmethod
+    @static_keyboard
+    def get_broadcast_confirm_keyboard() -> InlineKeyboardMarkup:
+        """Возвращает клавиатуру подтверждения рассылки"""
+        builder = InlineKeyboardBuilder()
+        builder.button(text="✅ Отправить всем", callback_data="broadcast_confirm")
+        builder.button(text="❌ Отмена", callback_data="cancel_action")
+        builder.adjust(2)
+        return builder.as_markup()
+
+    @staticmethod
+    @cached_keyboard()
+    def get_broadcast_progress_keyboard(broadcast_id: int) -> InlineKeyboardMarkup:
+        """Возвращает клавиатуру с кнопкой остановки рассылки"""
+        builder = InlineKeyboardBuilder()
+        builder.button(text="⏹ Остановить", callback_data=f"broadcast_stop:{broadcast_id}")
+        return builder.as_markup()
@@ -1,8 +1,10 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from keyboards.factory import cached_keyboard, static_keyboard
 
 class CreativityKeyboard:
     @staticmethod
+    @static_keyboard
     def get_menu_keyboard() -> InlineKeyboardMarkup:
         """Возвращает клавиатуру главного меню раздела творчества"""
         builder = InlineKeyboardBuilder()
@@ -16,6 +18,7 @@ class CreativityKeyboard:
         return builder.as_markup()
 
     @staticmethod
+    @static_keyboard
     def get_section_keyboard() -> InlineKeyboardMarkup:
         """Возвращает клавиатуру для конкретного раздела"""
         builder = InlineKeyboardBuilder()
@@ -26,6 +29,7 @@ class CreativityKeyboard:
         return builder.as_markup()
 
     @staticmethod
+    @cached_keyboard()
     def get_masterclass_keyboard(video_id: int, show_completion: bool = True) -> InlineKeyboardMarkup:
         """Возвращает клавиатуру для мастер-класса"""
         builder = InlineKeyboardBuilder()
@@ -52,6 +56,7 @@ class CreativityKeyboard:
         return builder.as_markup()
 
     @staticmethod
+    @static_keyboard
     def get_photo_cancel_keyboard() -> InlineKeyboardMarkup:
         """Возвращает клавиатуру для отмены отправки фото"""
         builder = InlineKeyboardBuilder()
@@ -1,10 +1,12 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from keyboards.factory import cached_keyboard, static_keyboard
 
 class DailyTasksKeyboard:
     """Класс для создания клавиатур раздела ежедневных заданий"""
     
     @staticmethod
+    @static_keyboard
     def get_main_keyboard() -> InlineKeyboardMarkup:
         """Создает основную клавиатуру раздела"""
         kb = InlineKeyboardBuilder()
@@ -21,6 +23,7 @@ class DailyTasksKeyboard:
         return kb.as_markup()
     
     @staticmethod
+    @cached_keyboard()
     def get_task_keyboard(task_id: int) -> InlineKeyboardMarkup:
         """Создает клавиатуру для конкретного задания"""
         kb = InlineKeyboardBuilder()
@@ -38,6 +41,7 @@ class DailyTasksKeyboard:
         return kb.as_markup()
     
     @staticmethod
+    @static_keyboard
     def get_back_button() -> InlineKeyboardMarkup:
         """Создает клавиатуру только с кнопкой "Назад" """
         kb = InlineKeyboardBuilder()
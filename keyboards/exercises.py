@@ -1,10 +1,12 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from keyboards.factory import cached_keyboard, static_keyboard
 
 class ExercisesKeyboard:
     """Класс для создания клавиатур разделов упражнений"""
     
     @staticmethod
+    @static_keyboard
     def get_menu_keyboard() -> InlineKeyboardMarkup:
         """Возвращает клавиатуру меню упражнений"""
         builder = InlineKeyboardBuilder()
@@ -13,6 +15,7 @@ class ExercisesKeyboard:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard()
     def get_exercise_keyboard(video_id: int, show_completion: bool = True) -> InlineKeyboardMarkup:
         """Возвращает клавиатуру для видео упражнения"""
         builder = InlineKeyboardBuilder()
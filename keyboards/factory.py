@@ -0,0 +1,40 @@
+from functools import lru_cache, wraps
+from typing import Callable
+
+from aiogram.types import InlineKeyboardMarkup
+
+# Сколько вариантов одной клавиатуры с параметрами держать в памяти
+KEYBOARD_CACHE_SIZE = 512
+
+
+def static_keyboard(build: Callable[[], InlineKeyboardMarkup]) -> Callable[[], InlineKeyboardMarkup]:
+    """Строит неизменную клавиатуру один раз при импорте и дальше отдает готовую разметку"""
+    markup = build()
+
+    @wraps(build)
+    def get() -> InlineKeyboardMarkup:
+        return markup
+
+    return get
+
+
+def cached_keyboard(maxsize: int = KEYBOARD_CACHE_SIZE):
+    """Запоминает клавиатуры с параметрами в LRU-кэше на maxsize вариантов.
+
+    Аргументы-списки (например, отметки решенных ребусов) приводятся к кортежам,
+    чтобы их можно было использовать как ключ.
+    """
+    def decorator(build: Callable[..., InlineKeyboardMarkup]) -> Callable[..., InlineKeyboardMarkup]:
+        cached = lru_cache(maxsize=maxsize)(build)
+
+        @wraps(build)
+        def get(*args, **kwargs) -> InlineKeyboardMarkup:
+            args = tuple(tuple(arg) if isinstance(arg, list) else arg for arg in args)
+            kwargs = {name: tuple(arg) if isinstance(arg, list) else arg for name, arg in kwargs.items()}
+            return cached(*args, **kwargs)
+
+        get.cache_info = cached.cache_info
+        get.cache_clear = cached.cache_clear
+        return get
+
+    return decorator
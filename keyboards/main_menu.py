@@ -1,6 +1,7 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from config import config
+from keyboards.factory import cached_keyboard
 
 class MainMenuKeyboard:
     """Класс для создания клавиатуры главного меню"""
@@ -8,11 +9,17 @@ class MainMenuKeyboard:
     @staticmethod
     def get_keyboard(user_id: int = None) -> InlineKeyboardMarkup:
         """
-        Создает и возвращает inline-клавиатуру главного меню
+        Возвращает inline-клавиатуру главного меню
         
         Args:
             user_id (int): ID пользователя для проверки прав администратора
         """
+        return MainMenuKeyboard._build(user_id in config.ADMIN_IDS)
+
+    @staticmethod
+    @cached_keyboard(maxsize=2)
+    def _build(is_admin: bool) -> InlineKeyboardMarkup:
+        """Создает клавиатуру главного меню (всего два варианта: для админа и для остальных)"""
         builder = InlineKeyboardBuilder()
         
         # Основные разделы
@@ -32,7 +39,7 @@ class MainMenuKeyboard:
         builder.button(text="👩‍👦 Для мам", callback_data="for_parents")
         
         # Админ-панель (если пользователь админ)
-        if user_id in config.ADMIN_IDS:
+        if is_admin:
             builder.button(text="⚙️ Админ-панель", callback_data="admin_panel")
         
         # Устанавливаем по одной кнопке в ряд, кроме упражнений
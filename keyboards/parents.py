@@ -1,8 +1,10 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from keyboards.factory import cached_keyboard, static_keyboard
 
 class ParentsKeyboard:
     @staticmethod
+    @static_keyboard
     def get_menu_keyboard() -> InlineKeyboardMarkup:
         """Возвращает клавиатуру главного меню раздела для мам"""
         builder = InlineKeyboardBuilder()
@@ -15,6 +17,7 @@ class ParentsKeyboard:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard()
     def get_subscription_keyboard(has_subscription: bool) -> InlineKeyboardMarkup:
         """Возвращает клавиатуру для раздела подписки"""
         builder = InlineKeyboardBuilder()
@@ -1,8 +1,10 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from keyboards.factory import cached_keyboard, static_keyboard
 
 class PuzzlesKeyboard:
     @staticmethod
+    @static_keyboard
     def get_menu_keyboard() -> InlineKeyboardMarkup:
         """Создает клавиатуру для меню ребусов"""
         kb = InlineKeyboardBuilder()
@@ -12,6 +14,7 @@ class PuzzlesKeyboard:
         return kb.as_markup()
 
     @staticmethod
+    @cached_keyboard()
     def get_puzzle_keyboard(puzzle_id: int, solved_status: list[bool]) -> InlineKeyboardMarkup:
         """Создает клавиатуру для конкретного ребуса"""
         kb = InlineKeyboardBuilder()
@@ -34,6 +37,7 @@ class PuzzlesKeyboard:
         return kb.as_markup()
 
     @staticmethod
+    @static_keyboard
     def get_next_puzzle_keyboard() -> InlineKeyboardMarkup:
         """Создает клавиатуру для перехода к следующему ребусу"""
         kb = InlineKeyboardBuilder()
@@ -43,6 +47,7 @@ class PuzzlesKeyboard:
         return kb.as_markup()
 
     @staticmethod
+    @cached_keyboard()
     def get_cancel_keyboard(puzzle_id: int, rebus_number: int) -> InlineKeyboardMarkup:
         """Создает клавиатуру с кнопкой отмены"""
         kb = InlineKeyboardBuilder()
@@ -1,8 +1,10 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from keyboards.factory import cached_keyboard, static_keyboard
 
 class SubscriptionsKeyboard:
     @staticmethod
+    @static_keyboard
     def get_menu_keyboard() -> InlineKeyboardMarkup:
         """Возвращает клавиатуру меню подписок"""
         builder = InlineKeyboardBuilder()
@@ -15,6 +17,7 @@ class SubscriptionsKeyboard:
         return builder.as_markup()
     
     @staticmethod
+    @cached_keyboard()
     def get_subscription_keyboard(has_subscription: bool) -> InlineKeyboardMarkup:
         """Возвращает клавиатуру для раздела подписки"""
         builder = InlineKeyboardBuilder()
@@ -1,10 +1,12 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from keyboards.factory import cached_keyboard, static_keyboard
 
 class TongueTwistersKeyboard:
     """Класс для создания клавиатур раздела скороговорок"""
     
     @staticmethod
+    @static_keyboard
     def get_menu_keyboard() -> InlineKeyboardMarkup:
         """Создает основную клавиатуру раздела"""
         kb = InlineKeyboardBuilder()
@@ -21,6 +23,7 @@ class TongueTwistersKeyboard:
         return kb.as_markup()
     
     @staticmethod
+    @cached_keyboard()
     def get_navigation_keyboard(current_index: int, total_twisters: int, twister_id: int, is_completed: bool = False) -> InlineKeyboardMarkup:
         """Создает клавиатуру навигации по скороговоркам"""
         kb = InlineKeyboardBuilder()
@@ -39,9 +42,9 @@ class TongueTwistersKeyboard:
         # Кнопки навигации
         buttons = []
         if current_index > 0:
-            buttons.append(("⬅️ Предыдущая", f"prev_twister_{current_index}"))
+            buttons.append(("⬅️ Предыдущая", f"prev_twister_{twister_id}"))
         if current_index < total_twisters - 1:
-            buttons.append(("Следующая ➡️", f"next_twister_{current_index}"))
+            buttons.append(("Следующая ➡️", f"next_twister_{twister_id}"))
             
         for text, callback_data in buttons:
             kb.add(InlineKeyboardButton(text=text, callback_data=callback_data))
@@ -62,6 +65,7 @@ class TongueTwistersKeyboard:
         return kb.as_markup()
     
     @staticmethod
+    @static_keyboard
     def get_back_button() -> InlineKeyboardMarkup:
         """Создает клавиатуру только с кнопкой "Назад" """
         kb = InlineKeyboardBuilder()
@@ -1,12 +1,19 @@
 import asyncio
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from handlers import (
     common, achievements, daily_tasks,
     riddles, exercises, puzzles, tongue_twisters,
     creativity, subscriptions, parents, admin
 )
 from database.database import Database
+from database.fsm_storage import SQLiteStorage
+from middlewares.database import DatabaseMiddleware
+from middlewares.fsm import FSMFlushMiddleware
+from middlewares.entitlement import EntitlementMiddleware
+from services.broadcast import Broadcaster
+from services.daily_assignments import DailyAssignmentJob
+from services.http_client import create_bot_session, http_client
+from config import config
 from aiogram.enums import ParseMode
 from os import getenv
 from dotenv import load_dotenv
@@ -19,8 +26,44 @@ logger = get_logger(__name__)
 load_dotenv()
 
 # Инициализируем бота
-bot = Bot(token=getenv("BOT_TOKEN"), parse_mode=ParseMode.HTML)
-dp = Dispatcher(storage=MemoryStorage())
+bot = Bot(token=getenv("BOT_TOKEN"), parse_mode=ParseMode.HTML, session=create_bot_session())
+
+# Единственный экземпляр базы данных на весь процесс
+db = Database()
+
+# Состояния диалогов хранятся в той же базе и переживают перезапуск
+fsm_storage = SQLiteStorage(
+    db,
+    ttl_seconds=config.FSM_TTL_SECONDS,
+    sweep_interval=config.FSM_SWEEP_INTERVAL_SECONDS,
+)
+dp = Dispatcher(storage=fsm_storage)
+dp.update.outer_middleware(DatabaseMiddleware(db))
+dp.update.outer_middleware(FSMFlushMiddleware(fsm_storage))
+
+# Ночная подготовка ежедневного контента
+daily_assignments = DailyAssignmentJob(
+    db,
+    hour=config.DAILY_ASSIGNMENT_HOUR,
+    active_days=config.DAILY_ASSIGNMENT_ACTIVE_DAYS,
+    chunk_size=config.DAILY_ASSIGNMENT_CHUNK_SIZE,
+)
+
+# Рассылки администратора идут в фоне и передаются обработчикам в аргументе broadcaster
+broadcaster = Broadcaster(
+    bot,
+    db,
+    rate=config.BROADCAST_RATE,
+    concurrency=config.BROADCAST_CONCURRENCY,
+    batch_size=config.BROADCAST_BATCH_SIZE,
+    progress_interval=config.BROADCAST_PROGRESS_SECONDS,
+)
+dp["broadcaster"] = broadcaster
+
+# Права доступа определяются один раз на событие и только в разделах с подпиской
+for gated in (daily_tasks, riddles, exercises, puzzles, tongue_twisters, creativity):
+    gated.router.callback_query.middleware(EntitlementMiddleware())
+    gated.router.message.middleware(EntitlementMiddleware())
 
 # Регистрируем все роутеры
 dp.include_router(common.router)
@@ -38,15 +81,40 @@ dp.include_router(admin.router)
 async def main():
     # Инициализируем базу данных
     logger.info("Инициализация базы данных...")
-    db = Database()
-    await db.create_tables()
-    await db.initialize_videos()
-    await db.initialize_subscriptions()  # Инициализируем базовые подписки
-    logger.info("База данных инициализирована успешно")
-    
-    # Запускаем бота
-    logger.info("Запуск бота...")
-    await dp.start_polling(bot)
+    await db.connect()  # Открываем пул соединений на всё время работы бота
+    try:
+        settings = await db.get_sqlite_settings()
+        logger.info("Профиль SQLite: " + ", ".join(f"{name}={value}" for name, value in settings.items()))
+        version = await db.migrate()
+        logger.info(f"Версия схемы базы данных: {version}")
+        await db.initialize_videos()
+        await db.initialize_subscriptions()  # Инициализируем базовые подписки
+        catalog = await db.catalog.reload()  # Загружаем справочники в память
+        logger.info(f"Справочники загружены, версия {catalog.version}")
+        logger.info("База данных инициализирована успешно")
+        
+        fsm_storage.start()  # Брошенные сессии диалогов удаляются по истечении срока
+
+        if db.daily_content_mode == 'assigned':
+            daily_assignments.start()  # В остальных режимах назначения не хранятся
+
+        resumed = await broadcaster.resume()  # Рассылки, прерванные перезапуском, продолжаются с курсора
+        if resumed:
+            logger.info(f"Продолжено рассылок: {resumed}")
+
+        # Запускаем бота
+        logger.info("Запуск бота...")
+        await dp.start_polling(bot)
+    finally:
+        await daily_assignments.close()
+        await broadcaster.close()  # Незавершенные рассылки продолжатся при следующем запуске
+        await http_client.close()
+        try:
+            await fsm_storage.close()  # Сохраняем состояния диалогов до закрытия базы
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении состояний FSM: {e}")
+        await db.close()
+        logger.info("Соединения с базой данных закрыты")
 
 if __name__ == "__main__":
     try:
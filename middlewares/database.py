@@ -0,0 +1,22 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from database.database import Database
+
+
+class DatabaseMiddleware(BaseMiddleware):
+    """Передает обработчикам общий экземпляр Database в аргументе db"""
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        data["db"] = self.db
+        return await handler(event, data)
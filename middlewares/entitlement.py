@@ -0,0 +1,22 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from database.database import Database
+
+
+class EntitlementMiddleware(BaseMiddleware):
+    """Определяет права пользователя один раз на событие и передает их обработчикам в аргументе entitlement"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: User = data.get("event_from_user")
+        db: Database = data["db"]
+        if user is not None:
+            data["entitlement"] = await db.get_entitlement(user.id)
+        return await handler(event, data)
@@ -0,0 +1,30 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from database.fsm_storage import SQLiteStorage
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class FSMFlushMiddleware(BaseMiddleware):
+    """Записывает изменения состояний FSM в базу после обработки обновления"""
+
+    def __init__(self, storage: SQLiteStorage):
+        self.storage = storage
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            try:
+                await self.storage.flush()
+            except Exception as e:
+                logger.error(f"Ошибка при сохранении состояний FSM: {e}")
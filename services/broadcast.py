@@ -0,0 +1,222 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Set
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from database.database import Database
+from keyboards.admin import AdminKeyboard
+from logger import get_logger
+from services.token_bucket import TokenBucket
+
+logger = get_logger(__name__)
+
+SENT = "sent"
+FAILED = "failed"
+BLOCKED = "blocked"
+
+STATUS_TITLES = {
+    "running": "⏳ Идет рассылка",
+    "done": "✅ Рассылка завершена",
+    "cancelled": "⏹ Рассылка остановлена",
+    "failed": "❌ Рассылка прервана ошибкой",
+}
+
+
+@dataclass
+class _Progress:
+    """Состояние рассылки в памяти на время ее выполнения в этом процессе"""
+    job: Dict
+    cursor: int
+    sent: int
+    failed: int
+    blocked: int
+    started_at: float
+    started_count: int
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.failed + self.blocked
+
+
+class Broadcaster:
+    """Рассылает сообщение администратора всем пользователям в фоне.
+
+    Сообщение копируется (copy_message) каждому получателю с частотой не выше rate в секунду;
+    на 429 отправка целиком приостанавливается на retry_after. Получатели идут по возрастанию
+    users.id пачками по batch_size, после каждой пачки курсор и счетчики сохраняются. Остановка
+    и выключение бота дожидаются конца текущей пачки, а после перезапуска рассылка продолжается
+    с курсора (при аварийном завершении повторно может уйти не больше одной пачки).
+    Ход рассылки раз в progress_interval секунд обновляется в сообщении администратора.
+    """
+
+    def __init__(self, bot: Bot, db: Database, rate: float = 25, concurrency: int = 10,
+                 batch_size: int = 50, progress_interval: float = 10, close_timeout: float = 30,
+                 clock: Callable[[], float] = time.monotonic):
+        self.bot = bot
+        self.db = db
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self.close_timeout = close_timeout
+        # Без запаса разрешений: сообщения идут равномерно, без всплеска в начале рассылки
+        self.bucket = TokenBucket(rate, capacity=1, clock=clock)
+        self._clock = clock
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._cancelled: Set[int] = set()
+        self._closing = False
+
+    async def start(self, admin_id: int, from_chat_id: int, message_id: int, progress_message_id: int) -> int:
+        """Создает задание рассылки и запускает его, возвращает id задания"""
+        total = await self.db.count_users()
+        job_id = await self.db.create_broadcast(admin_id, from_chat_id, message_id, progress_message_id, total)
+        logger.info(f"Рассылка #{job_id} запущена администратором {admin_id}, получателей: {total}")
+        self._launch(job_id)
+        return job_id
+
+    async def resume(self) -> int:
+        """Продолжает рассылки, прерванные перезапуском бота; возвращает их количество"""
+        jobs = await self.db.get_running_broadcasts()
+        for job in jobs:
+            logger.info(f"Рассылка #{job['id']} продолжается с пользователя id > {job['cursor']}")
+            self._launch(job['id'])
+        return len(jobs)
+
+    async def cancel(self, job_id: int) -> bool:
+        """Останавливает рассылку; уже отправленные сообщения остаются у получателей"""
+        job = await self.db.get_broadcast(job_id)
+        if job is None or job['status'] != 'running':
+            return False
+        await self.db.finish_broadcast(job_id, 'cancelled')
+        self._cancelled.add(job_id)  # Задание заметит остановку после текущей пачки
+        return True
+
+    async def close(self) -> None:
+        """Останавливает рассылки при выключении бота после текущей пачки; они продолжатся после запуска"""
+        self._closing = True
+        tasks = list(self._tasks.values())
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=self.close_timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _launch(self, job_id: int) -> None:
+        if job_id not in self._tasks:
+            task = asyncio.create_task(self._run(job_id))
+            self._tasks[job_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    def _should_stop(self, job_id: int) -> bool:
+        return self._closing or job_id in self._cancelled
+
+    async def _run(self, job_id: int) -> None:
+        job = await self.db.get_broadcast(job_id)
+        if job is None:
+            return
+        progress = _Progress(
+            job=job,
+            cursor=job['cursor'],
+            sent=job['sent'],
+            failed=job['failed'],
+            blocked=job['blocked'],
+            started_at=self._clock(),
+            started_count=job['sent'] + job['failed'] + job['blocked'],
+        )
+        last_report = self._clock()
+        await self._report(progress, "running")
+        try:
+            while not self._should_stop(job_id):
+                recipients = await self.db.get_broadcast_recipients(progress.cursor, self.batch_size)
+                if not recipients:
+                    break
+                results = await asyncio.gather(*(self._deliver(job, chat_id) for _, chat_id in recipients))
+                progress.sent += results.count(SENT)
+                progress.failed += results.count(FAILED)
+                progress.blocked += results.count(BLOCKED)
+                progress.cursor = recipients[-1][0]
+                await self.db.save_broadcast_progress(
+                    job_id, progress.cursor, progress.sent, progress.failed, progress.blocked
+                )
+                if self._clock() - last_report >= self.progress_interval:
+                    last_report = self._clock()
+                    await self._report(progress, "running")
+        except Exception as e:
+            logger.error(f"Ошибка в рассылке #{job_id}: {e}")
+            await self.db.finish_broadcast(job_id, 'failed')
+            await self._report(progress, "failed")
+            return
+
+        if job_id in self._cancelled:
+            # Остановка администратором уже записана в базу
+            self._cancelled.discard(job_id)
+            logger.info(f"Рассылка #{job_id} остановлена, обработано {progress.processed} из {job['total']}")
+            await self._report(progress, "cancelled")
+            return
+        if self._closing:
+            return  # Задание остается 'running' и продолжится после запуска
+
+        await self.db.finish_broadcast(job_id, 'done')
+        logger.info(
+            f"Рассылка #{job_id} завершена: отправлено {progress.sent}, не доставлено {progress.failed}, "
+            f"заблокировали бота {progress.blocked}"
+        )
+        await self._report(progress, "done")
+
+    async def _deliver(self, job: Dict, chat_id: int) -> str:
+        """Копирует сообщение одному получателю и возвращает итог: sent, failed или blocked"""
+        async with self._semaphore:
+            while True:
+                await self.bucket.acquire()
+                try:
+                    await self.bot.copy_message(
+                        chat_id=chat_id,
+                        from_chat_id=job['from_chat_id'],
+                        message_id=job['message_id']
+                    )
+                    return SENT
+                except TelegramRetryAfter as e:
+                    logger.warning(f"Рассылка #{job['id']}: превышен лимит Telegram, пауза {e.retry_after} с")
+                    self.bucket.pause(e.retry_after)
+                except TelegramForbiddenError:
+                    return BLOCKED  # Пользователь заблокировал бота
+                except TelegramAPIError as e:
+                    logger.warning(f"Рассылка #{job['id']}: не удалось отправить сообщение {chat_id}: {e}")
+                    return FAILED
+
+    async def _report(self, progress: _Progress, status: str) -> None:
+        """Обновляет сообщение о ходе рассылки у администратора"""
+        job = progress.job
+        elapsed = self._clock() - progress.started_at
+        speed = (progress.processed - progress.started_count) / elapsed if elapsed > 0 else 0.0
+        text = (
+            f"{STATUS_TITLES[status]} #{job['id']}\n\n"
+            f"Обработано: {progress.processed} из {job['total']}\n"
+            f"Отправлено: {progress.sent}\n"
+            f"Не доставлено: {progress.failed}\n"
+            f"Заблокировали бота: {progress.blocked}\n"
+            f"Скорость: {speed:.1f} сообщ./с"
+        )
+        reply_markup = AdminKeyboard.get_broadcast_progress_keyboard(job['id']) if status == "running" else None
+        try:
+            await self.bot.edit_message_text(
+                text=text,
+                chat_id=job['admin_id'],
+                message_id=job['progress_message_id'],
+                reply_markup=reply_markup
+            )
+        except TelegramBadRequest:
+            # Сообщение удалено или текст не изменился: отчет отправляем заново, только итоговый
+            if status != "running":
+                await self._send_report(job['admin_id'], text)
+        except TelegramAPIError as e:
+            logger.warning(f"Рассылка #{job['id']}: не удалось обновить отчет: {e}")
+
+    async def _send_report(self, admin_id: int, text: str) -> None:
+        try:
+            await self.bot.send_message(admin_id, text)
+        except TelegramAPIError as e:
+            logger.warning(f"Не удалось отправить отчет о рассылке администратору {admin_id}: {e}")
@@ -0,0 +1,103 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Внешний сервис считается недоступным, вызов отклонен без обращения к нему"""
+
+
+class CircuitBreaker:
+    """Предохранитель для обращений к нестабильному внешнему сервису.
+
+    После failure_threshold неудач подряд (ошибка или превышение бюджета времени)
+    предохранитель размыкается и reset_timeout секунд сразу отклоняет вызовы.
+    Затем пропускает один пробный вызов: успех замыкает цепь, неудача снова ее размыкает.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 60,
+                 latency_budget: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.latency_budget = latency_budget
+        self._clock = clock
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_running = False
+        # Сколько раз предохранитель переходил в каждое состояние
+        self.transitions: Dict[str, int] = {CLOSED: 0, OPEN: 0, HALF_OPEN: 0}
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+        return self._state
+
+    def _set_state(self, state: str) -> None:
+        if state == self._state:
+            return
+        logger.warning(f"Предохранитель {self.name}: {self._state} -> {state}")
+        self._state = state
+        self.transitions[state] += 1
+        if state == OPEN:
+            self._opened_at = self._clock()
+
+    def allow(self) -> bool:
+        """Можно ли сейчас обращаться к сервису (в полуоткрытом состоянии - только одному вызову)"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probe_running:
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+            self._set_state(OPEN)
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Выполняет fn в пределах бюджета времени или сразу бросает CircuitOpenError"""
+        if not self.allow():
+            self.rejected += 1
+            raise CircuitOpenError(self.name)
+        probe = self._state == HALF_OPEN
+        if probe:
+            self._probe_running = True
+        try:
+            result = await asyncio.wait_for(fn(), self.latency_budget)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        finally:
+            if probe:
+                self._probe_running = False
+        self.record_success()
+        return result
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "state": self.state,
+            "failures": self._failures,
+            "rejected": self.rejected,
+            **{f"{state}_count": count for state, count in self.transitions.items()},
+        }
@@ -0,0 +1,61 @@
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from database.database import Database
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class DailyAssignmentJob:
+    """Ночная задача: заранее назначает контент на следующий день недавно активным пользователям.
+
+    Утром пользователи массово открывают задания, и к этому моменту назначения уже
+    лежат в базе, так что запросы пользователей только читают.
+    """
+
+    def __init__(self, db: Database, hour: int = 23, active_days: int = 7, chunk_size: int = 500):
+        self.db = db
+        self.hour = hour
+        self.active_days = active_days
+        self.chunk_size = chunk_size
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Запускает задачу по расписанию"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Останавливает задачу"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _seconds_until_next_run(self) -> float:
+        now = datetime.now()
+        next_run = now.replace(hour=self.hour, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return (next_run - now).total_seconds()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._seconds_until_next_run())
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Ошибка при подготовке контента на следующий день: {e}")
+
+    async def run_once(self, day: Optional[date] = None) -> int:
+        """Назначает контент на day (по умолчанию на завтра), возвращает число вставленных строк"""
+        day = day or date.today() + timedelta(days=1)
+        user_ids = await self.db.get_active_user_ids(day - timedelta(days=self.active_days))
+        inserted = await self.db.assign_daily_content(day, user_ids, self.chunk_size)
+        logger.info(f"Контент на {day} подготовлен: пользователей {len(user_ids)}, новых назначений {inserted}")
+        return inserted
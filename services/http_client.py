@@ -0,0 +1,71 @@
+from typing import Optional
+
+import aiohttp
+from aiogram.client.session.aiohttp import AiohttpSession
+
+from config import config
+
+
+class HttpClient:
+    """Общая на весь процесс HTTP-сессия для скачивания медиа.
+
+    Соединения переиспользуются (keep-alive), результаты DNS кэшируются, число
+    соединений и время ожидания ограничены, так что зависшая загрузка не держит
+    обработчик бесконечно.
+    """
+
+    def __init__(self, limit: int = 20, limit_per_host: int = 10, dns_cache_ttl: int = 300,
+                 keepalive_timeout: float = 30, connect_timeout: float = 10,
+                 read_timeout: float = 60, total_timeout: float = 600):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(
+            total=total_timeout,
+            connect=connect_timeout,
+            sock_read=read_timeout,
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def session(self) -> aiohttp.ClientSession:
+        """Возвращает сессию, создавая ее при первом обращении (внутри работающего цикла событий)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+def create_bot_session() -> AiohttpSession:
+    """Сессия API Telegram с пулом соединений и таймаутом из конфигурации"""
+    session = AiohttpSession(timeout=config.BOT_API_TIMEOUT)
+    # aiogram 3.0 не принимает параметры пула в конструкторе, поэтому дополняем
+    # аргументы коннектора, который сессия создаст при первом запросе
+    session._connector_init.update(
+        limit=config.BOT_API_POOL_SIZE,
+        ttl_dns_cache=config.HTTP_DNS_CACHE_TTL,
+        keepalive_timeout=config.HTTP_KEEPALIVE_SECONDS,
+    )
+    return session
+
+
+# Единственный клиент для внешних загрузок (Google Drive и т.п.)
+http_client = HttpClient(
+    limit=config.HTTP_POOL_SIZE,
+    limit_per_host=config.HTTP_POOL_SIZE_PER_HOST,
+    dns_cache_ttl=config.HTTP_DNS_CACHE_TTL,
+    keepalive_timeout=config.HTTP_KEEPALIVE_SECONDS,
+    connect_timeout=config.HTTP_CONNECT_TIMEOUT,
+    read_timeout=config.HTTP_READ_TIMEOUT,
+    total_timeout=config.HTTP_TOTAL_TIMEOUT,
+)
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+import aiohttp
+
+from logger import get_logger
+from services.single_flight import SingleFlight
+
+logger = get_logger(__name__)
+
+
+class MediaCache:
+    """Дисковый кэш скачанных медиафайлов с вытеснением давно неиспользованных.
+
+    Файл скачивается потоком кусками по chunk_size байт, поэтому память на один
+    просмотр не зависит от размера видео. Общий размер кэша ограничен max_bytes.
+    """
+
+    def __init__(self, root: str, max_bytes: int, chunk_size: int = 256 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        # Ключ -> размер файла, от давно использованных к недавним
+        self._entries: Optional["OrderedDict[str, int]"] = None
+        # Файлы, которые сейчас отправляются: их нельзя вытеснять
+        self._pinned: Dict[str, int] = {}
+        # Одновременные запросы одного файла дожидаются единственного скачивания
+        self._downloads: SingleFlight[None] = SingleFlight()
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _load(self) -> "OrderedDict[str, int]":
+        """Восстанавливает содержимое кэша с диска при первом обращении"""
+        if self._entries is None:
+            os.makedirs(self.root, exist_ok=True)
+            files = []
+            for entry in os.scandir(self.root):
+                if entry.is_file() and not entry.name.startswith(".tmp-"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, entry.name, stat.st_size))
+            self._entries = OrderedDict((name, size) for _, name, size in sorted(files))
+        return self._entries
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._load().values())
+
+    def _evict(self) -> None:
+        """Удаляет давно использованные файлы, пока кэш не уложится в лимит"""
+        entries = self._load()
+        total = sum(entries.values())
+        for key in list(entries):
+            if total <= self.max_bytes:
+                break
+            if self._pinned.get(key):
+                continue
+            total -= entries.pop(key)
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    async def _download(self, key: str, url: str, session: aiohttp.ClientSession) -> None:
+        async with session.get(url) as response:
+            response.raise_for_status()
+            if response.content_length and response.content_length > self.max_bytes:
+                raise ValueError(f"Файл {url} больше лимита кэша")
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+            size = 0
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    async for chunk in response.content.iter_chunked(self.chunk_size):
+                        f.write(chunk)
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            raise ValueError(f"Файл {url} больше лимита кэша")
+                os.replace(tmp_path, self._path(key))
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+        self._load()[key] = size
+        logger.info(f"Видео {url} сохранено в кэш: {size} байт")
+        self._evict()
+
+    @asynccontextmanager
+    async def open(self, url: str, session: aiohttp.ClientSession,
+                   guard: Optional[Callable[[Callable[[], Awaitable[None]]], Awaitable[None]]] = None
+                   ) -> AsyncIterator[str]:
+        """Выдает путь к локальной копии файла, при необходимости скачивая его.
+
+        Пока контекст открыт, файл не вытесняется из кэша. Само скачивание можно
+        обернуть в guard, например в предохранитель источника файлов.
+        """
+        entries = self._load()
+        key = self._key(url)
+        self._pinned[key] = self._pinned.get(key, 0) + 1
+        try:
+            if key not in entries or not os.path.exists(self._path(key)):
+                entries.pop(key, None)
+
+                def download() -> Awaitable[None]:
+                    return self._download(key, url, session)
+
+                await self._downloads.do(key, lambda: guard(download) if guard else download())
+            entries.move_to_end(key)
+            path = self._path(key)
+            os.utime(path)  # Порядок вытеснения сохраняется и после перезапуска
+            yield path
+        finally:
+            self._pinned[key] -= 1
+            if not self._pinned[key]:
+                del self._pinned[key]
@@ -0,0 +1,47 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """Объединяет одновременные одинаковые операции в одну.
+
+    Пока операция с ключом key выполняется, остальные вызовы с тем же ключом не
+    запускают ее снова, а ждут и получают тот же результат (или то же исключение).
+    Отмена одного из ожидающих не отменяет операцию для остальных.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do_shared(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Выполняет fn или присоединяется к уже идущему вызову.
+
+        Возвращает результат и признак того, что fn выполнил именно этот вызов.
+        """
+        flight = self._flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = asyncio.ensure_future(fn())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(flight), leader
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Выполняет fn или присоединяется к уже идущему вызову с тем же ключом"""
+        result, _ = await self.do_shared(key, fn)
+        return result
+
+    def forget(self, key: Hashable) -> None:
+        """Следующие вызовы с этим ключом запустят новую операцию, не дожидаясь текущей"""
+        self._flights.pop(key, None)
+
+    def _finish(self, key: Hashable, flight: asyncio.Future) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            flight.exception()  # Исключение уже получили ожидающие, не пишем его в лог как забытое
@@ -0,0 +1,159 @@
+import asyncio
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import FSInputFile, InlineKeyboardMarkup, Message
+
+from config import config
+from database.database import Database
+from logger import get_logger
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from services.http_client import http_client
+from services.media_cache import MediaCache
+from services.single_flight import SingleFlight
+
+logger = get_logger(__name__)
+
+# Пауза между загрузками при прогреве, секунды
+WARM_UPLOAD_DELAY = 1.0
+
+# Скачанные видео для загрузки в Telegram, когда отправка по ссылке не сработала
+media_cache = MediaCache(config.MEDIA_CACHE_DIR, config.MEDIA_CACHE_MAX_MB * 1024 * 1024)
+
+# Загрузки с Google Drive: при его недоступности сразу отказываем, а не ждем таймаутов
+drive_breaker = CircuitBreaker(
+    "google_drive",
+    failure_threshold=config.DRIVE_BREAKER_FAILURES,
+    reset_timeout=config.DRIVE_BREAKER_RESET_SECONDS,
+    latency_budget=config.DRIVE_LATENCY_BUDGET,
+)
+
+# Так Telegram отвечает, когда не смог сам скачать файл по ссылке (это сбой источника, а не чата)
+LINK_FETCH_ERRORS = ("http url", "web page content", "failed to get")
+
+# Первые загрузки видео по ссылке: одновременные просмотры одного ролика ждут одну загрузку
+uploads: SingleFlight[Optional[Message]] = SingleFlight()
+
+
+async def get_direct_download_link(url: str) -> str:
+    """Получает прямую ссылку на скачивание файла с Google Drive"""
+    if '/d/' not in url:
+        return url  # Ссылка не на Google Drive, отдаем как есть
+    # Извлекаем ID файла из URL
+    file_id = url.split('/d/')[1].split('/')[0]
+    # Формируем прямую ссылку для скачивания
+    return f"https://drive.google.com/uc?export=download&id={file_id}"
+
+
+async def _upload_video(bot: Bot, chat_id, video_url: str, **kwargs) -> Optional[Message]:
+    """Загружает видео в Telegram: сначала по ссылке, при ошибке - скачивая файл.
+
+    Предохранитель drive_breaker и его бюджет времени охватывают обращения к Google Drive:
+    отправку по ссылке (файл по ней скачивает Telegram) и скачивание в кэш. Ошибки чата
+    (бот заблокирован, чат не найден) и загрузка готового файла в Telegram на него не влияют.
+    """
+    direct_link = await get_direct_download_link(video_url)
+    if not drive_breaker.allow():
+        logger.warning(f"Google Drive недоступен, видео {direct_link} не загружаем")
+        return None
+    try:
+        # Отправляем видео напрямую по ссылке
+        sent = await asyncio.wait_for(
+            bot.send_video(chat_id=chat_id, video=direct_link, supports_streaming=True, **kwargs),
+            drive_breaker.latency_budget
+        )
+        drive_breaker.record_success()
+        return sent
+    except asyncio.TimeoutError:
+        drive_breaker.record_failure()
+        logger.warning(f"Видео по ссылке {direct_link} не отправилось за {drive_breaker.latency_budget} с")
+    except TelegramBadRequest as e:
+        if not any(marker in str(e).lower() for marker in LINK_FETCH_ERRORS):
+            logger.warning(f"Видео {direct_link} не отправлено в чат {chat_id}: {e}")
+            return None  # Ошибка чата, скачивание файла ее не исправит
+        drive_breaker.record_failure()
+        logger.warning(f"Telegram не смог скачать видео по ссылке {direct_link}: {e}")
+    except TelegramForbiddenError as e:
+        logger.warning(f"Видео {direct_link} не отправлено в чат {chat_id}: {e}")
+        return None
+    except Exception as e:
+        logger.warning(f"Ошибка при отправке видео по ссылке {direct_link}: {e}")
+    # Если не удалось отправить напрямую, скачиваем файл в дисковый кэш и загружаем оттуда
+    try:
+        session = await http_client.session()
+        async with media_cache.open(direct_link, session, guard=drive_breaker.call) as path:
+            video_file = FSInputFile(path, filename="exercise.mp4")
+            return await bot.send_video(chat_id=chat_id, video=video_file, supports_streaming=True, **kwargs)
+    except CircuitOpenError:
+        logger.warning(f"Google Drive недоступен, видео {direct_link} не загружаем")
+        return None
+    except asyncio.TimeoutError:
+        logger.error(f"Видео {direct_link} не скачалось за {drive_breaker.latency_budget} с")
+        return None
+    except Exception as e:
+        logger.error(f"Ошибка при повторной попытке отправки видео {direct_link}: {e}")
+        return None
+
+
+async def send_video(bot: Bot, db: Database, chat_id, video_url: str, caption: str,
+                     reply_markup: Optional[InlineKeyboardMarkup] = None) -> bool:
+    """Отправляет видео по сохраненному file_id, а при первой отправке загружает его и запоминает file_id.
+
+    Видео с сохраненным file_id отправляются и тогда, когда Google Drive недоступен.
+    """
+    file_id = await db.get_media_file_id(video_url)
+    if file_id:
+        try:
+            await bot.send_video(
+                chat_id=chat_id,
+                video=file_id,
+                caption=caption,
+                reply_markup=reply_markup,
+                supports_streaming=True
+            )
+            return True
+        except TelegramBadRequest as e:
+            # file_id больше не действителен, загружаем видео заново
+            logger.warning(f"Сохраненный file_id для {video_url} не принят: {e}")
+            await db.delete_media_file_id(video_url)
+
+    async def upload() -> Optional[Message]:
+        sent = await _upload_video(bot, chat_id, video_url, caption=caption, reply_markup=reply_markup)
+        if sent is not None and sent.video:
+            await db.set_media_file_id(video_url, sent.video.file_id, sent.video.file_unique_id)
+        return sent
+
+    sent, leader = await uploads.do_shared(video_url, upload)
+    if leader:
+        return sent is not None
+    # Видео уже загрузил другой пользователь, отправляем его по полученному file_id
+    if sent is None or not sent.video:
+        return False
+    await bot.send_video(
+        chat_id=chat_id,
+        video=sent.video.file_id,
+        caption=caption,
+        reply_markup=reply_markup,
+        supports_streaming=True
+    )
+    return True
+
+
+async def warm_video_file_ids(bot: Bot, db: Database, storage_chat_id) -> Dict[str, int]:
+    """Заранее загружает в служебный чат все видео упражнений и мастер-классов без file_id"""
+    stats = {"uploaded": 0, "skipped": 0, "failed": 0}
+    for video_url in await db.get_all_video_urls():
+        if await db.get_media_file_id(video_url):
+            stats["skipped"] += 1
+            continue
+        sent = await _upload_video(bot, storage_chat_id, video_url, disable_notification=True)
+        if sent is not None and sent.video:
+            await db.set_media_file_id(video_url, sent.video.file_id, sent.video.file_unique_id)
+            stats["uploaded"] += 1
+        else:
+            stats["failed"] += 1
+        # Пауза между загрузками, чтобы не упереться в ограничения Telegram на частоту запросов
+        await asyncio.sleep(WARM_UPLOAD_DELAY)
+    logger.info(f"Прогрев видео: {stats}")
+    return stats